@@ -0,0 +1,68 @@
+"""Throughput of the cache backends: get (hit/miss), set and incr.
+
+Memory is always measured. Redis is measured against CACHE_BENCH_REDIS_URL when set (e.g. redis://localhost:6379/15),
+otherwise against fakeredis when it is installed (in-process, so it shows client overhead, not network latency).
+Run from the directory that contains the project:
+
+    python -m <project>.benchmarks.bench_cache_backends
+"""
+import asyncio
+import os
+import time
+
+from .utils import use_temp_database
+
+use_temp_database("bench_cache_backends")
+
+from ..cache import MemoryCache, RedisCache  # noqa: E402
+
+OPS = 20_000
+CONCURRENCY = 50
+VALUE = b'{"id": 1, "username": "bench", "role": "user"}'
+
+
+async def measure(label: str, operation) -> float:
+    # CONCURRENCY tasks share OPS calls, like requests hitting the cache in one worker
+    async def worker(offset: int):
+        for i in range(offset, OPS, CONCURRENCY):
+            await operation(i)
+
+    started_at = time.perf_counter()
+    await asyncio.gather(*(worker(offset) for offset in range(CONCURRENCY)))
+    elapsed = time.perf_counter() - started_at
+    print(f"  {label:<12} {OPS / elapsed:12,.0f} ops/s  {elapsed / OPS * 1e6:8.1f} us/op")
+    return elapsed
+
+
+async def bench(backend):
+    print(f"{backend.name}:")
+    keys = [f"bench:{i % 1000}" for i in range(OPS)]
+    await measure("set", lambda i: backend.set(keys[i], VALUE, ttl=60))
+    await measure("get (hit)", lambda i: backend.get(keys[i]))
+    await measure("get (miss)", lambda i: backend.get(f"missing:{i}"))
+    await measure("incr", lambda i: backend.incr(f"counter:{i % 100}", ttl=60))
+    await backend.clear()
+    await backend.close()
+
+
+async def run():
+    await bench(MemoryCache(maxsize=10_000))
+
+    redis_url = os.getenv("CACHE_BENCH_REDIS_URL")
+    if redis_url:
+        await bench(RedisCache.from_url(redis_url, prefix="bench:"))
+        return
+    try:
+        import fakeredis
+    except ImportError:
+        print("redis: skipped (set CACHE_BENCH_REDIS_URL or install fakeredis)")
+        return
+    await bench(RedisCache(fakeredis.FakeAsyncRedis(), prefix="bench:"))
+
+
+def main():
+    asyncio.run(run())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+"""Picking up 10 changed todos out of 10k: re-downloading the whole list (every page of GET /todos) vs.
+GET /todos/changes with the previous sync token. Time and bytes per sync.
+
+Run from the directory that contains the project:
+
+    python -m <project>.benchmarks.bench_delta_sync
+"""
+import time
+
+from .utils import use_temp_database, report
+
+use_temp_database("bench_delta_sync")
+
+from starlette.testclient import TestClient  # noqa: E402
+
+from .. import sync  # noqa: E402
+from ..main import app  # noqa: E402
+from ..pagination import MAX_PAGE_SIZE, NEXT_CURSOR_HEADER  # noqa: E402
+from ..populate_todos import populate, DEFAULT_PASSWORD  # noqa: E402
+
+TODOS = 10_000
+CHANGES = 10
+ROUNDS = 20
+
+
+def full_list(client) -> int:
+    received, params = 0, {"limit": MAX_PAGE_SIZE}
+    while True:
+        response = client.get("/todos", params=params)
+        received += len(response.content)
+        cursor = response.headers.get(NEXT_CURSOR_HEADER)
+        if cursor is None:
+            return received
+        params["cursor"] = cursor
+
+
+def delta(client, token: str) -> tuple[int, str]:
+    response = client.get("/todos/changes", params={"since": token})
+    return len(response.content), response.json()["sync_token"]
+
+
+def main():
+    populate(users=1, todos_per_user=TODOS, prefix="syncuser", seed=1)
+    # Tokens point right after the last change, so each round only sees that round's changes
+    sync.SYNC_SETTLE_SECONDS = 0
+
+    with TestClient(app) as client:
+        token = client.post("/auth/token", data={"username": "syncuser0", "password": DEFAULT_PASSWORD})
+        client.headers["Authorization"] = f"Bearer {token.json()['access_token']}"
+        ids = [todo["id"] for todo in client.get("/todos", params={"limit": CHANGES}).json()]
+        # Initial sync, page by page
+        params = {"limit": sync.MAX_CHANGES_LIMIT}
+        while True:
+            changes = client.get("/todos/changes", params=params).json()
+            params["since"] = sync_token = changes["sync_token"]
+            if not changes["has_more"]:
+                break
+
+        full_samples, delta_samples = [], []
+        full_bytes = delta_bytes = 0
+        for i in range(ROUNDS):
+            client.put("/todos/bulk_update", json=[
+                {"id": todo_id, "title": f"Changed {i}", "description": "Changed todo", "priority": 1}
+                for todo_id in ids
+            ])
+
+            started_at = time.perf_counter()
+            full_bytes = full_list(client)
+            full_samples.append(time.perf_counter() - started_at)
+
+            started_at = time.perf_counter()
+            delta_bytes, sync_token = delta(client, sync_token)
+            delta_samples.append(time.perf_counter() - started_at)
+
+    print(f"{TODOS} todos, {CHANGES} changed per sync")
+    report(f"full list ({full_bytes // 1024} KiB)", full_samples)
+    report(f"changes ({delta_bytes // 1024} KiB)", delta_samples)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+"""POST /todos/add_todo throughput at 50/200/1000 concurrent clients: a commit per request vs. group commit.
+
+Requests go through the whole app (auth, validation, counters, events) on a SQLite file with the tuned profile;
+run with SQLITE_SYNCHRONOUS=FULL to see the case where every commit waits for an fsync.
+Run from the directory that contains the project:
+
+    python -m <project>.benchmarks.bench_group_commit
+"""
+import asyncio
+import time
+
+from .utils import use_temp_database, summarize
+
+use_temp_database("bench_group_commit")
+
+import httpx  # noqa: E402
+
+from ..database import AsyncSessionLocal, SessionLocal, async_engine, engine  # noqa: E402
+from ..group_commit import GroupCommitter, get_group_committer  # noqa: E402
+from ..hashing import hash_password  # noqa: E402
+from ..main import app  # noqa: E402
+from ..migrations import upgrade_database  # noqa: E402
+from ..models import User  # noqa: E402
+
+CLIENTS = (50, 200, 1000)
+# Writes per run, split between the clients
+WRITES = 4000
+
+
+def seed_user():
+    upgrade_database(engine)
+    db = SessionLocal()
+    db.add(User(username="bench", email="bench@example.com", first_name="Bench", last_name="User",
+                hashed_password=hash_password("Bench123!"), role="user", is_active=True))
+    db.commit()
+    db.close()
+
+
+async def client_writes(client: httpx.AsyncClient, count: int, latencies: list, errors: list):
+    for i in range(count):
+        started_at = time.perf_counter()
+        response = await client.post("/todos/add_todo", json={
+            "title": f"Todo {i}", "description": "Benchmark", "priority": i % 5 + 1, "complete": False,
+        })
+        latencies.append(time.perf_counter() - started_at)
+        if response.status_code != 201:
+            errors.append(response.status_code)
+
+
+async def run(clients: int, committer) -> tuple[float, dict, int]:
+    app.dependency_overrides[get_group_committer] = lambda: committer
+    # Failed requests (e.g. "database is locked") are counted as errors instead of aborting the run
+    transport = httpx.ASGITransport(app=app, raise_app_exceptions=False)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        login = await client.post("/auth/token", data={"username": "bench", "password": "Bench123!"})
+        client.headers["Authorization"] = f"Bearer {login.json()['access_token']}"
+
+        latencies, errors = [], []
+        started_at = time.perf_counter()
+        await asyncio.gather(*(client_writes(client, WRITES // clients, latencies, errors) for _ in range(clients)))
+        elapsed = time.perf_counter() - started_at
+    if committer is not None:
+        await committer.close()
+    # Pooled connections belong to this run's event loop
+    await async_engine.dispose()
+    return len(latencies) / elapsed, summarize(latencies), len(errors)
+
+
+def main():
+    seed_user()
+    for clients in CLIENTS:
+        for label, committer in (("commit per request", None), ("group commit", GroupCommitter(AsyncSessionLocal))):
+            throughput, latency, errors = asyncio.run(run(clients, committer))
+            print(f"{clients:>5} clients  {label:<20} {throughput:7.0f} writes/s  "
+                  f"p50={latency['p50_ms']:7.1f}ms p99={latency['p99_ms']:7.1f}ms  errors={errors}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+"""Cost of the /metrics instrumentation on the request path.
+
+Times the raw metric operations and a request through MetricsMiddleware vs. the same ASGI app without it.
+Run from the directory that contains the project:
+
+    python -m <project>.benchmarks.bench_metrics_overhead
+"""
+import asyncio
+import time
+import timeit
+
+from .utils import use_temp_database
+
+use_temp_database("bench_metrics_overhead")
+
+from ..metrics import Counter, Histogram  # noqa: E402
+from ..middleware import MetricsMiddleware  # noqa: E402
+
+OPS = 1_000_000
+REQUESTS = 200_000
+
+
+class Route:
+    path = "/todos/{todo_id}"
+
+
+async def endpoint(scope, receive, send):
+    scope["route"] = Route
+    await send({"type": "http.response.start", "status": 200, "headers": []})
+    await send({"type": "http.response.body", "body": b"{}"})
+
+
+async def receive():
+    return {"type": "http.request", "body": b""}
+
+
+async def send(message):
+    pass
+
+
+async def drive(app) -> float:
+    scope = {"type": "http", "method": "GET", "path": "/todos/1"}
+    started_at = time.perf_counter()
+    for _ in range(REQUESTS):
+        await app(dict(scope), receive, send)
+    return (time.perf_counter() - started_at) / REQUESTS
+
+
+def main():
+    counter = Counter("bench_total", "Bench.", ("method", "route", "status"))
+    histogram = Histogram("bench_seconds", "Bench.", ("method", "route"))
+    labels = ("GET", "/todos/{todo_id}")
+
+    inc = timeit.timeit(lambda: counter.inc(labels + ("200",)), number=OPS) / OPS
+    observe = timeit.timeit(lambda: histogram.observe(0.0123, labels), number=OPS) / OPS
+    print(f"Counter.inc            {inc * 1e9:8.1f} ns/op")
+    print(f"Histogram.observe      {observe * 1e9:8.1f} ns/op")
+
+    bare = asyncio.run(drive(endpoint))
+    instrumented = asyncio.run(drive(MetricsMiddleware(endpoint)))
+    print(f"request, bare          {bare * 1e6:8.2f} us")
+    print(f"request, with metrics  {instrumented * 1e6:8.2f} us  (+{(instrumented - bare) * 1e6:.2f} us per request)")
+
+
+if __name__ == "__main__":
+    main()
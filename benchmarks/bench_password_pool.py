@@ -0,0 +1,92 @@
+"""p99 latency of GET /todos while /auth/token is under concurrent login load.
+
+Compares bcrypt running inline on the event loop with the bounded password hash pool.
+Run from the directory that contains the project:
+
+    python -m <project>.benchmarks.bench_password_pool
+"""
+import asyncio
+import time
+
+from .utils import use_temp_database, report
+
+use_temp_database("bench_password_pool")
+
+import httpx  # noqa: E402
+
+from ..database import SessionLocal, engine  # noqa: E402
+from ..hashing import password_hash_pool, hash_password  # noqa: E402
+from ..main import app  # noqa: E402
+from ..migrations import upgrade_database  # noqa: E402
+from ..models import User  # noqa: E402
+
+LOGIN_CLIENTS = 16
+DURATION = 5.0
+
+
+def seed_user():
+    upgrade_database(engine)
+    db = SessionLocal()
+    db.add(User(username="bench", email="bench@example.com", first_name="Bench", last_name="User",
+                hashed_password=hash_password("Bench123!"), role="user", is_active=True))
+    db.commit()
+    db.close()
+
+
+async def login_storm(client: httpx.AsyncClient, deadline: float):
+    while time.perf_counter() < deadline:
+        await client.post("/auth/token", data={"username": "bench", "password": "Bench123!"})
+
+
+async def poll_todos(client: httpx.AsyncClient, token: str, deadline: float) -> list[float]:
+    latencies = []
+    while time.perf_counter() < deadline:
+        start = time.perf_counter()
+        await client.get("/todos", headers={"Authorization": f"Bearer {token}"})
+        latencies.append(time.perf_counter() - start)
+        await asyncio.sleep(0.005)
+    return latencies
+
+
+async def run(label: str):
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        login = await client.post("/auth/token", data={"username": "bench", "password": "Bench123!"})
+        token = login.json()["access_token"]
+
+        deadline = time.perf_counter() + DURATION
+        storm = [asyncio.create_task(login_storm(client, deadline)) for _ in range(LOGIN_CLIENTS)]
+        latencies = await poll_todos(client, token, deadline)
+        await asyncio.gather(*storm)
+
+    report(label, latencies)
+
+
+class InlinePool:
+    """Stand-in that runs bcrypt directly on the event loop (the old behaviour)."""
+
+    async def run(self, func, *args):
+        return func(*args)
+
+
+async def compare():
+    from ..routers import auth
+
+    await run("/todos with pool")
+
+    auth.password_hash_pool = InlinePool()
+    try:
+        await run("/todos with inline bcrypt")
+    finally:
+        auth.password_hash_pool = password_hash_pool
+
+
+def main():
+    seed_user()
+    # One event loop for both runs: the async engine's connection pool is bound to it
+    asyncio.run(compare())
+    password_hash_pool.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,49 @@
+"""Cost of a rate limit check, allowed and rejected, on the in-memory and cache-backed bucket stores.
+
+Run from the directory that contains the project:
+
+    python -m <project>.benchmarks.bench_rate_limit
+"""
+import asyncio
+import time
+
+from fastapi import HTTPException
+
+from .utils import use_temp_database
+
+use_temp_database("bench_rate_limit")
+
+from .. import ratelimit  # noqa: E402
+from ..cache import MemoryCache  # noqa: E402
+from ..ratelimit import MemoryBucketStore, CacheBucketStore, RateLimit  # noqa: E402
+
+CHECKS = 200_000
+
+
+async def measure(label: str, limit: RateLimit, keys: int):
+    rejected = 0
+    started_at = time.perf_counter()
+    for i in range(CHECKS):
+        try:
+            await limit.check(f"10.0.{i % keys // 256}.{i % 256}")
+        except HTTPException:
+            rejected += 1
+    elapsed = time.perf_counter() - started_at
+    print(f"  {label:<28} {elapsed / CHECKS * 1e6:6.2f} us/check  ({rejected / CHECKS:.0%} rejected)")
+
+
+async def run():
+    for name, store in (("memory", MemoryBucketStore()), ("cache (MemoryCache)", CacheBucketStore(MemoryCache()))):
+        ratelimit.bucket_store = store
+        print(f"{name}:")
+        # Many clients well under the limit vs. one client hammering it
+        await measure("allowed (10k clients)", RateLimit("bench", "1000000/1"), keys=10_000)
+        await measure("rejected (1 client)", RateLimit("bench", "5/60"), keys=1)
+
+
+def main():
+    asyncio.run(run())
+
+
+if __name__ == "__main__":
+    main()
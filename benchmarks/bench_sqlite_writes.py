@@ -0,0 +1,59 @@
+"""Concurrent write throughput on SQLite with default settings vs. the tuned profile in database.py.
+
+Each writer inserts todos one at a time, committing every insert (like POST /todos/add_todo).
+Run from the directory that contains the project:
+
+    python -m <project>.benchmarks.bench_sqlite_writes [writers] [writes_per_writer]
+"""
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+from .utils import use_temp_database
+
+use_temp_database("bench_sqlite_writes")
+
+from sqlalchemy import create_engine, insert  # noqa: E402
+from sqlalchemy.ext.asyncio import create_async_engine  # noqa: E402
+
+from ..database import Base, apply_sqlite_pragmas, pool_options, get_async_url  # noqa: E402
+from ..models import Todos  # noqa: E402
+
+
+async def writer(engine, count: int, writer_id: int):
+    for i in range(count):
+        async with engine.begin() as conn:
+            await conn.execute(insert(Todos).values(
+                title=f"Todo {writer_id}-{i}", description="Benchmark", priority=3, complete=False, user_id=writer_id
+            ))
+
+
+async def run(tuned: bool, writers: int, count: int) -> float:
+    path = os.path.join(tempfile.mkdtemp(prefix="todos-bench-"), "writes.db")
+    url = f"sqlite:///{path}"
+    Base.metadata.create_all(bind=create_engine(url))
+
+    engine = create_async_engine(get_async_url(url), **pool_options(url))
+    if tuned:
+        apply_sqlite_pragmas(engine.sync_engine)
+
+    started_at = time.perf_counter()
+    await asyncio.gather(*(writer(engine, count, writer_id) for writer_id in range(writers)))
+    elapsed = time.perf_counter() - started_at
+    await engine.dispose()
+    return writers * count / elapsed
+
+
+def main():
+    writers = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+    count = int(sys.argv[2]) if len(sys.argv) > 2 else 40
+
+    for label, tuned in (("default (rollback journal, FULL)", False), ("tuned (WAL, NORMAL)", True)):
+        throughput = asyncio.run(run(tuned, writers, count))
+        print(f"{label:<34} {writers} writers: {throughput:8.0f} commits/s")
+
+
+if __name__ == "__main__":
+    main()
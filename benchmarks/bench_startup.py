@@ -0,0 +1,71 @@
+"""Worker boot time: cold import of the app, lifespan startup and the first request, each in a fresh interpreter.
+
+Compares the default boot with DB_AUTO_MIGRATE=1 (migrations checked on every boot, the old behaviour).
+Run from the directory that contains the project:
+
+    python -m <project>.benchmarks.bench_startup
+"""
+import json
+import os
+import subprocess
+import sys
+import time
+
+from .utils import use_temp_database, report
+
+PACKAGE = __package__.rsplit(".", 1)[0]
+RUNS = 10
+
+# Runs in the child interpreter; prints the phase timings as JSON
+CHILD = f"""
+import json, time
+# Test client only, not part of the app's boot
+from starlette.testclient import TestClient
+started_at = time.perf_counter()
+from {PACKAGE}.main import app
+imported_at = time.perf_counter()
+with TestClient(app) as client:
+    started_up_at = time.perf_counter()
+    assert client.get("/health").status_code == 200
+    first_request_at = time.perf_counter()
+print(json.dumps({{
+    "import": imported_at - started_at,
+    "startup": started_up_at - imported_at,
+    "first request": first_request_at - started_up_at,
+}}))
+"""
+
+
+def boot(env: dict) -> dict:
+    started_at = time.perf_counter()
+    output = subprocess.run([sys.executable, "-c", CHILD], env=env, check=True, capture_output=True, text=True)
+    phases = json.loads(output.stdout.strip().splitlines()[-1])
+    phases["process total"] = time.perf_counter() - started_at
+    return phases
+
+
+def measure(label: str, env: dict):
+    samples = {}
+    for _ in range(RUNS):
+        for phase, elapsed in boot(env).items():
+            samples.setdefault(phase, []).append(elapsed)
+    print(f"{label}:")
+    for phase, elapsed in samples.items():
+        report(f"  {phase}", elapsed)
+
+
+def main():
+    path = use_temp_database("bench_startup")
+    env = dict(os.environ)
+    # The project's parent directory, so the child can import it by package name
+    env["PYTHONPATH"] = os.pathsep.join(filter(None, [os.getcwd(), env.get("PYTHONPATH")]))
+
+    # The first migrating boot creates the schema, the timed runs then only check it (like a redeploy)
+    boot({**env, "DB_AUTO_MIGRATE": "1"})
+    measure("default (schema managed by the deploy)", {**env, "DB_AUTO_MIGRATE": "0"})
+    measure("DB_AUTO_MIGRATE=1", {**env, "DB_AUTO_MIGRATE": "1"})
+    os.remove(path)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+"""Search latency on 200k todos: the FTS5 index (GET /todos/search) vs. a LIKE '%q%' scan of the user's todos.
+
+One heavy user with 100k todos and 1000 users with 100 each; words drawn from a Zipf-like vocabulary so
+queries range from rare to very common terms.
+Run from the directory that contains the project:
+
+    python -m <project>.benchmarks.bench_todo_search
+"""
+import random
+import string
+import time
+
+from .utils import use_temp_database, report
+
+use_temp_database("bench_todo_search")
+
+from sqlalchemy import insert  # noqa: E402
+
+from ..database import Base, SessionLocal, engine  # noqa: E402
+from ..models import Todos, User  # noqa: E402
+from ..routers.todos import TODO_COLUMNS  # noqa: E402
+from ..search import SearchParams, search_statement  # noqa: E402
+
+HEAVY_USER_TODOS = 100_000
+SMALL_USERS = 1000
+SMALL_USER_TODOS = 100
+VOCABULARY = 20_000
+ROUNDS = 20
+
+rng = random.Random(1)
+words = ["".join(rng.choices(string.ascii_lowercase, k=rng.randint(4, 9))) for _ in range(VOCABULARY)]
+# Word of rank r drawn with weight 1/r
+weights = [1 / rank for rank in range(1, VOCABULARY + 1)]
+
+
+def sentence(length: int) -> str:
+    return " ".join(rng.choices(words, weights=weights, k=length))
+
+
+def seed():
+    # create_all also creates the FTS5 table and its triggers
+    Base.metadata.create_all(bind=engine)
+    with SessionLocal() as db:
+        db.execute(insert(User), [{"id": i, "username": f"search{i}", "role": "user"} for i in range(SMALL_USERS + 1)])
+        owners = [0] * HEAVY_USER_TODOS + [user_id for user_id in range(1, SMALL_USERS + 1)
+                                           for _ in range(SMALL_USER_TODOS)]
+        for start in range(0, len(owners), 10_000):
+            db.execute(insert(Todos), [
+                {"title": sentence(3), "description": sentence(8), "priority": 1, "user_id": user_id}
+                for user_id in owners[start:start + 10_000]
+            ])
+        db.commit()
+
+
+def params(q: str) -> SearchParams:
+    return SearchParams(q=q, limit=20, cursor=0)
+
+
+def measure(label: str, dialect: str, user_id: int, q: str) -> int:
+    stmt = search_statement(dialect, TODO_COLUMNS, user_id, params(q))
+    samples = []
+    with SessionLocal() as db:
+        for _ in range(ROUNDS):
+            started_at = time.perf_counter()
+            rows = db.execute(stmt).all()
+            samples.append(time.perf_counter() - started_at)
+    report(label, samples)
+    return len(rows)
+
+
+def main():
+    seed()
+    queries = {
+        "rare word": words[VOCABULARY // 2],
+        "common word": words[2],
+        "prefix": words[50][:3],
+        "two words": f"{words[10]} {words[40]}",
+    }
+    for owner, user_id in (("heavy user (100k todos)", 0), ("small user (100 todos)", 500)):
+        print(f"{owner}:")
+        for name, q in queries.items():
+            measure(f"  {name} FTS5", "sqlite", user_id, q)
+            # Any dialect without a text index gets the substring scan
+            measure(f"  {name} LIKE", "default", user_id, q)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+"""Fetch + serialization time of 10k todos: ORM objects through jsonable_encoder (before) vs. selected columns
+rendered by FastJSONResponse (after).
+
+Run from the directory that contains the project:
+
+    python -m <project>.benchmarks.bench_todo_serialization
+"""
+import time
+
+from .utils import use_temp_database, report
+
+use_temp_database("bench_todo_serialization")
+
+from fastapi.encoders import jsonable_encoder  # noqa: E402
+from fastapi.responses import JSONResponse  # noqa: E402
+from sqlalchemy import select, insert  # noqa: E402
+
+from ..database import Base, SessionLocal, engine  # noqa: E402
+from ..models import Todos, User  # noqa: E402
+from ..responses import FastJSONResponse, orjson, rows_to_dicts  # noqa: E402
+from ..routers.todos import TODO_COLUMNS  # noqa: E402
+
+TODOS = 10_000
+ROUNDS = 20
+
+
+def seed():
+    Base.metadata.create_all(bind=engine)
+    with SessionLocal() as db:
+        db.add(User(id=1, username="bench", email="bench@example.com", role="user"))
+        db.execute(insert(Todos), [
+            {"title": f"Todo {i}", "description": f"Description of todo {i}", "priority": i % 5 + 1,
+             "complete": i % 2 == 0, "user_id": 1}
+            for i in range(TODOS)
+        ])
+        db.commit()
+
+
+def before(db) -> bytes:
+    todos = db.execute(select(Todos).filter(Todos.user_id == 1)).scalars().all()
+    return JSONResponse(jsonable_encoder(todos)).body
+
+
+def after(db) -> bytes:
+    todos = db.execute(select(*TODO_COLUMNS).filter(Todos.user_id == 1)).all()
+    return FastJSONResponse(rows_to_dicts(todos)).body
+
+
+def measure(label: str, func):
+    samples = []
+    for _ in range(ROUNDS):
+        # A fresh session each round: no identity map left over from the previous one
+        with SessionLocal() as db:
+            started_at = time.perf_counter()
+            func(db)
+            samples.append(time.perf_counter() - started_at)
+    report(label, samples)
+
+
+def main():
+    seed()
+    print(f"{TODOS} todos, orjson {'installed' if orjson is not None else 'missing (json fallback)'}")
+    measure("before (ORM + jsonable_encoder)", before)
+    measure("after (columns + orjson)", after)
+
+
+if __name__ == "__main__":
+    main()
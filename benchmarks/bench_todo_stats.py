@@ -0,0 +1,89 @@
+"""Todo stats from the counters table vs. counting the todos (GROUP BY over the user's rows or the whole table),
+and what keeping the counters costs a write.
+
+One heavy user with 100k todos and 1000 users with 100 each.
+Run from the directory that contains the project:
+
+    python -m <project>.benchmarks.bench_todo_stats
+"""
+import time
+
+from .utils import use_temp_database, report
+
+use_temp_database("bench_todo_stats")
+
+from sqlalchemy import func, insert, select, text  # noqa: E402
+
+from ..database import SessionLocal  # noqa: E402
+from ..models import SQLITE_COUNTER_DDL, Todos  # noqa: E402
+from ..populate_todos import populate  # noqa: E402
+from ..stats import stats_statement  # noqa: E402
+
+HEAVY_USER_TODOS = 100_000
+SMALL_USERS = 1000
+SMALL_USER_TODOS = 100
+ROUNDS = 50
+
+
+def count_statement(user_id=None):
+    # What a stats read costs without the counters
+    stmt = select(Todos.priority, Todos.complete, func.count()).group_by(Todos.priority, Todos.complete)
+    if user_id is not None:
+        stmt = stmt.where(Todos.user_id == user_id)
+    return stmt
+
+
+def measure(label: str, stmt):
+    samples = []
+    with SessionLocal() as db:
+        for _ in range(ROUNDS):
+            started_at = time.perf_counter()
+            db.execute(stmt).all()
+            samples.append(time.perf_counter() - started_at)
+    report(label, samples)
+
+
+def measure_writes(label: str, user_id: int):
+    samples = []
+    with SessionLocal() as db:
+        for i in range(ROUNDS):
+            todo = {"title": f"Write {i}", "description": "Benchmark", "priority": i % 5 + 1, "complete": False}
+            started_at = time.perf_counter()
+            db.execute(insert(Todos), {**todo, "user_id": user_id})
+            db.commit()
+            samples.append(time.perf_counter() - started_at)
+    report(label, samples)
+
+
+def set_counter_triggers(enabled: bool):
+    with SessionLocal() as db:
+        if enabled:
+            for statement in SQLITE_COUNTER_DDL:
+                db.execute(text(statement))
+        else:
+            for name in ("todo_counters_insert", "todo_counters_delete", "todo_counters_update"):
+                db.execute(text(f"DROP TRIGGER IF EXISTS {name}"))
+        db.commit()
+
+
+def main():
+    # The triggers count the todos as populate() inserts them
+    heavy_user, = populate(users=1, todos_per_user=HEAVY_USER_TODOS, prefix="statsheavy", seed=1)
+    small_users = populate(users=SMALL_USERS, todos_per_user=SMALL_USER_TODOS, prefix="statsuser", seed=1)
+
+    measure("heavy user: counters", stats_statement(heavy_user))
+    measure("heavy user: GROUP BY todos", count_statement(heavy_user))
+    measure("small user: counters", stats_statement(small_users[0]))
+    measure("small user: GROUP BY todos", count_statement(small_users[0]))
+    measure("all users: counters", stats_statement())
+    measure("all users: GROUP BY todos", count_statement())
+
+    # The counter trigger's share of a write
+    measure_writes("insert: counter trigger", small_users[1])
+    set_counter_triggers(False)
+    measure_writes("insert: no counter trigger", small_users[1])
+    set_counter_triggers(True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,224 @@
+"""Async HTTP load test: login, list, get, create, update and delete against a running server.
+
+Without --url a local uvicorn is started on a fresh SQLite database populated by populate_todos.
+Each virtual user logs in, then loops create -> list -> get -> update -> delete (net zero todos),
+logging in again every --login-every iterations. Run from the directory that contains the project:
+
+    python -m <project>.benchmarks.load_test --concurrency 50 --duration 30
+    # against a deployed/staging server whose users were created by populate_todos
+    python -m <project>.benchmarks.load_test --url http://localhost:8000 --users 100
+
+Regression gate before deploy: save a run with --json baseline.json, then
+--baseline baseline.json exits with status 1 when any operation's p95 is more than --tolerance slower.
+"""
+import argparse
+import asyncio
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+
+from .utils import NO_RATE_LIMITS, summarize
+
+PACKAGE = __package__.rsplit(".", 1)[0]
+PROJECT_PARENT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+OPERATIONS = ("login", "create", "list", "get", "update", "delete")
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_server(args) -> tuple[subprocess.Popen, str]:
+    """Populate a temp database and serve the app on it with uvicorn."""
+    env = dict(os.environ)
+    env["DATABASE_URL"] = f"sqlite:///{os.path.join(tempfile.mkdtemp(prefix='todos-load-'), 'load.db')}"
+    env.setdefault("SECRET_KEY", "load-test-secret")
+    env.setdefault("ALGORITHM", "HS256")
+    # Every virtual user logs in from 127.0.0.1
+    for variable, value in NO_RATE_LIMITS.items():
+        env.setdefault(variable, value)
+
+    subprocess.run(
+        [sys.executable, "-m", f"{PACKAGE}.populate_todos", "--users", str(args.users),
+         "--todos-per-user", str(args.todos_per_user), "--prefix", args.prefix, "--password", args.password],
+        cwd=PROJECT_PARENT, env=env, check=True,
+    )
+
+    port = free_port()
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", f"{PACKAGE}.main:app", "--port", str(port),
+         "--workers", str(args.workers), "--log-level", "warning"],
+        cwd=PROJECT_PARENT, env=env,
+    )
+    return server, f"http://127.0.0.1:{port}"
+
+
+async def wait_until_healthy(client: httpx.AsyncClient, timeout: float = 30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            if (await client.get("/health")).status_code == 200:
+                return
+        except httpx.TransportError:
+            pass
+        await asyncio.sleep(0.2)
+    raise RuntimeError("Server did not become healthy in time.")
+
+
+class Recorder:
+    def __init__(self):
+        self.latencies = {operation: [] for operation in OPERATIONS}
+        self.errors = {operation: 0 for operation in OPERATIONS}
+
+    async def call(self, operation: str, request) -> httpx.Response:
+        started_at = time.perf_counter()
+        try:
+            response = await request
+        except httpx.HTTPError:
+            self.errors[operation] += 1
+            return None
+        self.latencies[operation].append(time.perf_counter() - started_at)
+        if response.status_code >= 400:
+            self.errors[operation] += 1
+        return response
+
+
+async def login(client: httpx.AsyncClient, recorder: Recorder, username: str, password: str) -> dict:
+    response = await recorder.call(
+        "login", client.post("/auth/token", data={"username": username, "password": password})
+    )
+    if response is None or response.status_code != 200:
+        return {}
+    return {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+
+async def virtual_user(client: httpx.AsyncClient, recorder: Recorder, username: str, args, deadline: float):
+    headers = {}
+    iteration = 0
+    while time.monotonic() < deadline:
+        if iteration % args.login_every == 0:
+            headers = await login(client, recorder, username, args.password) or headers
+        iteration += 1
+
+        payload = {"title": f"Load test {iteration}", "description": "Created by load_test", "priority": 3}
+        response = await recorder.call("create", client.post("/todos/add_todo", json=payload, headers=headers))
+        await recorder.call(
+            "list", client.get("/todos", params={"order": "desc", "limit": args.page_size}, headers=headers)
+        )
+        if response is None or response.status_code != 201:
+            continue
+        # The id of this virtual user's own todo: others may share the account and create todos meanwhile
+        todo_id = response.json()["id"]
+
+        await recorder.call("get", client.get(f"/todos/{todo_id}", headers=headers))
+        payload["complete"] = True
+        await recorder.call("update", client.put(f"/todos/{todo_id}", json=payload, headers=headers))
+        await recorder.call("delete", client.delete(f"/todos/{todo_id}", headers=headers))
+
+
+async def run_load(base_url: str, args) -> tuple[Recorder, float]:
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=args.timeout) as client:
+        await wait_until_healthy(client)
+        recorder = Recorder()
+        started_at = time.monotonic()
+        deadline = started_at + args.duration
+        await asyncio.gather(*(
+            virtual_user(client, recorder, f"{args.prefix}{i % args.users}", args, deadline)
+            for i in range(args.concurrency)
+        ))
+        return recorder, time.monotonic() - started_at
+
+
+def summarize_run(recorder: Recorder, elapsed: float) -> dict:
+    results = {}
+    for operation in OPERATIONS:
+        samples = recorder.latencies[operation]
+        if not samples:
+            continue
+        results[operation] = {
+            **summarize(samples),
+            "errors": recorder.errors[operation],
+            "throughput_rps": len(samples) / elapsed,
+        }
+    return results
+
+
+def print_results(results: dict, elapsed: float):
+    total = sum(stats["count"] for stats in results.values())
+    print(f"{total} requests in {elapsed:.1f}s ({total / elapsed:,.0f} req/s)")
+    for operation, stats in results.items():
+        print(
+            f"{operation:<8} n={stats['count']:<7} {stats['throughput_rps']:8.1f} req/s errors={stats['errors']:<4} "
+            f"p50={stats['p50_ms']:8.2f}ms p95={stats['p95_ms']:8.2f}ms p99={stats['p99_ms']:8.2f}ms"
+        )
+
+
+def regressions(results: dict, baseline: dict, tolerance: float) -> list[str]:
+    found = []
+    for operation, stats in results.items():
+        if operation not in baseline:
+            continue
+        limit = baseline[operation]["p95_ms"] * (1 + tolerance)
+        if stats["p95_ms"] > limit:
+            found.append(f"{operation}: p95 {stats['p95_ms']:.2f}ms > {limit:.2f}ms (baseline +{tolerance:.0%})")
+        if stats["errors"] > baseline[operation].get("errors", 0):
+            found.append(f"{operation}: {stats['errors']} errors (baseline {baseline[operation].get('errors', 0)})")
+    return found
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--url", help="server to test (default: start a local uvicorn on a populated temp DB)")
+    parser.add_argument("--users", type=int, default=20, help="users to log in as (populated when local)")
+    parser.add_argument("--todos-per-user", type=int, default=200, help="todos per user when populating")
+    parser.add_argument("--prefix", default="loaduser", help="username prefix used by populate_todos")
+    parser.add_argument("--password", default="Passw0rd!", help="password of the populated users")
+    parser.add_argument("--concurrency", type=int, default=20, help="virtual users")
+    parser.add_argument("--duration", type=float, default=20, help="seconds to run")
+    parser.add_argument("--login-every", type=int, default=20, help="iterations between logins")
+    parser.add_argument("--page-size", type=int, default=50, help="limit of the list request")
+    parser.add_argument("--workers", type=int, default=1, help="uvicorn workers for the local server")
+    parser.add_argument("--timeout", type=float, default=30, help="request timeout in seconds")
+    parser.add_argument("--json", help="write the results to this file")
+    parser.add_argument("--baseline", help="results of a previous --json run to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed p95 slowdown vs. the baseline")
+    args = parser.parse_args(argv)
+
+    server = None
+    base_url = args.url
+    if base_url is None:
+        server, base_url = start_server(args)
+    try:
+        recorder, elapsed = asyncio.run(run_load(base_url, args))
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
+
+    results = summarize_run(recorder, elapsed)
+    print_results(results, elapsed)
+
+    if args.json:
+        with open(args.json, "w") as file:
+            json.dump(results, file, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as file:
+            found = regressions(results, json.load(file), args.tolerance)
+        for line in found:
+            print(f"REGRESSION {line}")
+        if found:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
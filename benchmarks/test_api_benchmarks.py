@@ -0,0 +1,105 @@
+"""pytest-benchmark suite for the API hot paths, in-process through TestClient on a populated temp database.
+
+Run it on its own (it points DATABASE_URL at a temp file before importing the app), from the directory that
+contains the project:
+
+    pytest <project>/benchmarks --benchmark-only
+    # record a baseline, then fail when a later run is more than 15% slower (e.g. in CI before deploying)
+    pytest <project>/benchmarks --benchmark-only --benchmark-autosave
+    pytest <project>/benchmarks --benchmark-only --benchmark-compare --benchmark-compare-fail=mean:15%
+"""
+import asyncio
+
+import pytest
+
+pytest.importorskip("pytest_benchmark")
+
+from .utils import use_temp_database  # noqa: E402
+
+use_temp_database("pytest_benchmark")
+
+from starlette.testclient import TestClient  # noqa: E402
+
+from ..cache import cache  # noqa: E402
+from ..main import app  # noqa: E402
+from ..populate_todos import populate, DEFAULT_PASSWORD  # noqa: E402
+
+USERNAME = "benchuser0"
+TODOS_PER_USER = 1000
+TODO = {"title": "Benchmark", "description": "Benchmark todo", "priority": 3}
+
+
+@pytest.fixture(scope="module")
+def client():
+    populate(users=1, todos_per_user=TODOS_PER_USER, prefix="benchuser", seed=1)
+    # One client (and event loop) for the module so pooled connections are reused
+    with TestClient(app) as client:
+        token = client.post("/auth/token", data={"username": USERNAME, "password": DEFAULT_PASSWORD})
+        client.headers["Authorization"] = f"Bearer {token.json()['access_token']}"
+        yield client
+
+
+def clear_cache():
+    asyncio.run(cache.clear())
+
+
+def new_todo(client) -> int:
+    client.post("/todos/add_todo", json=TODO)
+    return client.get("/todos", params={"order": "desc", "limit": 1}).json()[0]["id"]
+
+
+def test_login(benchmark, client):
+    form = {"username": USERNAME, "password": DEFAULT_PASSWORD}
+    response = benchmark.pedantic(client.post, args=("/auth/token",), kwargs={"data": form}, rounds=10)
+    assert response.status_code == 200
+
+
+def test_refresh(benchmark, client):
+    # Rotation: every call consumes the refresh token and hands out the next one
+    tokens = client.post("/auth/token", data={"username": USERNAME, "password": DEFAULT_PASSWORD}).json()
+    current = [tokens["refresh_token"]]
+
+    def refresh():
+        response = client.post("/auth/refresh", json={"refresh_token": current[0]})
+        current[0] = response.json()["refresh_token"]
+        return response
+
+    response = benchmark(refresh)
+    assert response.status_code == 200
+
+
+def test_list_todos_cached(benchmark, client):
+    response = benchmark(client.get, "/todos", params={"limit": 100})
+    assert response.status_code == 200
+
+
+def test_list_todos_uncached(benchmark, client):
+    response = benchmark.pedantic(
+        client.get, args=("/todos",), kwargs={"params": {"limit": 100}}, setup=clear_cache, rounds=50
+    )
+    assert len(response.json()) == 100
+
+
+def test_get_todo(benchmark, client):
+    todo_id = new_todo(client)
+    response = benchmark.pedantic(client.get, args=(f"/todos/{todo_id}",), setup=clear_cache, rounds=50)
+    assert response.status_code == 200
+
+
+def test_create_todo(benchmark, client):
+    response = benchmark(client.post, "/todos/add_todo", json=TODO)
+    assert response.status_code == 201
+
+
+def test_update_todo(benchmark, client):
+    todo_id = new_todo(client)
+    response = benchmark(client.put, f"/todos/{todo_id}", json={**TODO, "complete": True})
+    assert response.status_code == 200
+
+
+def test_delete_todo(benchmark, client):
+    def setup():
+        return (f"/todos/{new_todo(client)}",), {}
+
+    response = benchmark.pedantic(client.delete, setup=setup, rounds=50)
+    assert response.status_code == 204
@@ -0,0 +1,45 @@
+import os
+import statistics
+import tempfile
+
+# Benchmark clients all log in from one address (and often as one user): the login/signup limits would turn
+# most of their requests into 429s. Set the variables to measure with the limits on.
+NO_RATE_LIMITS = {"LOGIN_IP_RATE": "0", "LOGIN_USERNAME_RATE": "0", "SIGNUP_IP_RATE": "0"}
+
+
+def use_temp_database(name: str) -> str:
+    """Point DATABASE_URL at a fresh SQLite file and turn the rate limits off (call before importing the app)."""
+    path = os.path.join(tempfile.mkdtemp(prefix="todos-bench-"), f"{name}.db")
+    os.environ["DATABASE_URL"] = f"sqlite:///{path}"
+    os.environ.setdefault("SECRET_KEY", "benchmark-secret")
+    os.environ.setdefault("ALGORITHM", "HS256")
+    for variable, value in NO_RATE_LIMITS.items():
+        os.environ.setdefault(variable, value)
+    return path
+
+
+def percentile(samples: list[float], pct: float) -> float:
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def summarize(samples: list[float]) -> dict:
+    """Count, mean and p50/p95/p99 in milliseconds of latencies given in seconds."""
+    ms = [s * 1000 for s in samples]
+    return {
+        "count": len(ms),
+        "mean_ms": statistics.fmean(ms),
+        "p50_ms": percentile(ms, 50),
+        "p95_ms": percentile(ms, 95),
+        "p99_ms": percentile(ms, 99),
+    }
+
+
+def report(label: str, samples: list[float]):
+    """Print count, mean and p50/p95/p99 of latencies given in seconds."""
+    stats = summarize(samples)
+    print(
+        f"{label:<32} n={stats['count']:<6} mean={stats['mean_ms']:8.2f}ms "
+        f"p50={stats['p50_ms']:8.2f}ms p95={stats['p95_ms']:8.2f}ms p99={stats['p99_ms']:8.2f}ms"
+    )
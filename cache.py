@@ -0,0 +1,230 @@
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Optional, Union
+
+from .settings import settings
+
+# memory:// (per process, the default) or redis://host:port/db to share the cache between workers
+CACHE_URL = settings.cache_url
+# Entries kept by the in-process backend before the least recently used ones are evicted
+CACHE_MAX_SIZE = settings.cache_max_size
+# Namespace for our keys when the Redis database is shared with other apps
+CACHE_KEY_PREFIX = settings.cache_key_prefix
+
+CacheValue = Union[str, bytes, int]
+
+
+class TTLCache:
+    """Small in-process LRU cache whose entries also expire after ``ttl`` seconds (never when ``ttl`` is None)."""
+
+    def __init__(self, maxsize: int, ttl: Optional[float] = None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+
+    def _live_entry(self, key):
+        entry = self._data.get(key)
+        if entry is not None and entry[1] <= time.monotonic():
+            del self._data[key]
+            return None
+        return entry
+
+    def get(self, key):
+        entry = self._live_entry(key)
+        if entry is None:
+            self.misses += 1
+            return None
+
+        # Mark as most recently used
+        self._data.move_to_end(key)
+        self.hits += 1
+        return entry[0]
+
+    def set(self, key, value, ttl: Optional[float] = None):
+        if self.maxsize <= 0:
+            return
+        ttl = self.ttl if ttl is None else ttl
+        expires_at = time.monotonic() + ttl if ttl is not None else float("inf")
+        self._data[key] = (value, expires_at)
+        self._data.move_to_end(key)
+        # Evict least recently used entries
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def incr(self, key, amount: int = 1, ttl: Optional[float] = None) -> int:
+        """Add ``amount`` to a counter; ``ttl`` only applies when the counter is created (like Redis INCR + EXPIRE NX)."""
+        entry = self._live_entry(key)
+        if entry is None:
+            self.set(key, amount, ttl)
+            return amount
+
+        value = entry[0] + amount
+        self._data[key] = (value, entry[1])
+        self._data.move_to_end(key)
+        return value
+
+    def delete(self, key):
+        self._data.pop(key, None)
+
+    def clear(self):
+        self._data.clear()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self._data)
+
+    def stats(self) -> dict:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+            "ttl": self.ttl,
+        }
+
+
+class CacheBackend(ABC):
+    """Async key/value cache shared by the app: principals, todo versions and responses, rate-limit counters.
+
+    Values are ``str``/``bytes`` (or ints written by ``incr``); a Redis backend hands them back as ``bytes``,
+    so callers decode with ``json.loads``/``int()`` which accept both.
+    """
+    name = ""
+    # True when every worker sees the same entries (what the todo versions behind ETags need)
+    shared = False
+
+    @abstractmethod
+    async def get(self, key: str) -> Optional[CacheValue]:
+        ...
+
+    @abstractmethod
+    async def set(self, key: str, value: CacheValue, ttl: Optional[float] = None):
+        ...
+
+    @abstractmethod
+    async def delete(self, key: str):
+        ...
+
+    @abstractmethod
+    async def incr(self, key: str, amount: int = 1, ttl: Optional[float] = None) -> int:
+        ...
+
+    @abstractmethod
+    async def clear(self):
+        ...
+
+    @abstractmethod
+    def stats(self) -> dict:
+        ...
+
+    async def close(self):
+        pass
+
+
+class MemoryCache(CacheBackend):
+    """Per-process TTL/LRU backend: no network round-trip, but every worker has its own copy."""
+    name = "memory"
+
+    def __init__(self, maxsize: int = CACHE_MAX_SIZE):
+        self.local = TTLCache(maxsize)
+
+    async def get(self, key: str) -> Optional[CacheValue]:
+        return self.local.get(key)
+
+    async def set(self, key: str, value: CacheValue, ttl: Optional[float] = None):
+        self.local.set(key, value, ttl)
+
+    async def delete(self, key: str):
+        self.local.delete(key)
+
+    async def incr(self, key: str, amount: int = 1, ttl: Optional[float] = None) -> int:
+        return self.local.incr(key, amount, ttl)
+
+    async def clear(self):
+        self.local.clear()
+
+    def stats(self) -> dict:
+        return {"backend": self.name, **self.local.stats()}
+
+
+class RedisCache(CacheBackend):
+    """Backend for anything speaking the Redis protocol (Redis, Valkey, KeyDB...), shared by all workers.
+
+    Eviction beyond TTLs is the server's ``maxmemory-policy`` (e.g. ``allkeys-lru``).
+    """
+    name = "redis"
+    shared = True
+
+    def __init__(self, client, prefix: str = CACHE_KEY_PREFIX):
+        self.client = client
+        self.prefix = prefix
+        self.hits = 0
+        self.misses = 0
+
+    @classmethod
+    def from_url(cls, url: str, prefix: str = CACHE_KEY_PREFIX) -> "RedisCache":
+        try:
+            import redis.asyncio as redis
+        except ImportError as exc:
+            raise ImportError("CACHE_URL points at Redis but the 'redis' package is not installed.") from exc
+        return cls(redis.Redis.from_url(url), prefix)
+
+    async def get(self, key: str) -> Optional[CacheValue]:
+        value = await self.client.get(self.prefix + key)
+        if value is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return value
+
+    async def set(self, key: str, value: CacheValue, ttl: Optional[float] = None):
+        await self.client.set(self.prefix + key, value, px=int(ttl * 1000) if ttl is not None else None)
+
+    async def delete(self, key: str):
+        await self.client.delete(self.prefix + key)
+
+    async def incr(self, key: str, amount: int = 1, ttl: Optional[float] = None) -> int:
+        if ttl is None:
+            return await self.client.incrby(self.prefix + key, amount)
+        # One round-trip; NX keeps the expiry set when the counter was created
+        async with self.client.pipeline(transaction=True) as pipe:
+            pipe.incrby(self.prefix + key, amount)
+            pipe.pexpire(self.prefix + key, int(ttl * 1000), nx=True)
+            value, _ = await pipe.execute()
+        return value
+
+    async def clear(self):
+        # Only our namespace, other apps may share the database
+        keys = [key async for key in self.client.scan_iter(match=self.prefix + "*", count=1000)]
+        for start in range(0, len(keys), 1000):
+            await self.client.delete(*keys[start:start + 1000])
+        self.hits = 0
+        self.misses = 0
+
+    def stats(self) -> dict:
+        return {"backend": self.name, "hits": self.hits, "misses": self.misses}
+
+    async def close(self):
+        await self.client.aclose()
+
+
+def create_cache(url: str) -> CacheBackend:
+    """Cache backend for a CACHE_URL: ``memory://`` or ``redis://``/``rediss://``/``unix://``."""
+    scheme = url.split("://", 1)[0].lower()
+    if scheme == "memory":
+        return MemoryCache(CACHE_MAX_SIZE)
+    if scheme in ("redis", "rediss", "unix"):
+        return RedisCache.from_url(url)
+    raise ValueError(f"Unsupported CACHE_URL scheme '{scheme}'.")
+
+
+cache = create_cache(CACHE_URL)
+
+
+# Cache dependency
+def get_cache() -> CacheBackend:
+    return cache
@@ -1,37 +1,242 @@
 # create_engine: Creates connection to the DB
-import os
+import logging
+import time
+from contextvars import ContextVar
+from typing import Optional
 
-from dotenv import load_dotenv
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+from sqlalchemy.pool import AsyncAdaptedQueuePool
 
-load_dotenv()
+from .metrics import DB_POOL_CHECKOUTS, DB_POOL_WAIT
+from .settings import Settings, settings
 
 # declarative_base: ORM models (tables) in a class-based way
 from sqlalchemy.ext.declarative import declarative_base
 
 # sessionmaker: Factory function that creates DB session objects that interacts with DB (run queries, add data, etc.)
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.orm import sessionmaker, Session
 
 # DB URI (/// -> relative path)
-SQLALCHEMY_DATABASE_URI = os.getenv("DATABASE_URL")
+SQLALCHEMY_DATABASE_URI = settings.database_url
 if not SQLALCHEMY_DATABASE_URI:
     raise ValueError("DATABASE_URL environment variable not set!")
 
+# Async driver used for each backend when DATABASE_URL names a sync (or no) driver
+ASYNC_DRIVERS = {
+    "sqlite": "aiosqlite",
+    "postgresql": "asyncpg",
+    "mysql": "aiomysql",
+}
+
+
+def get_async_url(url: str) -> str:
+    """Return the async flavour of a database URL.
+
+    A URL that already names an async driver (e.g. ``sqlite+aiosqlite://``) is kept as is,
+    otherwise the driver is swapped for the backend's async driver.
+    """
+    url_obj = make_url(url)
+    backend = url_obj.get_backend_name()
+    driver = url_obj.get_driver_name()
+
+    if driver in ASYNC_DRIVERS.values():
+        return url_obj.render_as_string(hide_password=False)
+    if backend not in ASYNC_DRIVERS:
+        raise ValueError(f"No async driver configured for '{backend}' databases.")
+
+    return url_obj.set(drivername=f"{backend}+{ASYNC_DRIVERS[backend]}").render_as_string(hide_password=False)
+
+
+def get_sync_url(url: str) -> str:
+    """Return the sync flavour of a database URL (used by scripts and schema creation)."""
+    url_obj = make_url(url)
+    if url_obj.get_driver_name() in ASYNC_DRIVERS.values():
+        return url_obj.set(drivername=url_obj.get_backend_name()).render_as_string(hide_password=False)
+    return url_obj.render_as_string(hide_password=False)
+
+
+class InstrumentedAsyncPool(AsyncAdaptedQueuePool):
+    """Queue pool that records checkouts and how long each one waited for a connection."""
+
+    def connect(self):
+        started_at = time.perf_counter()
+        try:
+            return super().connect()
+        finally:
+            DB_POOL_CHECKOUTS.inc()
+            DB_POOL_WAIT.observe(time.perf_counter() - started_at)
+
+
+def is_memory_database(url: str) -> bool:
+    url_obj = make_url(url)
+    return url_obj.get_backend_name() == "sqlite" and url_obj.database in (None, "", ":memory:")
+
+
+def pool_options(url: str, config: Settings = settings) -> dict:
+    """Connection pool settings for ``create_engine`` from the DB_POOL_* settings."""
+    if is_memory_database(url):
+        # In-memory SQLite lives in a single connection, pool sizing doesn't apply
+        return {}
+
+    is_sqlite = make_url(url).get_backend_name() == "sqlite"
+    # Servers (and proxies/firewalls) drop idle connections, a local SQLite file doesn't
+    pool_recycle = config.db_pool_recycle if config.db_pool_recycle is not None else (-1 if is_sqlite else 1800)
+    pool_pre_ping = config.db_pool_pre_ping if config.db_pool_pre_ping is not None else not is_sqlite
+    return {
+        "pool_size": config.db_pool_size,
+        "max_overflow": config.db_max_overflow,
+        "pool_timeout": config.db_pool_timeout,
+        "pool_recycle": pool_recycle,
+        "pool_pre_ping": pool_pre_ping,
+    }
+
+
+# SQLite performance profile, applied to every new connection of a file database
+SQLITE_TUNED = settings.sqlite_tuned
+SQLITE_PRAGMAS = {
+    # WAL: readers don't block the writer and commits append to the log instead of rewriting pages
+    "journal_mode": settings.sqlite_journal_mode,
+    # NORMAL is durable against app crashes with WAL, fsync happens at checkpoints instead of every commit
+    "synchronous": settings.sqlite_synchronous,
+    # Wait for a lock instead of failing immediately with "database is locked"
+    "busy_timeout": settings.sqlite_busy_timeout_ms,
+    # Negative value -> size in KiB
+    "cache_size": -settings.sqlite_cache_size_kb,
+    "mmap_size": settings.sqlite_mmap_size,
+}
+
+
+def apply_sqlite_pragmas(sync_engine, pragmas: dict = SQLITE_PRAGMAS):
+    """Run ``PRAGMA name=value`` for each pragma on every new connection of ``sync_engine``."""
+
+    @event.listens_for(sync_engine, "connect")
+    def set_sqlite_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for name, value in pragmas.items():
+            cursor.execute(f"PRAGMA {name}={value}")
+        cursor.close()
+
+
+def create_engines(url: str):
+    """Create the (sync engine, async engine) pair for ``url`` with the configured pool and SQLite profile."""
+    options = pool_options(url)
+
+    # The sync engine is only used for schema creation and scripts (populate_todos.py)
+    sync_engine = create_engine(get_sync_url(url), **options)
+
+    # The async engine is used by the API so queries don't block the event loop
+    # (in-memory SQLite keeps SQLAlchemy's default single-connection pool)
+    if not is_memory_database(url):
+        options["poolclass"] = InstrumentedAsyncPool
+    async_db_engine = create_async_engine(get_async_url(url), **options)
+
+    if SQLITE_TUNED and make_url(url).get_backend_name() == "sqlite" and not is_memory_database(url):
+        apply_sqlite_pragmas(sync_engine)
+        # Async engines fire their events on the underlying sync engine
+        apply_sqlite_pragmas(async_db_engine.sync_engine)
+
+    return sync_engine, async_db_engine
+
+
 # engine: core interface to the DB, manages connection pool and interacts with directly to the DB (connects FastAPIs to the DB)
-engine = create_engine(SQLALCHEMY_DATABASE_URI)
+# async_engine: used by the API so queries don't block the event loop
+engine, async_engine = create_engines(SQLALCHEMY_DATABASE_URI)
+
+# Optional read replica: safe GETs read from it, writes and read-your-writes flows stay on the primary (replica.py)
+DATABASE_REPLICA_URL = settings.database_replica_url
+if DATABASE_REPLICA_URL:
+    _, replica_async_engine = create_engines(DATABASE_REPLICA_URL)
+else:
+    replica_async_engine = async_engine
 
 # sessionmaker: factory that creates DB session objects i.e. provides session each time when wants to interact with DB
 # (bind=engine): links the session to the previously created engine, so all session use the same DB connection
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# expire_on_commit=False: objects stay readable after commit without another (async) round-trip
+AsyncSessionLocal = async_sessionmaker(bind=async_engine, autoflush=False, expire_on_commit=False)
+
+
+class ReadOnlySession(Session):
+    """Session for replica reads: flushing ORM changes is an error."""
+
+    def flush(self, objects=None):
+        if self.new or self.dirty or self.deleted:
+            raise RuntimeError("Read-only session: writes must go through get_db (the primary).")
+        super().flush(objects)
+
+
+ReadSessionLocal = async_sessionmaker(
+    bind=replica_async_engine, sync_session_class=ReadOnlySession, autoflush=False, expire_on_commit=False
+)
+
 # base class for all ORM models
 Base = declarative_base()
 
+logger = logging.getLogger(__name__)
+
+# Queries taking longer than this are logged with the route that ran them
+SLOW_QUERY_MS = settings.slow_query_ms
+
+
+class QueryStats:
+    """Statements executed and time spent in the DB while handling one request."""
+
+    def __init__(self, scope: dict):
+        self.scope = scope
+        self.count = 0
+        self.duration = 0.0
+
+    @property
+    def route(self) -> str:
+        # The router stores the matched route in the request scope, e.g. "/todos/{todo_id}"
+        route = self.scope.get("route")
+        return getattr(route, "path", None) or self.scope.get("path", "")
+
+
+# Set by QueryStatsMiddleware for the duration of a request, None outside requests
+query_stats: ContextVar[Optional[QueryStats]] = ContextVar("query_stats", default=None)
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    context._query_started_at = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - context._query_started_at
+
+    stats = query_stats.get()
+    if stats is not None:
+        stats.count += 1
+        stats.duration += elapsed
+
+    if elapsed * 1000 >= SLOW_QUERY_MS:
+        logger.warning("Slow query (%.1f ms) on %s: %s", elapsed * 1000,
+                       stats.route if stats is not None else "<no request>", statement)
+
+
+def instrument_engine(sync_engine):
+    """Count and time every statement executed through ``sync_engine``."""
+    event.listen(sync_engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(sync_engine, "after_cursor_execute", _after_cursor_execute)
+
+
+instrument_engine(engine)
+# Async engines fire their events on the underlying sync engine
+instrument_engine(async_engine.sync_engine)
+if replica_async_engine is not async_engine:
+    instrument_engine(replica_async_engine.sync_engine)
+
 
 # DB dependency
-def get_db():
-    db = SessionLocal()
-    try:
+async def get_db():
+    async with AsyncSessionLocal() as db:
+        yield db
+
+
+# Read-only DB dependency (replica when DATABASE_REPLICA_URL is set, otherwise the primary)
+async def get_read_db():
+    async with ReadSessionLocal() as db:
         yield db
-    finally:
-        db.close()
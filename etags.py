@@ -0,0 +1,104 @@
+import hashlib
+import json
+import secrets
+from typing import Optional
+
+from fastapi import Request, Response
+from starlette import status
+
+from .cache import CacheBackend, cache
+from .replica import mark_written, recently_written
+from .responses import dumps
+from .settings import settings
+
+# With the per-process memory:// cache, only safe with a single worker: opt-in there
+TODO_ETAGS = settings.todo_etags if settings.todo_etags is not None else cache.shared
+# Serialized todo responses are kept per (user, version) for this long; 0 disables the response cache
+TODO_RESPONSE_CACHE_TTL_SECONDS = settings.todo_response_cache_ttl_seconds
+
+
+def _version_key(user_id: int) -> str:
+    # Version of a user's todos, bumped by every todo write that goes through the API
+    return f"todo_version:{user_id}"
+
+
+async def _restart_version(cache: CacheBackend, user_id: int) -> int:
+    # The version was lost (first use, evicted, cache flushed or restarted): continue from a random point
+    # so an ETag handed out for the lost version never matches again
+    return await cache.incr(_version_key(user_id), secrets.randbits(40))
+
+
+async def bump_todo_version(cache: CacheBackend, user_id: int):
+    if TODO_ETAGS:
+        version = await cache.incr(_version_key(user_id))
+        if version == 1:
+            await _restart_version(cache, user_id)
+    await mark_written(cache, user_id)
+
+
+async def todo_etag(cache: CacheBackend, user_id: int, resource: str) -> Optional[str]:
+    """Strong ETag for a todo resource of a user, e.g. the list for a query string or a single todo.
+
+    None when TODO_ETAGS is off, and while the replica may still be behind the user's last write.
+    """
+    if not TODO_ETAGS or await recently_written(cache, user_id):
+        return None
+
+    version = await cache.get(_version_key(user_id))
+    version = int(version) if version is not None else await _restart_version(cache, user_id)
+    digest = hashlib.blake2s(resource.encode(), digest_size=6).hexdigest()
+    return f'"{user_id}-{version}-{digest}"'
+
+
+def _etag_matches(request: Request, etag: str, match_any: bool = True) -> bool:
+    if_none_match = request.headers.get("if-none-match")
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        # "*" matches any current representation, so only once the resource is known to exist
+        return match_any
+    # If-None-Match uses the weak comparison, so W/ prefixes are ignored
+    return any(tag.strip().removeprefix("W/") == etag for tag in if_none_match.split(","))
+
+
+def not_modified(request: Request, etag: Optional[str]) -> Optional[Response]:
+    """304 when the client's If-None-Match matches ``etag`` (``*`` included), otherwise None."""
+    if etag is None or not _etag_matches(request, etag):
+        return None
+    return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag})
+
+
+async def cached_response(cache: CacheBackend, request: Request, etag: Optional[str],
+                          exists: bool = True) -> Optional[Response]:
+    """304 when the client already has this version, the cached body when we do, otherwise None.
+
+    ``exists=False`` for resources that may not exist (a single todo before its lookup): ``If-None-Match: *``
+    is then left to the route, which answers 404 or checks it with not_modified once the row is found.
+    """
+    if etag is None:
+        return None
+    if _etag_matches(request, etag, match_any=exists):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag})
+
+    if not TODO_RESPONSE_CACHE_TTL_SECONDS:
+        return None
+    cached = await cache.get(f"todo_response:{etag}")
+    if cached is not None:
+        # "<headers as JSON>\n<body>"
+        headers, body = bytes(cached).split(b"\n", 1)
+        return Response(content=body, media_type="application/json", headers=json.loads(headers))
+    return None
+
+
+async def cache_json_response(cache: CacheBackend, etag: Optional[str], content,
+                              headers: Optional[dict] = None) -> Response:
+    """Serialize ``content`` (plain data, e.g. rows turned into dicts) once, remember the bytes under ``etag``
+    and return the response."""
+    body = dumps(content)
+    headers = dict(headers or {})
+    if etag is not None:
+        headers["ETag"] = etag
+        if TODO_RESPONSE_CACHE_TTL_SECONDS:
+            await cache.set(f"todo_response:{etag}", json.dumps(headers).encode() + b"\n" + body,
+                            ttl=TODO_RESPONSE_CACHE_TTL_SECONDS)
+    return Response(content=body, media_type="application/json", headers=headers)
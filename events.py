@@ -0,0 +1,222 @@
+import asyncio
+import logging
+from abc import ABC, abstractmethod
+from typing import Optional
+
+from .metrics import EVENTS_PUBLISHED, EVENTS_DROPPED_SUBSCRIBERS
+from .responses import dumps
+from .settings import settings
+
+logger = logging.getLogger(__name__)
+
+# memory:// (events reach the streams of this worker only) or redis://host:port/db to fan out across workers
+EVENTS_URL = settings.events_url
+# Events buffered per stream; a client that falls this far behind is disconnected
+EVENT_QUEUE_SIZE = settings.event_queue_size
+# Comment line sent on idle streams so proxies don't time them out
+SSE_KEEPALIVE_SECONDS = settings.sse_keepalive_seconds
+
+KEEPALIVE_FRAME = b": keepalive\n\n"
+
+
+def sse_frame(event: str, data) -> bytes:
+    """One Server-Sent Events message; the JSON payload is a single line."""
+    return b"event: " + event.encode() + b"\ndata: " + dumps(data) + b"\n\n"
+
+
+# Replaces the backlog of a subscriber that fell behind: the client catches up with GET /todos/changes
+DROPPED_FRAME = sse_frame("dropped", {"reason": "Too many pending events, resync with /todos/changes."})
+
+
+class Subscription:
+    """One open stream: a bounded queue of encoded frames."""
+
+    __slots__ = ("user_id", "queue", "dropped")
+
+    def __init__(self, user_id: int, maxsize: int):
+        self.user_id = user_id
+        self.queue = asyncio.Queue(maxsize)
+        self.dropped = False
+
+    def offer(self, frame: bytes) -> bool:
+        """Queue a frame without waiting; False (and the subscriber is dropped) when the queue is full."""
+        try:
+            self.queue.put_nowait(frame)
+            return True
+        except asyncio.QueueFull:
+            # Pending events are useless to a client that has to resync anyway
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait(DROPPED_FRAME)
+            self.dropped = True
+            return False
+
+
+class EventHub:
+    """In-process fan-out from a user id to that user's open streams.
+
+    Only touched from the event loop thread. A publish encodes the event once; every subscriber
+    gets a reference to the same bytes and nobody ever waits on a slow one.
+    """
+
+    def __init__(self, queue_size: int):
+        self.queue_size = queue_size
+        self._subscribers: dict[int, set[Subscription]] = {}
+
+    def subscribe(self, user_id: int) -> Subscription:
+        subscription = Subscription(user_id, self.queue_size)
+        self._subscribers.setdefault(user_id, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        subscriptions = self._subscribers.get(subscription.user_id)
+        if subscriptions is None:
+            return
+        subscriptions.discard(subscription)
+        if not subscriptions:
+            del self._subscribers[subscription.user_id]
+
+    def deliver(self, user_id: int, frame: bytes):
+        subscriptions = self._subscribers.get(user_id)
+        if not subscriptions:
+            return
+        for subscription in list(subscriptions):
+            if not subscription.offer(frame):
+                EVENTS_DROPPED_SUBSCRIBERS.inc()
+                self.unsubscribe(subscription)
+
+    @property
+    def connections(self) -> int:
+        return sum(len(subscriptions) for subscriptions in self._subscribers.values())
+
+
+class EventBroker(ABC):
+    """Carries published events to the hub of every worker."""
+
+    name = "base"
+
+    def __init__(self, hub: EventHub):
+        self.hub = hub
+
+    @abstractmethod
+    async def publish(self, user_id: int, frame: bytes):
+        ...
+
+    async def start(self):
+        """Start receiving events from the other workers (idempotent)."""
+
+    async def close(self):
+        pass
+
+
+class MemoryBroker(EventBroker):
+    """Single worker: publishing is delivering."""
+
+    name = "memory"
+
+    async def publish(self, user_id: int, frame: bytes):
+        self.hub.deliver(user_id, frame)
+
+
+class RedisBroker(EventBroker):
+    """Redis pub/sub on one channel: each worker receives every event and delivers it to its own streams.
+
+    The publishing worker gets its events back from Redis too, so there is a single delivery path.
+    """
+
+    name = "redis"
+
+    def __init__(self, hub: EventHub, client, channel: str):
+        super().__init__(hub)
+        self.client = client
+        self.channel = channel
+        self._pubsub = None
+        self._listener: Optional[asyncio.Task] = None
+
+    @classmethod
+    def from_url(cls, hub: EventHub, url: str, prefix: str = settings.cache_key_prefix) -> "RedisBroker":
+        try:
+            import redis.asyncio as redis
+        except ImportError as exc:
+            raise ImportError("EVENTS_URL points at Redis but the 'redis' package is not installed.") from exc
+        return cls(hub, redis.Redis.from_url(url), f"{prefix}todo_events")
+
+    async def publish(self, user_id: int, frame: bytes):
+        await self.client.publish(self.channel, str(user_id).encode() + b"\n" + frame)
+
+    async def start(self):
+        if self._listener is not None:
+            return
+        self._pubsub = self.client.pubsub(ignore_subscribe_messages=True)
+        await self._pubsub.subscribe(self.channel)
+        self._listener = asyncio.get_running_loop().create_task(self._listen())
+
+    async def _listen(self):
+        while True:
+            try:
+                async for message in self._pubsub.listen():
+                    user_id, frame = message["data"].split(b"\n", 1)
+                    self.hub.deliver(int(user_id), frame)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                # Connection lost: redis-py reconnects and resubscribes on the next read
+                logger.exception("Todo event listener failed, retrying")
+                await asyncio.sleep(1)
+
+    async def close(self):
+        if self._listener is not None:
+            self._listener.cancel()
+            self._listener = None
+        if self._pubsub is not None:
+            await self._pubsub.aclose()
+            self._pubsub = None
+        await self.client.aclose()
+
+
+def create_broker(url: str, hub: EventHub) -> EventBroker:
+    """Event broker for an EVENTS_URL: ``memory://`` or ``redis://``/``rediss://``/``unix://``."""
+    scheme = url.split("://", 1)[0].lower()
+    if scheme == "memory":
+        return MemoryBroker(hub)
+    if scheme in ("redis", "rediss", "unix"):
+        return RedisBroker.from_url(hub, url)
+    raise ValueError(f"Unsupported EVENTS_URL scheme '{scheme}'.")
+
+
+event_hub = EventHub(EVENT_QUEUE_SIZE)
+event_broker = create_broker(EVENTS_URL, event_hub)
+
+
+async def publish_todo_events(user_id: int, event_type: str, todos: list[dict]):
+    """Push created/updated/deleted events to the owner's streams (call after the commit).
+
+    The events of one write (a bulk one included) travel as a single chunk: one publish, one queue slot.
+    """
+    if not todos:
+        return
+    EVENTS_PUBLISHED.inc((event_type,), len(todos))
+    await event_broker.publish(user_id, b"".join(sse_frame(event_type, todo) for todo in todos))
+
+
+async def event_stream(user_id: int, keepalive: float = SSE_KEEPALIVE_SECONDS):
+    """Body of a /todos/stream response: the user's events as they come, keepalives while idle."""
+    # Runs on the first iteration: a response that never starts streaming leaves no subscription behind
+    subscription = event_hub.subscribe(user_id)
+    try:
+        # Also tells EventSource clients how long to wait before reconnecting
+        yield b"retry: 3000\n\n"
+        while True:
+            try:
+                # A timeout scope rather than wait_for: no extra task per event on every stream
+                async with asyncio.timeout(keepalive):
+                    frame = await subscription.queue.get()
+            except TimeoutError:
+                yield KEEPALIVE_FRAME
+                continue
+            yield frame
+            if frame is DROPPED_FRAME:
+                return
+    finally:
+        # Also runs when the client disconnects (the response task is cancelled)
+        event_hub.unsubscribe(subscription)
@@ -0,0 +1,148 @@
+import asyncio
+import contextvars
+import logging
+import time
+from typing import Awaitable, Callable, Optional, TypeVar
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from .database import AsyncSessionLocal, query_stats
+from .metrics import GROUP_COMMIT_BATCH_SIZE, GROUP_COMMIT_DURATION
+from .settings import settings
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+# A write: statements run on the given session, whose transaction the caller doesn't commit
+WriteOperation = Callable[[AsyncSession], Awaitable[T]]
+
+# Concurrent writes share one transaction (one commit, one fsync) instead of committing one by one
+GROUP_COMMIT = settings.group_commit
+# A batch is committed once it holds this many writes...
+GROUP_COMMIT_MAX_WRITES = settings.group_commit_max_writes
+# ...or this long after its first write was queued (the latency a lone write pays for the batching)
+GROUP_COMMIT_WINDOW_MS = settings.group_commit_window_ms
+
+# Queued by close(): the runner commits what it has and stops
+_STOP = object()
+
+
+class GroupCommitter:
+    """Runs queued writes in batches, one transaction and one commit per batch.
+
+    A single runner task takes the writes off the queue: while a batch commits the next one fills up, so
+    the busier the writers, the bigger the batches. Each write runs in its own SAVEPOINT: a write that
+    fails is rolled back alone and its caller gets the exception, the rest of the batch commits. If the
+    commit itself fails, every caller of the batch gets that error. The statements of a write count towards
+    its own request's query stats (Server-Timing); the shared BEGIN and COMMIT towards none.
+    """
+
+    def __init__(self, session_factory: async_sessionmaker, max_writes: int = GROUP_COMMIT_MAX_WRITES,
+                 window: float = GROUP_COMMIT_WINDOW_MS / 1000):
+        self.session_factory = session_factory
+        self.max_writes = max_writes
+        self.window = window
+        self._queue: Optional[asyncio.Queue] = None
+        self._runner: Optional[asyncio.Task] = None
+
+    async def submit(self, operation: WriteOperation[T]) -> T:
+        """Queue ``operation`` for the next batch and wait until it is committed; returns its result."""
+        if self._runner is None:
+            # Started on the first write, on the loop serving the requests. In an empty context: a copy of the
+            # first request's would count every later batch towards that request's query stats
+            self._queue = asyncio.Queue()
+            self._runner = asyncio.get_running_loop().create_task(self._run(), context=contextvars.Context())
+        future = asyncio.get_running_loop().create_future()
+        self._queue.put_nowait((operation, future, query_stats.get()))
+        return await future
+
+    async def _run(self):
+        while True:
+            batch = []
+            item = await self._queue.get()
+            deadline = time.monotonic() + self.window
+            while item is not _STOP:
+                batch.append(item)
+                if len(batch) >= self.max_writes:
+                    break
+                # Writes queued while the previous batch was committing are taken without waiting
+                if not self._queue.empty():
+                    item = self._queue.get_nowait()
+                    continue
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    async with asyncio.timeout(timeout):
+                        item = await self._queue.get()
+                except TimeoutError:
+                    break
+            if batch:
+                await self._commit(batch)
+            if item is _STOP:
+                return
+
+    async def _commit(self, batch: list):
+        started_at = time.perf_counter()
+        results = []
+        try:
+            async with self.session_factory() as db:
+                if db.bind.dialect.name == "sqlite":
+                    # SQLite drivers only open a transaction before INSERT/UPDATE/DELETE: a leading SAVEPOINT
+                    # would be a transaction of its own, committed on release. IMMEDIATE also takes the write
+                    # lock right away instead of failing to upgrade a read lock mid-batch.
+                    await db.execute(text("BEGIN IMMEDIATE"))
+                for operation, future, stats in batch:
+                    if future.done():
+                        # The request is gone (client disconnected)
+                        results.append(None)
+                        continue
+                    token = query_stats.set(stats)
+                    try:
+                        async with db.begin_nested():
+                            results.append((await operation(db), None))
+                    except Exception as exc:
+                        results.append((None, exc))
+                    finally:
+                        query_stats.reset(token)
+                await db.commit()
+        except Exception as exc:
+            logger.exception("Group commit of %d writes failed", len(batch))
+            results = [(None, exc)] * len(batch)
+
+        GROUP_COMMIT_BATCH_SIZE.observe(len(batch))
+        GROUP_COMMIT_DURATION.observe(time.perf_counter() - started_at)
+        for (_, future, _), outcome in zip(batch, results):
+            if outcome is None or future.done():
+                continue
+            result, exc = outcome
+            if exc is not None:
+                future.set_exception(exc)
+            else:
+                future.set_result(result)
+
+    async def close(self):
+        """Commit the writes still queued and stop the runner."""
+        if self._runner is None:
+            return
+        self._queue.put_nowait(_STOP)
+        await self._runner
+        self._runner = None
+
+
+group_committer = GroupCommitter(AsyncSessionLocal) if GROUP_COMMIT else None
+
+
+# Group committer dependency (None: every request commits its own writes)
+def get_group_committer() -> Optional[GroupCommitter]:
+    return group_committer
+
+
+async def run_write(db: AsyncSession, committer: Optional[GroupCommitter], operation: WriteOperation[T]) -> T:
+    """Run ``operation`` and commit it: on the request's session, or batched with concurrent writes."""
+    if committer is None:
+        result = await operation(db)
+        await db.commit()
+        return result
+    return await committer.submit(operation)
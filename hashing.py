@@ -0,0 +1,136 @@
+import argparse
+import asyncio
+import logging
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+
+from fastapi import HTTPException
+from passlib.context import CryptContext
+from passlib.hash import bcrypt
+from starlette import status
+
+from .metrics import PASSWORD_HASH_DURATION
+from .settings import settings
+
+logger = logging.getLogger(__name__)
+
+# bcrypt cost factor: every +1 doubles the CPU time of a hash/verify
+BCRYPT_ROUNDS = settings.bcrypt_rounds
+# Never calibrate below this (OWASP minimum for bcrypt)
+BCRYPT_MIN_ROUNDS = 10
+BCRYPT_MAX_ROUNDS = 16
+# When set, the rounds are calibrated at startup so one hash takes about this long on the host
+PASSWORD_HASH_TARGET_MS = settings.password_hash_target_ms
+
+
+def build_context(rounds: int) -> CryptContext:
+    # min_rounds = rounds: hashes made with fewer rounds are upgraded on the next successful login
+    return CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=rounds, bcrypt__min_rounds=rounds)
+
+
+# The one password context of the app (auth, users, scripts)
+pwd_context = build_context(BCRYPT_ROUNDS)
+
+
+def hash_password(password: str) -> str:
+    return pwd_context.hash(password)
+
+
+def verify_password(password: str, hashed_password: str) -> tuple[bool, Optional[str]]:
+    """Check a password; also returns a new hash when the stored one uses outdated parameters (else None)."""
+    return pwd_context.verify_and_update(password, hashed_password)
+
+
+def _timed(func, *args):
+    started_at = time.perf_counter()
+    result = func(*args)
+    return result, time.perf_counter() - started_at
+
+
+def calibrate_bcrypt_rounds(target_seconds: float, min_rounds: int = BCRYPT_MIN_ROUNDS,
+                            max_rounds: int = BCRYPT_MAX_ROUNDS) -> int:
+    """Highest bcrypt cost whose hash takes at most ``target_seconds`` on this host (never below ``min_rounds``)."""
+    hasher = bcrypt.using(rounds=min_rounds)
+    # Best of 3 at the lowest cost; each extra round doubles the work, so that predicts the rest
+    elapsed = min(_timed(hasher.hash, "calibration")[1] for _ in range(3))
+
+    rounds = min_rounds
+    while rounds < max_rounds and elapsed * 2 <= target_seconds:
+        rounds += 1
+        elapsed *= 2
+    return rounds
+
+
+def configure_password_hashing(rounds: int):
+    """Switch the shared context to ``rounds`` (in place, every importer of pwd_context sees it)."""
+    pwd_context.update(bcrypt__rounds=rounds, bcrypt__min_rounds=rounds)
+
+
+def calibrate_password_hashing():
+    """Startup calibration mode, enabled by PASSWORD_HASH_TARGET_MS."""
+    if not PASSWORD_HASH_TARGET_MS:
+        return
+    rounds = calibrate_bcrypt_rounds(PASSWORD_HASH_TARGET_MS / 1000)
+    configure_password_hashing(rounds)
+    logger.info("Password hashing calibrated to bcrypt rounds=%d (target %s ms)", rounds, PASSWORD_HASH_TARGET_MS)
+
+
+# bcrypt releases the GIL while hashing, so a thread pool gives real parallelism without pickling overhead
+PASSWORD_HASH_WORKERS = settings.password_hash_workers or os.cpu_count() or 1
+# How many calls may wait for a free worker before new ones are rejected with 503
+PASSWORD_HASH_QUEUE_LIMIT = settings.password_hash_queue_limit
+
+
+class PasswordHashPool:
+    """Runs bcrypt hash/verify calls off the event loop on a bounded thread pool."""
+
+    def __init__(self, workers: int, queue_limit: int):
+        self.workers = workers
+        self.queue_limit = queue_limit
+        self.pending = 0
+        self._executor = None
+
+    @property
+    def executor(self) -> ThreadPoolExecutor:
+        # Created on first use so importing the app doesn't start threads
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="password-hash")
+        return self._executor
+
+    async def run(self, func, *args):
+        # Only touched from the event loop thread, so a plain counter is enough
+        if self.pending >= self.workers + self.queue_limit:
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Server is busy, please try again later.",
+                headers={"Retry-After": "1"},
+            )
+
+        self.pending += 1
+        try:
+            loop = asyncio.get_running_loop()
+            result, elapsed = await loop.run_in_executor(self.executor, _timed, func, *args)
+        finally:
+            self.pending -= 1
+
+        # Observed back on the event loop thread, metrics are never updated from the workers
+        PASSWORD_HASH_DURATION.observe(elapsed, (func.__name__,))
+        return result
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+password_hash_pool = PasswordHashPool(PASSWORD_HASH_WORKERS, PASSWORD_HASH_QUEUE_LIMIT)
+
+
+if __name__ == "__main__":
+    # Calibrate once per machine type and pin the result: python -m <project>.hashing --target-ms 250
+    parser = argparse.ArgumentParser(description="Recommend BCRYPT_ROUNDS for a target hash time on this host.")
+    parser.add_argument("--target-ms", type=float, default=250)
+    args = parser.parse_args()
+    print(f"BCRYPT_ROUNDS={calibrate_bcrypt_rounds(args.target_ms / 1000)}")
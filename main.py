@@ -1,17 +1,59 @@
+import asyncio
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
+from fastapi.responses import PlainTextResponse
 
-# DB connection object in database.py
-from .database import engine
-# ORM models -> database tables
-from .models import Base
+from .cache import cache
+# DB connection object in database.py (engines are created here but connect on first use)
+from .database import engine, async_engine, replica_async_engine
+from .events import event_broker, event_hub
+from .group_commit import group_committer
+from .hashing import calibrate_password_hashing, password_hash_pool
+from .metrics import registry, CONTENT_TYPE, DB_POOL_CHECKED_OUT, DB_POOL_OVERFLOW, DB_POOL_SIZE, SSE_CONNECTIONS
+from .middleware import QueryStatsMiddleware, MetricsMiddleware
+from .replica import check_replica_cache
+from .responses import FastJSONResponse
 from .routers import auth, todos, admin, users
+from .settings import settings
+from .sync import purge_tombstones_periodically
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Startup work runs once per worker when it starts serving, not on every import of the app
+    check_replica_cache(cache, settings)
+    if settings.db_auto_migrate:
+        # Versioned schema migrations (Alembic) -> database tables & indexes.
+        # Imported here: Alembic is the slowest import of the app and most boots don't need it.
+        from .migrations import upgrade_database
+        upgrade_database(engine)
+    # Pick the bcrypt rounds for this host when PASSWORD_HASH_TARGET_MS is set
+    calibrate_password_hashing()
+    # Old delta sync tombstones are deleted in the background, never as part of a request
+    tombstone_purge = asyncio.create_task(purge_tombstones_periodically())
+
+    yield
+
+    tombstone_purge.cancel()
+    password_hash_pool.shutdown()
+    if group_committer is not None:
+        # Writes still queued are committed before the engine goes away
+        await group_committer.close()
+    await event_broker.close()
+    await cache.close()
+    await async_engine.dispose()
+    if replica_async_engine is not async_engine:
+        await replica_async_engine.dispose()
 
-app = FastAPI()
 
-# Read metadata from ORM models
-# creates table automatically if it doesn't exist
-# bind=engine -> specify which database to create tables
-Base.metadata.create_all(bind=engine)
+# orjson-rendered JSON for every route unless it says otherwise
+app = FastAPI(default_response_class=FastJSONResponse, lifespan=lifespan)
+
+# Per-request SQL statement count & DB time (Server-Timing header)
+app.add_middleware(QueryStatsMiddleware)
+# Route latency / status / in-flight metrics (added last so it wraps everything)
+app.add_middleware(MetricsMiddleware)
 
 
 @app.get("/health", tags=["Health"])
@@ -19,6 +61,19 @@ async def check_health():
     return {'status': 'ok'}
 
 
+@app.get("/metrics", tags=["Health"], response_class=PlainTextResponse)
+async def get_metrics():
+    # Point-in-time values are read at scrape time instead of being tracked on every request
+    pool = async_engine.pool
+    if hasattr(pool, "checkedout"):
+        DB_POOL_CHECKED_OUT.set(pool.checkedout())
+        DB_POOL_OVERFLOW.set(max(pool.overflow(), 0))
+        DB_POOL_SIZE.set(pool.size())
+    SSE_CONNECTIONS.set(event_hub.connections)
+
+    return PlainTextResponse(registry.render(), media_type=CONTENT_TYPE)
+
+
 app.include_router(auth.router)
 app.include_router(todos.router)
 app.include_router(admin.router)
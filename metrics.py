@@ -0,0 +1,160 @@
+from bisect import bisect_left
+
+# Latency buckets in seconds
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def _format_labels(labelnames: tuple, labels: tuple, extra: str = "") -> str:
+    pairs = [f'{name}="{value}"' for name, value in zip(labelnames, labels)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Metric:
+    """Base for metrics kept in plain dicts.
+
+    Only the event loop thread updates metrics, so no locks are taken on the hot path.
+    """
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self._values = {}
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        lines.extend(self._render_samples())
+        return lines
+
+    def _render_samples(self) -> list[str]:
+        return [f"{self.name}{_format_labels(self.labelnames, labels)} {value}" for labels, value in self._values.items()]
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def inc(self, labels: tuple = (), amount: float = 1):
+        self._values[labels] = self._values.get(labels, 0) + amount
+
+    def value(self, labels: tuple = ()) -> float:
+        return self._values.get(labels, 0)
+
+
+class Gauge(Metric):
+    kind = "gauge"
+
+    def set(self, value: float, labels: tuple = ()):
+        self._values[labels] = value
+
+    def inc(self, labels: tuple = (), amount: float = 1):
+        self._values[labels] = self._values.get(labels, 0) + amount
+
+    def dec(self, labels: tuple = (), amount: float = 1):
+        self._values[labels] = self._values.get(labels, 0) - amount
+
+    def value(self, labels: tuple = ()) -> float:
+        return self._values.get(labels, 0)
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple = (), buckets: tuple = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = buckets
+
+    def observe(self, value: float, labels: tuple = ()):
+        state = self._values.get(labels)
+        if state is None:
+            # [per-bucket counts (last one is +Inf), sum, count]
+            state = self._values[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+        state[0][bisect_left(self.buckets, value)] += 1
+        state[1] += value
+        state[2] += 1
+
+    def count(self, labels: tuple = ()) -> int:
+        state = self._values.get(labels)
+        return state[2] if state else 0
+
+    def _render_samples(self) -> list[str]:
+        lines = []
+        for labels, (counts, total, count) in self._values.items():
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + ("+Inf",), counts):
+                cumulative += bucket_count
+                bucket_labels = _format_labels(self.labelnames, labels, 'le="%s"' % bound)
+                lines.append(f"{self.name}_bucket{bucket_labels} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, labels)} {total}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, labels)} {count}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self.metrics = []
+
+    def register(self, metric: Metric) -> Metric:
+        self.metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        lines = []
+        for metric in self.metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+# HTTP
+HTTP_REQUESTS = registry.register(Counter(
+    "http_requests_total", "HTTP requests by route and status.", ("method", "route", "status")))
+HTTP_REQUEST_DURATION = registry.register(Histogram(
+    "http_request_duration_seconds", "HTTP request latency by route.", ("method", "route")))
+HTTP_REQUESTS_IN_FLIGHT = registry.register(Gauge(
+    "http_requests_in_flight", "HTTP requests currently being handled."))
+
+# DB connection pool
+DB_POOL_CHECKOUTS = registry.register(Counter(
+    "db_pool_checkouts_total", "Connections checked out of the pool."))
+DB_POOL_WAIT = registry.register(Histogram(
+    "db_pool_wait_seconds", "Time spent waiting to check a connection out of the pool."))
+DB_POOL_CHECKED_OUT = registry.register(Gauge(
+    "db_pool_checked_out", "Connections currently checked out."))
+DB_POOL_OVERFLOW = registry.register(Gauge(
+    "db_pool_overflow", "Connections open beyond the pool size."))
+DB_POOL_SIZE = registry.register(Gauge(
+    "db_pool_size", "Configured pool size."))
+
+# Auth
+PASSWORD_HASH_DURATION = registry.register(Histogram(
+    "password_hash_duration_seconds", "bcrypt hash/verify time on the worker pool.", ("operation",),
+    buckets=(0.05, 0.1, 0.2, 0.3, 0.5, 0.75, 1.0, 2.0)))
+JWT_DECODE_FAILURES = registry.register(Counter(
+    "jwt_decode_failures_total", "Rejected bearer tokens (bad signature, expired or missing claims)."))
+AUTH_CACHE_HITS = registry.register(Counter(
+    "auth_principal_cache_hits_total", "Principal cache hits in get_current_user."))
+AUTH_CACHE_MISSES = registry.register(Counter(
+    "auth_principal_cache_misses_total", "Principal cache misses in get_current_user."))
+RATE_LIMITED = registry.register(Counter(
+    "rate_limited_requests_total", "Requests rejected by a rate limit or admission control.", ("limit",)))
+
+# Change feed
+SSE_CONNECTIONS = registry.register(Gauge(
+    "sse_connections", "Open /todos/stream connections on this worker."))
+EVENTS_PUBLISHED = registry.register(Counter(
+    "todo_events_published_total", "Todo change events published.", ("type",)))
+EVENTS_DROPPED_SUBSCRIBERS = registry.register(Counter(
+    "todo_event_subscribers_dropped_total", "Streams disconnected because their event queue was full."))
+
+# Group commit
+GROUP_COMMIT_BATCH_SIZE = registry.register(Histogram(
+    "group_commit_batch_size", "Writes committed together per group commit.",
+    buckets=(1, 2, 5, 10, 25, 50, 100, 250, 500)))
+GROUP_COMMIT_DURATION = registry.register(Histogram(
+    "group_commit_duration_seconds", "Time to run and commit one batch of writes."))
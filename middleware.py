@@ -0,0 +1,67 @@
+import time
+
+from starlette.datastructures import MutableHeaders
+
+from .database import QueryStats, query_stats
+from .metrics import HTTP_REQUESTS, HTTP_REQUEST_DURATION, HTTP_REQUESTS_IN_FLIGHT
+
+
+class QueryStatsMiddleware:
+    """Counts the SQL statements and DB time of each request and reports them in a Server-Timing header.
+
+    Written as a plain ASGI middleware so streaming responses pass through untouched.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stats = QueryStats(scope)
+        token = query_stats.set(stats)
+
+        async def send_with_server_timing(message):
+            if message["type"] == "http.response.start":
+                headers = MutableHeaders(scope=message)
+                headers.append("Server-Timing", f'db;dur={stats.duration * 1000:.2f};desc="{stats.count} queries"')
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_server_timing)
+        finally:
+            query_stats.reset(token)
+
+
+class MetricsMiddleware:
+    """Records per-route latency, status counts and in-flight requests for /metrics."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        started_at = time.perf_counter()
+        status_code = 500
+        HTTP_REQUESTS_IN_FLIGHT.inc()
+
+        async def send_with_status(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            HTTP_REQUESTS_IN_FLIGHT.dec()
+            # Label by route template, not raw path, to keep the number of series bounded
+            route = getattr(scope.get("route"), "path", "<unmatched>")
+            method = scope["method"]
+            HTTP_REQUEST_DURATION.observe(time.perf_counter() - started_at, (method, route))
+            HTTP_REQUESTS.inc((method, route, str(status_code)))
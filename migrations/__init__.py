@@ -0,0 +1,45 @@
+import os
+
+from alembic import command
+from alembic.config import Config
+from sqlalchemy import inspect
+from sqlalchemy.engine import Engine
+
+MIGRATIONS_DIR = os.path.dirname(os.path.abspath(__file__))
+ALEMBIC_INI = os.path.join(os.path.dirname(MIGRATIONS_DIR), "alembic.ini")
+# Revision matching the schema that Base.metadata.create_all used to build
+INITIAL_REVISION = "0001"
+
+
+def include_name(name, type_, parent_names) -> bool:
+    """Autogenerate filter: the text search objects are created by raw DDL, not by the models."""
+    from ..models import FTS_TABLE_PREFIX, FTS_COLUMNS
+
+    if type_ == "table":
+        return not name.startswith(FTS_TABLE_PREFIX)
+    if type_ == "column":
+        return name not in FTS_COLUMNS
+    return True
+
+
+def alembic_config() -> Config:
+    config = Config(ALEMBIC_INI)
+    config.set_main_option("script_location", MIGRATIONS_DIR)
+    return config
+
+
+def upgrade_database(engine: Engine, revision: str = "head"):
+    """Bring the database behind ``engine`` up to ``revision``.
+
+    Databases created by the old ``create_all`` call have the tables but no ``alembic_version``,
+    they are stamped with the initial revision first so only the newer migrations run.
+    """
+    config = alembic_config()
+    with engine.begin() as connection:
+        config.attributes["connection"] = connection
+
+        inspector = inspect(connection)
+        if inspector.has_table("users") and not inspector.has_table("alembic_version"):
+            command.stamp(config, INITIAL_REVISION)
+
+        command.upgrade(config, revision)
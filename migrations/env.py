@@ -0,0 +1,56 @@
+import importlib
+import os
+import sys
+from logging.config import fileConfig
+
+from alembic import context
+from sqlalchemy import create_engine
+
+config = context.config
+
+# The project is a package (relative imports), so import it by its directory name
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if os.path.dirname(PROJECT_DIR) not in sys.path:
+    sys.path.insert(0, os.path.dirname(PROJECT_DIR))
+
+project = os.path.basename(PROJECT_DIR)
+database = importlib.import_module(f"{project}.database")
+importlib.import_module(f"{project}.models")
+migrations = importlib.import_module(f"{project}.migrations")
+
+target_metadata = database.Base.metadata
+
+# Connection handed over by upgrade_database() when migrating from the app itself
+connection = config.attributes.get("connection")
+
+
+def run_migrations_offline():
+    context.configure(
+        url=database.get_sync_url(database.SQLALCHEMY_DATABASE_URI),
+        target_metadata=target_metadata,
+        include_name=migrations.include_name,
+        literal_binds=True,
+        render_as_batch=True,
+    )
+    with context.begin_transaction():
+        context.run_migrations()
+
+
+def run_migrations_online(connection):
+    # render_as_batch: SQLite can't ALTER most things in place
+    context.configure(connection=connection, target_metadata=target_metadata, render_as_batch=True,
+                      include_name=migrations.include_name)
+    with context.begin_transaction():
+        context.run_migrations()
+
+
+if context.is_offline_mode():
+    run_migrations_offline()
+elif connection is not None:
+    run_migrations_online(connection)
+else:
+    if config.config_file_name is not None:
+        fileConfig(config.config_file_name)
+    engine = create_engine(database.get_sync_url(database.SQLALCHEMY_DATABASE_URI))
+    with engine.connect() as conn:
+        run_migrations_online(conn)
@@ -0,0 +1,28 @@
+"""add composite indexes on todos
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-18 00:00:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = '0002'
+down_revision: Union[str, Sequence[str], None] = '0001'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index('ix_todos_user_id_id', 'todos', ['user_id', 'id'], unique=False)
+    op.create_index('ix_todos_user_id_complete_priority', 'todos', ['user_id', 'complete', 'priority'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_todos_user_id_complete_priority', table_name='todos')
+    op.drop_index('ix_todos_user_id_id', table_name='todos')
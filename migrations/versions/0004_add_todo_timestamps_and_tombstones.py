@@ -0,0 +1,59 @@
+"""add todo timestamps and tombstones
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-18 00:00:00
+
+"""
+from datetime import datetime, timezone
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = '0004'
+down_revision: Union[str, Sequence[str], None] = '0003'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    with op.batch_alter_table('todos') as batch_op:
+        batch_op.add_column(sa.Column('created_at', sa.DateTime(), nullable=True))
+        batch_op.add_column(sa.Column('updated_at', sa.DateTime(), nullable=True))
+
+    # Existing todos count as created now, so the first delta sync of every client includes them
+    now = datetime.now(timezone.utc).replace(tzinfo=None)
+    todos = sa.table('todos', sa.column('created_at', sa.DateTime()), sa.column('updated_at', sa.DateTime()))
+    op.execute(todos.update().values(created_at=now, updated_at=now))
+
+    with op.batch_alter_table('todos') as batch_op:
+        batch_op.alter_column('created_at', existing_type=sa.DateTime(), nullable=False)
+        batch_op.alter_column('updated_at', existing_type=sa.DateTime(), nullable=False)
+        batch_op.create_index('ix_todos_user_id_updated_at_id', ['user_id', 'updated_at', 'id'], unique=False)
+
+    op.create_table(
+        'todo_tombstones',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('todo_id', sa.Integer(), nullable=False),
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('deleted_at', sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint('id'),
+    )
+    op.create_index('ix_todo_tombstones_user_id_deleted_at_todo_id', 'todo_tombstones',
+                    ['user_id', 'deleted_at', 'todo_id'], unique=False)
+    op.create_index('ix_todo_tombstones_deleted_at', 'todo_tombstones', ['deleted_at'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_todo_tombstones_deleted_at', table_name='todo_tombstones')
+    op.drop_index('ix_todo_tombstones_user_id_deleted_at_todo_id', table_name='todo_tombstones')
+    op.drop_table('todo_tombstones')
+
+    with op.batch_alter_table('todos') as batch_op:
+        batch_op.drop_index('ix_todos_user_id_updated_at_id')
+        batch_op.drop_column('updated_at')
+        batch_op.drop_column('created_at')
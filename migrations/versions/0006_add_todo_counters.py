@@ -0,0 +1,69 @@
+"""add todo counters
+
+Revision ID: 0006
+Revises: 0005
+Create Date: 2026-10-18 00:00:00
+
+"""
+import importlib
+from pathlib import Path
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = '0006'
+down_revision: Union[str, Sequence[str], None] = '0005'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# The counters are kept by triggers on todos: the statements create_all runs too (models.py), so migrated and
+# freshly created databases get the same triggers. The project is imported by its directory name, like env.py does.
+models = importlib.import_module(f"{Path(__file__).resolve().parents[2].name}.models")
+
+# SQLite and MySQL (trigger names are per schema there)
+DROP_TRIGGERS = (
+    "DROP TRIGGER IF EXISTS todo_counters_update",
+    "DROP TRIGGER IF EXISTS todo_counters_delete",
+    "DROP TRIGGER IF EXISTS todo_counters_insert",
+)
+
+POSTGRES_DROP_TRIGGERS = (
+    "DROP TRIGGER IF EXISTS todo_counters_update ON todos",
+    "DROP TRIGGER IF EXISTS todo_counters_insert_delete ON todos",
+    "DROP FUNCTION IF EXISTS todo_counters_apply()",
+)
+
+
+def run(statements_by_dialect: dict):
+    for statement in statements_by_dialect.get(op.get_bind().dialect.name, ()):
+        op.execute(statement)
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        'todo_counters',
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('priority', sa.Integer(), nullable=False),
+        sa.Column('complete', sa.Boolean(), nullable=False),
+        sa.Column('count', sa.Integer(), nullable=False),
+        sa.PrimaryKeyConstraint('user_id', 'priority', 'complete'),
+    )
+
+    # Count the existing todos (same buckets as stats.recount_statement)
+    op.execute(
+        "INSERT INTO todo_counters (user_id, priority, complete, count) "
+        "SELECT user_id, coalesce(priority, 0), coalesce(complete, false), count(*) FROM todos "
+        "WHERE user_id IS NOT NULL GROUP BY user_id, coalesce(priority, 0), coalesce(complete, false)"
+    )
+    run({"sqlite": models.SQLITE_COUNTER_DDL, "postgresql": models.POSTGRES_COUNTER_DDL,
+         "mysql": models.MYSQL_COUNTER_DDL, "mariadb": models.MYSQL_COUNTER_DDL})
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    run({"sqlite": DROP_TRIGGERS, "postgresql": POSTGRES_DROP_TRIGGERS, "mysql": DROP_TRIGGERS,
+         "mariadb": DROP_TRIGGERS})
+    op.drop_table('todo_counters')
@@ -1,9 +1,16 @@
-from sqlalchemy import Column, Integer, String, Boolean, ForeignKey
+from datetime import datetime, timezone
+
+from sqlalchemy import Column, Integer, String, Boolean, DateTime, ForeignKey, Index, DDL, event
 from sqlalchemy.orm import relationship
 
 from .database import Base
 
 
+def utcnow() -> datetime:
+    # Timestamps are stored as naive UTC (SQLite has no time zones)
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
 class User(Base):
     __tablename__ = 'users'
     id = Column(Integer, primary_key=True, index=True)
@@ -28,9 +35,181 @@ class Todos(Base):
     priority = Column(Integer)
     complete = Column(Boolean, default=False)
     user_id = Column(Integer, ForeignKey('users.id'))
+    created_at = Column(DateTime, nullable=False, default=utcnow)
+    # Set on every UPDATE statement (ORM, Core and bulk) unless given explicitly
+    updated_at = Column(DateTime, nullable=False, default=utcnow, onupdate=utcnow)
 
     user = relationship('User', back_populates='todos')
 
+    __table_args__ = (
+        # Per-user lookups and keyset pagination: WHERE user_id = ? [AND id > ?] ORDER BY id
+        Index('ix_todos_user_id_id', 'user_id', 'id'),
+        # Per-user filtering on status and priority
+        Index('ix_todos_user_id_complete_priority', 'user_id', 'complete', 'priority'),
+        # Delta sync: WHERE user_id = ? AND (updated_at, id) > (?, ?) ORDER BY updated_at, id
+        Index('ix_todos_user_id_updated_at_id', 'user_id', 'updated_at', 'id'),
+    )
+
+
+# SQLite: FTS5 index over title/description with todos as its external content (the text isn't stored twice),
+# kept in sync by triggers, so every write path (ORM, Core, bulk, scripts) updates it.
+# Tables rebuilt by batch migrations lose their triggers: recreate them (and the counter triggers below)
+# after any batch_alter_table('todos').
+SQLITE_FTS_DDL = (
+    "CREATE VIRTUAL TABLE IF NOT EXISTS todos_fts USING fts5("
+    "title, description, content='todos', content_rowid='id', tokenize='unicode61 remove_diacritics 2')",
+    "CREATE TRIGGER IF NOT EXISTS todos_fts_insert AFTER INSERT ON todos BEGIN "
+    "INSERT INTO todos_fts(rowid, title, description) VALUES (new.id, new.title, new.description); END",
+    "CREATE TRIGGER IF NOT EXISTS todos_fts_delete AFTER DELETE ON todos BEGIN "
+    "INSERT INTO todos_fts(todos_fts, rowid, title, description) "
+    "VALUES ('delete', old.id, old.title, old.description); END",
+    # Only when the indexed text changes: toggling complete or priority doesn't touch the index
+    "CREATE TRIGGER IF NOT EXISTS todos_fts_update AFTER UPDATE OF title, description ON todos BEGIN "
+    "INSERT INTO todos_fts(todos_fts, rowid, title, description) "
+    "VALUES ('delete', old.id, old.title, old.description); "
+    "INSERT INTO todos_fts(rowid, title, description) VALUES (new.id, new.title, new.description); END",
+)
+
+# Postgres: a generated tsvector column (maintained by the database itself) with a GIN index
+POSTGRES_FTS_DDL = (
+    "ALTER TABLE todos ADD COLUMN IF NOT EXISTS search_vector tsvector GENERATED ALWAYS AS ("
+    "setweight(to_tsvector('simple', coalesce(title, '')), 'A') || "
+    "setweight(to_tsvector('simple', coalesce(description, '')), 'B')) STORED",
+    "CREATE INDEX IF NOT EXISTS ix_todos_search_vector ON todos USING gin (search_vector)",
+)
+
+# Schema objects managed outside the models (skipped when comparing migrations with the models)
+FTS_TABLE_PREFIX = "todos_fts"
+FTS_COLUMNS = ("search_vector",)
+
+# create_all (tests, benchmarks) builds the text index too; migration 0005 does it for migrated databases
+for _statement in SQLITE_FTS_DDL:
+    event.listen(Todos.__table__, "after_create", DDL(_statement).execute_if(dialect="sqlite"))
+for _statement in POSTGRES_FTS_DDL:
+    event.listen(Todos.__table__, "after_create", DDL(_statement).execute_if(dialect="postgresql"))
+
+
+class TodoTombstone(Base):
+    # Deleted todos, so delta sync clients learn about deletions; purged after TODO_TOMBSTONE_RETENTION_DAYS
+    __tablename__ = 'todo_tombstones'
+
+    id = Column(Integer, primary_key=True)
+    todo_id = Column(Integer, nullable=False)
+    user_id = Column(Integer, nullable=False)
+    deleted_at = Column(DateTime, nullable=False, default=utcnow)
+
+    __table_args__ = (
+        Index('ix_todo_tombstones_user_id_deleted_at_todo_id', 'user_id', 'deleted_at', 'todo_id'),
+        # Purging old tombstones
+        Index('ix_todo_tombstones_deleted_at', 'deleted_at'),
+    )
+
+
+class TodoCounter(Base):
+    # Number of todos per user, priority and status, kept up to date by triggers on todos (see below and stats.py)
+    # so dashboards read a handful of rows instead of counting the todos
+    __tablename__ = 'todo_counters'
+
+    user_id = Column(Integer, primary_key=True)
+    priority = Column(Integer, primary_key=True)
+    complete = Column(Boolean, primary_key=True)
+    count = Column(Integer, nullable=False, default=0)
+
+
+# The counters are kept by triggers on todos, like the text index: every write path (API, bulk, scripts, manual
+# SQL) counts, and the API writes stay single statements. A todo moves between buckets only when its owner,
+# priority or status changes; NULL priority/status count as 0/false (same as the rebuild in stats.py).
+SQLITE_COUNTER_DDL = (
+    "CREATE TRIGGER IF NOT EXISTS todo_counters_insert AFTER INSERT ON todos WHEN new.user_id IS NOT NULL BEGIN "
+    "INSERT INTO todo_counters(user_id, priority, complete, count) "
+    "VALUES (new.user_id, coalesce(new.priority, 0), coalesce(new.complete, 0), 1) "
+    "ON CONFLICT(user_id, priority, complete) DO UPDATE SET count = count + 1; END",
+    "CREATE TRIGGER IF NOT EXISTS todo_counters_delete AFTER DELETE ON todos WHEN old.user_id IS NOT NULL BEGIN "
+    "INSERT INTO todo_counters(user_id, priority, complete, count) "
+    "VALUES (old.user_id, coalesce(old.priority, 0), coalesce(old.complete, 0), -1) "
+    "ON CONFLICT(user_id, priority, complete) DO UPDATE SET count = count - 1; END",
+    # Only when the bucket changes: editing the title or description doesn't touch the counters
+    "CREATE TRIGGER IF NOT EXISTS todo_counters_update AFTER UPDATE OF user_id, priority, complete ON todos "
+    "WHEN old.user_id IS NOT new.user_id OR coalesce(old.priority, 0) != coalesce(new.priority, 0) "
+    "OR coalesce(old.complete, 0) != coalesce(new.complete, 0) BEGIN "
+    "INSERT INTO todo_counters(user_id, priority, complete, count) "
+    "SELECT old.user_id, coalesce(old.priority, 0), coalesce(old.complete, 0), -1 WHERE old.user_id IS NOT NULL "
+    "ON CONFLICT(user_id, priority, complete) DO UPDATE SET count = count - 1; "
+    "INSERT INTO todo_counters(user_id, priority, complete, count) "
+    "SELECT new.user_id, coalesce(new.priority, 0), coalesce(new.complete, 0), 1 WHERE new.user_id IS NOT NULL "
+    "ON CONFLICT(user_id, priority, complete) DO UPDATE SET count = count + 1; END",
+)
+
+POSTGRES_COUNTER_DDL = (
+    "CREATE OR REPLACE FUNCTION todo_counters_apply() RETURNS trigger LANGUAGE plpgsql AS $$ BEGIN "
+    "IF TG_OP <> 'INSERT' AND OLD.user_id IS NOT NULL THEN "
+    "INSERT INTO todo_counters (user_id, priority, complete, count) "
+    "VALUES (OLD.user_id, coalesce(OLD.priority, 0), coalesce(OLD.complete, false), -1) "
+    "ON CONFLICT (user_id, priority, complete) DO UPDATE SET count = todo_counters.count - 1; "
+    "END IF; "
+    "IF TG_OP <> 'DELETE' AND NEW.user_id IS NOT NULL THEN "
+    "INSERT INTO todo_counters (user_id, priority, complete, count) "
+    "VALUES (NEW.user_id, coalesce(NEW.priority, 0), coalesce(NEW.complete, false), 1) "
+    "ON CONFLICT (user_id, priority, complete) DO UPDATE SET count = todo_counters.count + 1; "
+    "END IF; "
+    "RETURN NULL; END $$",
+    "CREATE TRIGGER todo_counters_insert_delete AFTER INSERT OR DELETE ON todos "
+    "FOR EACH ROW EXECUTE FUNCTION todo_counters_apply()",
+    "CREATE TRIGGER todo_counters_update AFTER UPDATE OF user_id, priority, complete ON todos FOR EACH ROW "
+    "WHEN (OLD.user_id IS DISTINCT FROM NEW.user_id "
+    "OR coalesce(OLD.priority, 0) <> coalesce(NEW.priority, 0) "
+    "OR coalesce(OLD.complete, false) <> coalesce(NEW.complete, false)) "
+    "EXECUTE FUNCTION todo_counters_apply()",
+)
+
+# MySQL triggers have no WHEN or UPDATE OF: the update trigger compares the buckets itself
+_MYSQL_COUNTER_REMOVE = (
+    "INSERT INTO todo_counters (user_id, priority, complete, count) "
+    "VALUES (OLD.user_id, coalesce(OLD.priority, 0), coalesce(OLD.complete, 0), -1) "
+    "ON DUPLICATE KEY UPDATE count = count - 1;"
+)
+_MYSQL_COUNTER_ADD = (
+    "INSERT INTO todo_counters (user_id, priority, complete, count) "
+    "VALUES (NEW.user_id, coalesce(NEW.priority, 0), coalesce(NEW.complete, 0), 1) "
+    "ON DUPLICATE KEY UPDATE count = count + 1;"
+)
+MYSQL_COUNTER_DDL = (
+    "CREATE TRIGGER todo_counters_insert AFTER INSERT ON todos FOR EACH ROW BEGIN "
+    f"IF NEW.user_id IS NOT NULL THEN {_MYSQL_COUNTER_ADD} END IF; END",
+    "CREATE TRIGGER todo_counters_delete AFTER DELETE ON todos FOR EACH ROW BEGIN "
+    f"IF OLD.user_id IS NOT NULL THEN {_MYSQL_COUNTER_REMOVE} END IF; END",
+    "CREATE TRIGGER todo_counters_update AFTER UPDATE ON todos FOR EACH ROW BEGIN "
+    "IF NOT (OLD.user_id <=> NEW.user_id) OR coalesce(OLD.priority, 0) <> coalesce(NEW.priority, 0) "
+    "OR coalesce(OLD.complete, 0) <> coalesce(NEW.complete, 0) THEN "
+    f"IF OLD.user_id IS NOT NULL THEN {_MYSQL_COUNTER_REMOVE} END IF; "
+    f"IF NEW.user_id IS NOT NULL THEN {_MYSQL_COUNTER_ADD} END IF; "
+    "END IF; END",
+)
+
+# Created with todos by create_all (the triggers only need todo_counters when they fire); migration 0006 runs
+# the same statements on migrated databases
+for _dialects, _statements in ((("sqlite",), SQLITE_COUNTER_DDL), (("postgresql",), POSTGRES_COUNTER_DDL),
+                               (("mysql", "mariadb"), MYSQL_COUNTER_DDL)):
+    for _statement in _statements:
+        event.listen(Todos.__table__, "after_create", DDL(_statement).execute_if(dialect=_dialects))
+
+
+class RevokedToken(Base):
+    # Used refresh tokens and revoked token families (logout, refresh token reuse), kept until they'd expire anyway
+    __tablename__ = 'revoked_tokens'
+
+    id = Column(Integer, primary_key=True)
+    # "token": a refresh token's jti claim, "family": the fid claim shared by every token of one login
+    kind = Column(String, nullable=False)
+    jti = Column(String, unique=True, nullable=False)
+    # Unix time after which the entry is useless (the tokens are expired anyway)
+    expires_at = Column(Integer, nullable=False)
+
+    __table_args__ = (
+        # Loading the revoked families, purging expired rows
+        Index('ix_revoked_tokens_kind_expires_at', 'kind', 'expires_at'),
+    )
+
 
 '''
 # Example
@@ -0,0 +1,58 @@
+from typing import Literal, Optional
+
+from fastapi import Query
+
+from .models import Todos
+
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 500
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+
+class TodoPageParams:
+    """Query parameters for keyset (cursor) pagination over todos.
+
+    ``cursor`` is the id of the last todo of the previous page, taken from the ``X-Next-Cursor`` header.
+    """
+
+    def __init__(
+            self,
+            limit: int = Query(DEFAULT_PAGE_SIZE, gt=0, le=MAX_PAGE_SIZE),
+            cursor: Optional[int] = Query(None, gt=0),
+            complete: Optional[bool] = Query(None),
+            priority: Optional[int] = Query(None, ge=0, le=5),
+            order: Literal["asc", "desc"] = Query("asc"),
+    ):
+        self.limit = limit
+        self.cursor = cursor
+        self.complete = complete
+        self.priority = priority
+        self.order = order
+
+
+def paginate_todos(stmt, page: TodoPageParams):
+    """Apply filters, the cursor and ordering on ``Todos.id`` to a select of todos."""
+    if page.complete is not None:
+        stmt = stmt.filter(Todos.complete == page.complete)
+    if page.priority is not None:
+        stmt = stmt.filter(Todos.priority == page.priority)
+
+    if page.order == "desc":
+        if page.cursor is not None:
+            stmt = stmt.filter(Todos.id < page.cursor)
+        stmt = stmt.order_by(Todos.id.desc())
+    else:
+        if page.cursor is not None:
+            stmt = stmt.filter(Todos.id > page.cursor)
+        stmt = stmt.order_by(Todos.id)
+
+    # One extra row tells whether there is a next page
+    return stmt.limit(page.limit + 1)
+
+
+def split_page(rows: list, page: TodoPageParams) -> tuple[list, Optional[int]]:
+    """Trim the extra row fetched by paginate_todos, returning the page and the next cursor (or None)."""
+    if len(rows) > page.limit:
+        rows = rows[:page.limit]
+        return rows, rows[-1].id
+    return rows, None
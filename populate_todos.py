@@ -1,27 +1,123 @@
-from database import SessionLocal
-from .models import Todos
+"""Generate users and todos in bulk, e.g. a realistic dataset for the benchmarks.
 
+Run from the directory that contains the project:
 
-def seed_todos():
-    db = SessionLocal()
+    python -m <project>.populate_todos --users 100 --todos-per-user 1000
 
-    todos = [
-        Todos(title='Buy groceries', description='Purchase milk, eggs, and bread from the store', priority=2,
-              complete=False),
-        Todos(title='Complete FastAPI tutorial', description='Finish the basics and build the first API', priority=3,
-              complete=True),
-        Todos(title='Workout', description='Go for a 45-min gym session', priority=3, complete=False),
-        Todos(title='Pay electricity bill', description='Pay electricity bill before the due date this week',
-              priority=1, complete=False),
-        Todos(title='Read a tech blog', description='Read about the latest Gen AI developments', priority=3,
-              complete=False)
-    ]
+All generated users share one password (hashed once, bcrypt is slow on purpose).
+"""
+import argparse
+import random
+import time
+from itertools import cycle
+from typing import Optional
 
-    db.add_all(todos)
-    db.commit()
-    db.close()
+from sqlalchemy import insert, select, func
+
+from .database import SessionLocal, engine
+from .hashing import hash_password
+from .migrations import upgrade_database
+from .models import Todos, User
+from .stats import rebuild_todo_counters
+
+DEFAULT_PASSWORD = "Passw0rd!"
+# Rows per INSERT ... VALUES executemany and per commit
+DEFAULT_BATCH_SIZE = 5000
+
+SAMPLE_TODOS = [
+    ('Buy groceries', 'Purchase milk, eggs, and bread from the store'),
+    ('Complete FastAPI tutorial', 'Finish the basics and build the first API'),
+    ('Workout', 'Go for a 45-min gym session'),
+    ('Pay electricity bill', 'Pay electricity bill before the due date this week'),
+    ('Read a tech blog', 'Read about the latest Gen AI developments'),
+]
+
+
+def add_users(db, count: int, prefix: str, password: str, role: str = "user") -> list[int]:
+    """Insert ``prefix0 .. prefix{count-1}`` with one executemany, returning their ids."""
+    hashed_password = hash_password(password)
+    result = db.execute(
+        insert(User).returning(User.id, sort_by_parameter_order=True),
+        [
+            {
+                "username": f"{prefix}{i}",
+                "email": f"{prefix}{i}@example.com",
+                "first_name": "Load",
+                "last_name": f"User {i}",
+                "hashed_password": hashed_password,
+                "is_active": True,
+                "role": role,
+            }
+            for i in range(count)
+        ]
+    )
+    return list(result.scalars().all())
+
+
+def add_todos(db, user_ids: list[int], todos_per_user: int, batch_size: int = DEFAULT_BATCH_SIZE,
+              rng: random.Random = random) -> int:
+    """Insert ``todos_per_user`` todos for each user, ``batch_size`` rows per statement and commit."""
+    samples = cycle(SAMPLE_TODOS)
+    batch = []
+    total = 0
+    for user_id in user_ids:
+        for i in range(todos_per_user):
+            title, description = next(samples)
+            batch.append({
+                "title": f"{title} #{i}",
+                "description": description,
+                "priority": rng.randint(1, 5),
+                "complete": rng.random() < 0.3,
+                "user_id": user_id,
+            })
+            if len(batch) >= batch_size:
+                db.execute(insert(Todos), batch)
+                db.commit()
+                total += len(batch)
+                batch = []
+    if batch:
+        db.execute(insert(Todos), batch)
+        db.commit()
+        total += len(batch)
+    return total
+
+
+def populate(users: int, todos_per_user: int, prefix: str = "loaduser", password: str = DEFAULT_PASSWORD,
+             batch_size: int = DEFAULT_BATCH_SIZE, seed: Optional[int] = None) -> list[int]:
+    """Create ``users`` users with ``todos_per_user`` todos each; returns the new user ids."""
+    upgrade_database(engine)
+    rng = random.Random(seed)
+
+    with SessionLocal() as db:
+        taken = db.execute(select(func.count()).select_from(User).filter(User.username.like(f"{prefix}%"))).scalar()
+        if taken:
+            raise SystemExit(f"{taken} users named '{prefix}*' already exist, pick another --prefix.")
+
+        user_ids = add_users(db, users, prefix, password)
+        db.commit()
+        add_todos(db, user_ids, todos_per_user, batch_size, rng)
+        # The triggers counted the inserts; recounting only the new users keeps the check off everyone else's todos
+        rebuild_todo_counters(db, user_ids)
+    return user_ids
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Bulk-load users and todos into DATABASE_URL.")
+    parser.add_argument("--users", type=int, default=10, help="users to create (default: 10)")
+    parser.add_argument("--todos-per-user", type=int, default=100, help="todos per user (default: 100)")
+    parser.add_argument("--prefix", default="loaduser", help="username prefix (default: loaduser)")
+    parser.add_argument("--password", default=DEFAULT_PASSWORD, help="password of every generated user")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE, help="rows per insert and commit")
+    parser.add_argument("--seed", type=int, default=None, help="random seed for priorities / completion")
+    args = parser.parse_args(argv)
+
+    started_at = time.perf_counter()
+    user_ids = populate(args.users, args.todos_per_user, args.prefix, args.password, args.batch_size, args.seed)
+    elapsed = time.perf_counter() - started_at
+
+    todos = len(user_ids) * args.todos_per_user
+    print(f"Added {len(user_ids)} users and {todos} todos in {elapsed:.2f}s ({todos / elapsed:,.0f} todos/s)")
 
 
 if __name__ == '__main__':
-    seed_todos()
-    print("Data added successfully!")
+    main()
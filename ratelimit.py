@@ -0,0 +1,165 @@
+import math
+import time
+from collections import OrderedDict
+from typing import Annotated
+
+from fastapi import Depends, HTTPException, Request
+from fastapi.security import OAuth2PasswordRequestForm
+from starlette import status
+
+from .cache import CacheBackend, cache
+from .metrics import RATE_LIMITED
+from .settings import settings
+
+# "memory": buckets in this process (default), "cache": shared by the workers through the cache backend (CACHE_URL)
+RATE_LIMIT_STORE = settings.rate_limit_store
+# "<requests>/<seconds>", 0 or "off" disables a limit
+LOGIN_IP_RATE = settings.login_ip_rate
+LOGIN_USERNAME_RATE = settings.login_username_rate
+SIGNUP_IP_RATE = settings.signup_ip_rate
+# Requests allowed inside the password hashing endpoints at once, across all of them
+HASH_CONCURRENCY_LIMIT = settings.hash_concurrency_limit
+# Behind a reverse proxy the client address is the first X-Forwarded-For entry
+RATE_LIMIT_TRUST_FORWARDED = settings.rate_limit_trust_forwarded
+
+
+def parse_rate(rate: str) -> tuple[int, float]:
+    """``"20/60"`` -> (burst of 20, refilled at 20/60 tokens per second); (0, 0) when disabled."""
+    if not rate or rate.strip() in ("0", "off"):
+        return 0, 0.0
+    requests, seconds = rate.split("/")
+    return int(requests), int(requests) / float(seconds)
+
+
+class MemoryBucketStore:
+    """Token buckets in a dict: a check is a few float operations, no I/O."""
+
+    def __init__(self, maxsize: int = 100_000):
+        # Bounded so a flood of distinct IPs/usernames can't grow it without limit
+        self.maxsize = maxsize
+        self._buckets = OrderedDict()
+
+    async def take(self, key: str, rate: float, burst: int) -> float:
+        """Take one token; returns 0 when allowed, otherwise the seconds until a token is available."""
+        now = time.monotonic()
+        tokens, updated_at = self._buckets.get(key, (burst, now))
+        tokens = min(burst, tokens + (now - updated_at) * rate)
+
+        retry_after = 0.0
+        if tokens >= 1:
+            tokens -= 1
+        else:
+            retry_after = (1 - tokens) / rate
+
+        self._buckets[key] = (tokens, now)
+        self._buckets.move_to_end(key)
+        if len(self._buckets) > self.maxsize:
+            self._buckets.popitem(last=False)
+        return retry_after
+
+    def clear(self):
+        self._buckets.clear()
+
+
+class CacheBucketStore:
+    """Shared store on the cache backend.
+
+    A bucket needs an atomic read-modify-write, the backend only offers ``incr``: each bucket is approximated
+    by a fixed window of ``burst`` requests per ``burst / rate`` seconds (same long-run rate).
+    """
+
+    def __init__(self, backend: CacheBackend):
+        self.backend = backend
+
+    async def take(self, key: str, rate: float, burst: int) -> float:
+        period = burst / rate
+        now = time.time()
+        window = int(now // period)
+        count = await self.backend.incr(f"ratelimit:{key}:{window}", ttl=period)
+        if count <= burst:
+            return 0.0
+        return (window + 1) * period - now
+
+    def clear(self):
+        pass
+
+
+def create_bucket_store(name: str):
+    if name == "memory":
+        return MemoryBucketStore()
+    if name == "cache":
+        return CacheBucketStore(cache)
+    raise ValueError(f"Unsupported RATE_LIMIT_STORE '{name}'.")
+
+
+bucket_store = create_bucket_store(RATE_LIMIT_STORE)
+
+
+class RateLimit:
+    def __init__(self, name: str, rate: str):
+        self.name = name
+        self.burst, self.rate = parse_rate(rate)
+
+    async def check(self, key: str):
+        """Raise 429 (with Retry-After) when ``key`` is over the limit."""
+        if self.burst <= 0:
+            return
+        retry_after = await bucket_store.take(f"{self.name}:{key}", self.rate, self.burst)
+        if retry_after > 0:
+            RATE_LIMITED.inc((self.name,))
+            raise HTTPException(
+                status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                detail="Too many requests, please try again later.",
+                headers={"Retry-After": str(math.ceil(retry_after))},
+            )
+
+
+LOGIN_IP_LIMIT = RateLimit("login_ip", LOGIN_IP_RATE)
+LOGIN_USERNAME_LIMIT = RateLimit("login_username", LOGIN_USERNAME_RATE)
+SIGNUP_IP_LIMIT = RateLimit("signup_ip", SIGNUP_IP_RATE)
+
+
+def client_ip(request: Request) -> str:
+    if RATE_LIMIT_TRUST_FORWARDED:
+        forwarded_for = request.headers.get("x-forwarded-for")
+        if forwarded_for:
+            return forwarded_for.split(",")[0].strip()
+    return request.client.host if request.client else "unknown"
+
+
+class ConcurrencyLimiter:
+    """Admission control: at most ``limit`` requests inside the guarded endpoints, the rest get 503 at once."""
+
+    def __init__(self, name: str, limit: int):
+        self.name = name
+        self.limit = limit
+        # Only touched from the event loop thread
+        self.in_flight = 0
+
+    async def __call__(self):
+        if self.in_flight >= self.limit:
+            RATE_LIMITED.inc((self.name,))
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Server is busy, please try again later.",
+                headers={"Retry-After": "1"},
+            )
+        self.in_flight += 1
+        try:
+            yield
+        finally:
+            self.in_flight -= 1
+
+
+hash_admission = ConcurrencyLimiter("hash_concurrency", HASH_CONCURRENCY_LIMIT)
+
+
+# Rate limit dependencies, listed in the route's dependencies so they run before the DB session or hashing
+async def limit_login(request: Request, form_data: Annotated[OAuth2PasswordRequestForm, Depends()]):
+    await LOGIN_IP_LIMIT.check(client_ip(request))
+    # Per account: stops password guessing spread over many addresses
+    await LOGIN_USERNAME_LIMIT.check(form_data.username.lower())
+
+
+async def limit_signup(request: Request):
+    await SIGNUP_IP_LIMIT.check(client_ip(request))
@@ -0,0 +1,41 @@
+"""Read replica routing: read-your-writes on top of the replica sessions from database.py.
+
+With DATABASE_REPLICA_URL set, safe GETs read from the replica, except for a user who wrote in the last
+DATABASE_REPLICA_LAG_SECONDS: their reads stay on the primary. The marker of that write lives in the cache,
+so every worker has to see it, which only a shared backend (Redis) does.
+"""
+from .cache import CacheBackend
+from .settings import Settings, settings
+
+# With a read replica, a read right after a write may not see it yet: such reads go to the primary
+# (and get no ETag, see etags.py)
+REPLICA_LAG_SECONDS = settings.database_replica_lag_seconds if settings.database_replica_url else 0
+
+
+def _written_key(user_id: int) -> str:
+    # Present for REPLICA_LAG_SECONDS after the user's last write
+    return f"todo_written:{user_id}"
+
+
+async def mark_written(cache: CacheBackend, user_id: int):
+    """Remember that the user just wrote: their reads go to the primary until the replica has caught up."""
+    if REPLICA_LAG_SECONDS:
+        await cache.set(_written_key(user_id), b"1", ttl=REPLICA_LAG_SECONDS)
+
+
+async def recently_written(cache: CacheBackend, user_id: int) -> bool:
+    """True while the replica may still be behind the user's last write (always False without a replica)."""
+    return bool(REPLICA_LAG_SECONDS) and await cache.get(_written_key(user_id)) is not None
+
+
+def check_replica_cache(cache: CacheBackend, config: Settings = settings):
+    """Refuse to start with a replica and a per-process cache (run at startup).
+
+    The write marker would only be seen by the worker that handled the write: the user's next read on
+    another worker goes to the lagging replica, and a user who just signed up can get a 401 there.
+    """
+    if config.database_replica_url and not cache.shared:
+        raise RuntimeError(
+            f"DATABASE_REPLICA_URL needs a cache shared by the workers for read-your-writes, "
+            f"set CACHE_URL=redis://... (the {cache.name} backend is per process)"
+        )
@@ -0,0 +1,42 @@
+import json
+from typing import Any, Sequence
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+
+try:
+    # Optional: several times faster than the json module on large todo lists
+    import orjson
+except ImportError:  # pragma: no cover - depends on the environment
+    orjson = None
+
+
+def dumps(content: Any) -> bytes:
+    """Serialize plain data (dicts, lists, str, numbers, bool, None) to JSON bytes.
+
+    Anything else (datetime, Decimal, models...) goes through ``jsonable_encoder``.
+    """
+    if orjson is not None:
+        return orjson.dumps(content, default=jsonable_encoder)
+    return json.dumps(
+        content, default=jsonable_encoder, ensure_ascii=False, allow_nan=False, separators=(",", ":")
+    ).encode("utf-8")
+
+
+class FastJSONResponse(JSONResponse):
+    """JSONResponse rendered with orjson when it is installed (the app's default response class)."""
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
+
+
+def row_to_dict(row) -> dict:
+    # Row objects from a select of columns: no ORM instance to walk attribute by attribute
+    return dict(zip(row._fields, row))
+
+
+def rows_to_dicts(rows: Sequence) -> list[dict]:
+    if not rows:
+        return []
+    fields = rows[0]._fields
+    return [dict(zip(fields, row)) for row in rows]
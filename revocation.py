@@ -0,0 +1,93 @@
+import time
+
+from sqlalchemy import select, delete
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from .models import RevokedToken
+from .settings import settings
+
+# How often each worker reloads the revoked token families (revocations made by the other workers)
+REVOCATION_SYNC_SECONDS = settings.revocation_sync_seconds
+# Expired rows are deleted at most this often
+REVOCATION_PURGE_SECONDS = 3600
+
+TOKEN = "token"
+FAMILY = "family"
+
+
+class RevocationList:
+    """Revoked token families, held in memory so get_current_user checks them with a dict lookup.
+
+    The revoked_tokens table is the source of truth shared by the workers. Families are only revoked
+    on logout or refresh token reuse, so reloading the unexpired ones every REVOCATION_SYNC_SECONDS is cheap.
+    Used refresh tokens are only checked on refresh, straight against the table.
+    """
+
+    def __init__(self, sync_seconds: float):
+        self.sync_seconds = sync_seconds
+        # fid -> unix time the entry can be forgotten
+        self._families = {}
+        self._synced_at = float("-inf")
+        self._purged_at = float("-inf")
+
+    def _remember(self, family_id: str, expires_at: int):
+        self._families[family_id] = max(self._families.get(family_id, 0), int(expires_at))
+
+    def is_revoked(self, family_id: str) -> bool:
+        expires_at = self._families.get(family_id)
+        return expires_at is not None and expires_at > time.time()
+
+    async def sync(self, db: AsyncSession, force: bool = False):
+        monotonic_now = time.monotonic()
+        if not force and monotonic_now - self._synced_at < self.sync_seconds:
+            return
+        # Set before awaiting so concurrent requests don't all run the query
+        self._synced_at = monotonic_now
+
+        now = int(time.time())
+        result = await db.execute(
+            select(RevokedToken.jti, RevokedToken.expires_at)
+            .filter(RevokedToken.kind == FAMILY, RevokedToken.expires_at > now)
+        )
+        for family_id, expires_at in result.all():
+            self._remember(family_id, expires_at)
+        # End the read transaction, the rest of the request may not need this connection
+        await db.commit()
+        # Merged rather than replaced: a revocation made here while the query ran must not be dropped
+        self._families = {family_id: expires_at for family_id, expires_at in self._families.items() if expires_at > now}
+
+    async def _insert(self, db: AsyncSession, kind: str, token_id: str, expires_at: int) -> bool:
+        db.add(RevokedToken(kind=kind, jti=token_id, expires_at=int(expires_at)))
+        try:
+            await db.commit()
+        except IntegrityError:
+            await db.rollback()
+            return False
+
+        if time.monotonic() - self._purged_at > REVOCATION_PURGE_SECONDS:
+            self._purged_at = time.monotonic()
+            await db.execute(delete(RevokedToken).where(RevokedToken.expires_at <= int(time.time())))
+            await db.commit()
+        return True
+
+    async def use_token(self, db: AsyncSession, token_id: str, expires_at: int) -> bool:
+        """Mark a refresh token as used; False when it already was.
+
+        The unique jti column makes this an atomic check-and-set, so two concurrent refreshes
+        with the same token can't both succeed.
+        """
+        return await self._insert(db, TOKEN, token_id, expires_at)
+
+    async def revoke_family(self, db: AsyncSession, family_id: str, expires_at: int):
+        """Revoke every access and refresh token issued from one login."""
+        await self._insert(db, FAMILY, family_id, expires_at)
+        self._remember(family_id, expires_at)
+
+    def clear(self):
+        self._families.clear()
+        self._synced_at = float("-inf")
+        self._purged_at = float("-inf")
+
+
+revocation_list = RevocationList(REVOCATION_SYNC_SECONDS)
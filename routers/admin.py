@@ -1,20 +1,36 @@
-from typing import Annotated
+import csv
+import io
+from typing import Annotated, Literal
 
-from fastapi import Depends, HTTPException, APIRouter, Path
-from sqlalchemy.orm import Session
+from fastapi import Depends, HTTPException, APIRouter, Path, Query
+from fastapi.responses import StreamingResponse
+from sqlalchemy import select, delete
+from sqlalchemy.ext.asyncio import AsyncSession
 from starlette import status
 
-from .auth import get_current_user
-from ..database import get_db
+from .auth import get_current_user, AUTH_CACHE_TTL_SECONDS
+from .todos import TodoResponse, TodoStats, TODO_COLUMNS
+from ..cache import CacheBackend, get_cache
+from ..database import get_db, get_read_db
+from ..etags import bump_todo_version
+from ..events import publish_todo_events
+from ..metrics import AUTH_CACHE_HITS, AUTH_CACHE_MISSES
 from ..models import Todos, User
+from ..pagination import TodoPageParams, paginate_todos, split_page, NEXT_CURSOR_HEADER
+from ..responses import FastJSONResponse, dumps, rows_to_dicts
+from ..stats import load_todo_stats
+from ..sync import record_deletions
 
 router = APIRouter(
     prefix="/admin",
     tags=["admin"]
 )
 
-db_dependency = Annotated[Session, Depends(get_db)]
+db_dependency = Annotated[AsyncSession, Depends(get_db)]
+read_db_dependency = Annotated[AsyncSession, Depends(get_read_db)]
+cache_dependency = Annotated[CacheBackend, Depends(get_cache)]
 user_dependency = Annotated[User, Depends(get_current_user)]
+page_dependency = Annotated[TodoPageParams, Depends()]
 
 
 # Admin dependency
@@ -27,19 +43,83 @@ def admin_required(user: user_dependency):
 
 admin_dependency = Annotated[User, Depends(admin_required)]
 
+# Rows fetched per round-trip while exporting
+EXPORT_BATCH_SIZE = 1000
+EXPORT_MEDIA_TYPES = {"ndjson": "application/x-ndjson", "csv": "text/csv"}
 
-@router.get("/todos", status_code=status.HTTP_200_OK)
-async def get_todos(db: db_dependency, admin: admin_dependency):
-    todos = db.query(Todos).all()
-    return todos
+
+async def stream_todos(db: AsyncSession, export_format: str):
+    # Plain rows (no ORM objects), fetched in batches so memory stays flat whatever the table size
+    result = await db.stream(
+        select(*TODO_COLUMNS).order_by(Todos.id).execution_options(yield_per=EXPORT_BATCH_SIZE)
+    )
+
+    if export_format == "csv":
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow([column.key for column in TODO_COLUMNS])
+        async for rows in result.partitions():
+            writer.writerows(rows)
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+        yield buffer.getvalue()
+    else:
+        async for rows in result.partitions():
+            yield b"".join(dumps(row) + b"\n" for row in rows_to_dicts(rows))
+
+
+@router.get("/todos", status_code=status.HTTP_200_OK, response_model=list[TodoResponse])
+async def get_todos(db: read_db_dependency, admin: admin_dependency, page: page_dependency):
+    result = await db.execute(paginate_todos(select(*TODO_COLUMNS), page))
+    todos, cursor = split_page(result.all(), page)
+    # Rows are already plain data: rendered directly instead of being validated against TodoResponse
+    headers = {NEXT_CURSOR_HEADER: str(cursor)} if cursor is not None else None
+    return FastJSONResponse(rows_to_dicts(todos), headers=headers)
+
+
+# Every user's todos: sums the counter rows (a few per user) instead of counting the todos
+@router.get("/todos/stats", status_code=status.HTTP_200_OK, response_model=TodoStats)
+async def get_todo_stats(db: read_db_dependency, admin: admin_dependency):
+    return FastJSONResponse(await load_todo_stats(db))
+
+
+@router.get("/todos/export", status_code=status.HTTP_200_OK)
+async def export_todos(db: read_db_dependency, admin: admin_dependency,
+                       export_format: Literal["ndjson", "csv"] = Query("ndjson", alias="format")):
+    return StreamingResponse(
+        stream_todos(db, export_format),
+        media_type=EXPORT_MEDIA_TYPES[export_format],
+        headers={"Content-Disposition": f'attachment; filename="todos.{export_format}"'},
+    )
 
 
 @router.delete("/todos/{todo_id}", status_code=status.HTTP_204_NO_CONTENT)
-async def delete_todo(admin: admin_dependency, db: db_dependency, todo_id: int = Path(gt=0)):
-    todo = db.query(Todos).filter(Todos.id == todo_id).first()
+async def delete_todo(admin: admin_dependency, db: db_dependency, cache: cache_dependency, todo_id: int = Path(gt=0)):
+    result = await db.execute(
+        delete(Todos)
+        .where(Todos.id == todo_id)
+        .returning(Todos.user_id)
+        .execution_options(synchronize_session=False)
+    )
+    deleted = result.first()
 
-    if todo is None:
+    if deleted is None:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail='Todo not found!')
 
-    db.delete(todo)
-    db.commit()
+    await record_deletions(db, deleted.user_id, [todo_id])
+    await db.commit()
+    # The owner's cached todo responses are now stale
+    await bump_todo_version(cache, deleted.user_id)
+    await publish_todo_events(deleted.user_id, "deleted", [{"id": todo_id}])
+
+
+@router.get("/auth_cache", status_code=status.HTTP_200_OK)
+async def get_auth_cache_stats(admin: admin_dependency, cache: cache_dependency):
+    # Every hit is a user lookup saved in get_current_user (counted by this worker)
+    return {
+        "hits": AUTH_CACHE_HITS.value(),
+        "misses": AUTH_CACHE_MISSES.value(),
+        "ttl": AUTH_CACHE_TTL_SECONDS,
+        "backend": cache.stats(),
+    }
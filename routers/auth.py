@@ -1,25 +1,39 @@
-import os
+import asyncio
+import json
 import re
+import time
+import uuid
 from datetime import timedelta, datetime, timezone
-from typing import Annotated
+from typing import Annotated, Optional
 
-from dotenv import load_dotenv
 from fastapi import APIRouter, Depends, HTTPException
 from fastapi.security import OAuth2PasswordRequestForm, OAuth2PasswordBearer
 from jose import jwt, JWTError
-from passlib.context import CryptContext
 from pydantic import BaseModel, field_validator
-from sqlalchemy.orm import Session
+from sqlalchemy import select, event
+from sqlalchemy.ext.asyncio import AsyncSession
 from starlette import status
 
-from ..database import get_db
-from ..models import User
-
-load_dotenv()
-
-SECRET_KEY = os.getenv("SECRET_KEY")
-ALGORITHM = os.getenv("ALGORITHM")
-ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", 30))
+from ..cache import CacheBackend, cache, get_cache
+from ..database import get_db, get_read_db
+from ..hashing import password_hash_pool, hash_password, verify_password
+from ..metrics import JWT_DECODE_FAILURES, AUTH_CACHE_HITS, AUTH_CACHE_MISSES
+from ..models import User, RevokedToken
+from ..ratelimit import hash_admission, limit_login, limit_signup
+from ..replica import mark_written, recently_written
+from ..revocation import revocation_list
+from ..settings import settings
+
+SECRET_KEY = settings.secret_key
+ALGORITHM = settings.algorithm
+# Short-lived access tokens; clients renew them with the refresh token (HMAC check) instead of the password (bcrypt)
+ACCESS_TOKEN_EXPIRE_MINUTES = settings.access_token_expire_minutes
+REFRESH_TOKEN_EXPIRE_DAYS = settings.refresh_token_expire_days
+
+# Principal cache: saves the user lookup in get_current_user for repeated requests
+AUTH_CACHE_TTL_SECONDS = settings.auth_cache_ttl_seconds
+# Stateless mode: build the user from the token claims alone, without touching the DB
+AUTH_STATELESS = settings.auth_stateless
 
 router = APIRouter(
     prefix="/auth",
@@ -60,24 +74,60 @@ class UserCreate(BaseModel):
 class TokenResponse(BaseModel):
     access_token: str
     token_type: str
+    refresh_token: str
+    # Access token lifetime in seconds
+    expires_in: int
+
+
+class RefreshRequest(BaseModel):
+    refresh_token: str
 
 
 # Dependency Injection
 # Session - connection to the database for a single request
-db_dependency = Annotated[Session, Depends(get_db)]
+db_dependency = Annotated[AsyncSession, Depends(get_db)]
+read_db_dependency = Annotated[AsyncSession, Depends(get_read_db)]
+cache_dependency = Annotated[CacheBackend, Depends(get_cache)]
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="auth/token")
 
+# Cached principal: user fields as JSON (never the password hash)
+PRINCIPAL_FIELDS = ("id", "username", "email", "first_name", "last_name", "role", "is_active")
+# Strong references to the eviction tasks scheduled from mapper events until they finish
+_pending_evictions = set()
+
 
-def hash_password(password: str):
-    return pwd_context.hash(password)
+def principal_key(user_id: int) -> str:
+    return f"principal:{user_id}"
+
+
+async def invalidate_user(user_id: int):
+    await cache.delete(principal_key(user_id))
+
+
+# Any change to a user (password change, deactivation, role change) or its deletion evicts the cached principal
+@event.listens_for(User, "after_update")
+@event.listens_for(User, "after_delete")
+def _evict_cached_principal(mapper, connection, target):
+    # Mapper events are sync and the backend may need a network round-trip, so the eviction is scheduled
+    # on the running loop. Outside the app (scripts, sync sessions) the entry ages out after AUTH_CACHE_TTL_SECONDS.
+    try:
+        loop = asyncio.get_running_loop()
+    except RuntimeError:
+        return
+    task = loop.create_task(invalidate_user(target.id))
+    _pending_evictions.add(task)
+    task.add_done_callback(_pending_evictions.discard)
 
 
-@router.post("/add_user")
-async def add_user(user_req: UserCreate, db: db_dependency):
+# Rate limits and admission control run first: rejected requests cost no DB query and no bcrypt
+@router.post("/add_user", dependencies=[Depends(limit_signup), Depends(hash_admission)])
+async def add_user(user_req: UserCreate, db: db_dependency, cache: cache_dependency):
     # Check if the user already exists
-    existing_user = db.query(User).filter((User.username == user_req.username) | (User.email == user_req.email)).first()
+    result = await db.execute(
+        select(User).filter((User.username == user_req.username) | (User.email == user_req.email))
+    )
+    existing_user = result.scalars().first()
     if existing_user:
         raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="User already exists.")
 
@@ -95,13 +145,15 @@ async def add_user(user_req: UserCreate, db: db_dependency):
     '''
 
     user_data = user_req.model_dump(exclude={"password"})
-    hashed_password = hash_password(user_req.password)
+    hashed_password = await password_hash_pool.run(hash_password, user_req.password)
     user_data["hashed_password"] = hashed_password
     new_user = User(**user_data)
 
     db.add(new_user)
-    db.commit()
-    db.refresh(new_user)
+    await db.commit()
+    await db.refresh(new_user)
+    # The new user's first requests may come before the replica has the row
+    await mark_written(cache, new_user.id)
 
     return {
         "message": f"{new_user.username} added successfully.",
@@ -109,64 +161,173 @@ async def add_user(user_req: UserCreate, db: db_dependency):
     }
 
 
-def authenticate_user(db: db_dependency, username: str, password: str):
-    user = db.query(User).filter(User.username == username).first()
-    if not user:
+async def authenticate_user(db: db_dependency, username: str, password: str):
+    result = await db.execute(select(User).filter(User.username == username))
+    user = result.scalars().first()
+    # Same rule as /auth/refresh: deactivated users get no tokens (and cost no bcrypt)
+    if not user or not user.is_active:
         return False
-    if not pwd_context.verify(password, user.hashed_password):
+    # End the read transaction so the pooled connection isn't held while bcrypt runs
+    await db.commit()
+    verified, new_hash = await password_hash_pool.run(verify_password, password, user.hashed_password)
+    if not verified:
         return False
+    if new_hash is not None:
+        # Stored with outdated parameters (e.g. fewer bcrypt rounds): upgraded now that we have the password
+        user.hashed_password = new_hash
+        await db.commit()
     return user
 
 
-def create_access_token(data: dict, expires_delta: timedelta):
+def create_access_token(data: dict, expires_delta: timedelta, token_type: str = "access"):
     to_encode = data.copy()
     expire = datetime.now(timezone.utc) + expires_delta
-    to_encode.update({"exp": expire})
+    to_encode.update({"exp": expire, "type": token_type})
+    # Unique id of the token (refresh tokens are single use)
+    to_encode.setdefault("jti", uuid.uuid4().hex)
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
 
-async def get_current_user(token: Annotated[str, Depends(oauth2_scheme)], db: db_dependency):
-    credentials_exception = HTTPException(
+def issue_tokens(user: User, family_id: Optional[str] = None) -> dict:
+    """Access + refresh token pair; every pair issued from one login shares the family id (fid claim)."""
+    family_id = family_id or uuid.uuid4().hex
+    access_token = create_access_token(
+        data={"sub": user.username, "id": user.id, 'role': user.role, "fid": family_id},
+        expires_delta=timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
+    )
+    refresh_token = create_access_token(
+        data={"sub": user.username, "id": user.id, "fid": family_id},
+        expires_delta=timedelta(days=REFRESH_TOKEN_EXPIRE_DAYS),
+        token_type="refresh"
+    )
+    return {
+        "access_token": access_token,
+        "token_type": "bearer",
+        "refresh_token": refresh_token,
+        "expires_in": ACCESS_TOKEN_EXPIRE_MINUTES * 60,
+    }
+
+
+def family_expires_at() -> int:
+    # A revoked family must outlive the last refresh token issued in it
+    return int(time.time()) + REFRESH_TOKEN_EXPIRE_DAYS * 24 * 3600
+
+
+def credentials_error() -> HTTPException:
+    return HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Invalid or expired token.",
         headers={"WWW-Authenticate": "Bearer"},
     )
 
+
+def decode_token(token: str, token_type: str) -> dict:
+    """Verify the signature and expiry of a token of the given type ("access" or "refresh")."""
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        username: str = payload.get("sub")
-        user_id: int = payload.get("id")
-        role: str = payload.get("role")
-
-        if not username or not user_id or not role:
-            raise credentials_exception
-
     except JWTError:
+        JWT_DECODE_FAILURES.inc()
+        raise credentials_error()
+
+    # Tokens issued before refresh tokens existed carry no type and are access tokens
+    if payload.get("type", "access") != token_type or not payload.get("sub") or not payload.get("id"):
+        JWT_DECODE_FAILURES.inc()
+        raise credentials_error()
+    return payload
+
+
+async def get_current_user(token: Annotated[str, Depends(oauth2_scheme)], db: read_db_dependency,
+                           cache: cache_dependency, primary_db: db_dependency):
+    credentials_exception = credentials_error()
+
+    payload = decode_token(token, "access")
+    username: str = payload.get("sub")
+    user_id: int = payload.get("id")
+    role: str = payload.get("role")
+    if not role:
+        JWT_DECODE_FAILURES.inc()
+        raise credentials_exception
+
+    # Logged out or compromised sessions (the in-memory list is reloaded every REVOCATION_SYNC_SECONDS)
+    await revocation_list.sync(db)
+    if revocation_list.is_revoked(payload.get("fid")):
         raise credentials_exception
 
-    user = db.query(User).filter(User.id == user_id, User.username == username).first()
-    if user is None:
+    if AUTH_STATELESS:
+        # Not attached to any session, only the fields carried by the token are set. Tokens are only issued to
+        # active users: a deactivated user keeps access until the access token expires (ACCESS_TOKEN_EXPIRE_MINUTES)
+        return User(id=user_id, username=username, role=role)
+
+    cached = await cache.get(principal_key(user_id))
+    if cached is not None:
+        fields = json.loads(cached)
+        if fields["username"] == username:
+            AUTH_CACHE_HITS.inc()
+            if not fields["is_active"]:
+                raise credentials_exception
+            return User(**fields)
+    AUTH_CACHE_MISSES.inc()
+
+    # Read-your-writes: the replica may not have the user's own last write (or the just created user) yet
+    if await recently_written(cache, user_id):
+        db = primary_db
+    result = await db.execute(select(User).filter(User.id == user_id, User.username == username))
+    user = result.scalars().first()
+    # Give the connection back: write routes run the rest of the request on the primary session
+    await db.commit()
+    # Deactivated users aren't cached: reactivating them takes effect on the next request
+    if user is None or not user.is_active:
         raise credentials_exception
+
+    fields = {field: getattr(user, field) for field in PRINCIPAL_FIELDS}
+    await cache.set(principal_key(user.id), json.dumps(fields), ttl=AUTH_CACHE_TTL_SECONDS)
     return user
 
 
-@router.post("/token", response_model=TokenResponse)
+@router.post("/token", response_model=TokenResponse, dependencies=[Depends(limit_login), Depends(hash_admission)])
 async def login_for_access_token(form_data: Annotated[OAuth2PasswordRequestForm, Depends()], db: db_dependency):
     # Authenticate the user
-    user = authenticate_user(db, form_data.username, form_data.password)
+    user = await authenticate_user(db, form_data.username, form_data.password)
     if not user:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect username or password, authentication failed.",
         )
 
-    # Create access token
-    access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
-    access_token = create_access_token(
-        data={"sub": user.username, "id": user.id, 'role': user.role},
-        expires_delta=access_token_expires
-    )
+    # Create access & refresh tokens
+    return issue_tokens(user)
+
+
+@router.post("/refresh", response_model=TokenResponse)
+async def refresh_access_token(req: RefreshRequest, db: db_dependency):
+    credentials_exception = credentials_error()
+    payload = decode_token(req.refresh_token, "refresh")
+    family_id, token_id = payload.get("fid"), payload.get("jti")
+    if not family_id or not token_id:
+        raise credentials_exception
+
+    result = await db.execute(select(RevokedToken.id).filter(RevokedToken.jti == family_id))
+    if result.first() is not None:
+        raise credentials_exception
+
+    # Rotation: each refresh token works once
+    if not await revocation_list.use_token(db, token_id, payload["exp"]):
+        # A used refresh token came back: it leaked (or was copied), end the whole session
+        await revocation_list.revoke_family(db, family_id, family_expires_at())
+        raise credentials_exception
+
+    result = await db.execute(select(User).filter(User.id == payload["id"], User.username == payload["sub"]))
+    user = result.scalars().first()
+    if user is None or not user.is_active:
+        raise credentials_exception
+
+    return issue_tokens(user, family_id)
+
 
-    # Return token
-    return {"access_token": access_token, "token_type": "bearer"}
+@router.post("/logout", status_code=status.HTTP_204_NO_CONTENT)
+async def logout(token: Annotated[str, Depends(oauth2_scheme)], db: db_dependency):
+    payload = decode_token(token, "access")
+    # Revokes the access and refresh tokens of this login, other logins stay valid
+    if payload.get("fid"):
+        await revocation_list.revoke_family(db, payload["fid"], family_expires_at())
@@ -1,14 +1,28 @@
-from typing import Annotated
+from datetime import datetime
+from functools import partial
+from typing import Annotated, Literal, Optional
 
-from fastapi import Depends, HTTPException, Path, APIRouter
+from fastapi import Depends, HTTPException, Path, APIRouter, Request, Body
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel, Field
-from sqlalchemy.orm import Session
+from sqlalchemy import select, insert, update, delete
+from sqlalchemy.ext.asyncio import AsyncSession
 from starlette import status
 
 from .auth import get_current_user
+from ..cache import CacheBackend, get_cache
 # ORM models -> database tables
-from ..database import get_db
+from ..database import get_db, get_read_db
+from ..etags import todo_etag, cached_response, not_modified, cache_json_response, bump_todo_version
+from ..events import event_broker, event_stream, publish_todo_events
+from ..group_commit import GroupCommitter, get_group_committer, run_write
 from ..models import Todos, User
+from ..pagination import TodoPageParams, paginate_todos, split_page, NEXT_CURSOR_HEADER
+from ..replica import recently_written
+from ..responses import FastJSONResponse, row_to_dict, rows_to_dicts
+from ..search import SearchParams, search_todos
+from ..stats import load_todo_stats
+from ..sync import ChangesParams, load_changes, record_deletions
 
 router = APIRouter(
     tags=["todos"]
@@ -17,9 +31,35 @@ router = APIRouter(
 '''Dependency Injection (DI) is a design pattern where you define dependencies (like DB, Auth, Config) separately,
 and let the framework (FastAPI) inject them automatically when needed.'''
 # Dependency Injection
-db_dependency = Annotated[Session, Depends(get_db)]
+db_dependency = Annotated[AsyncSession, Depends(get_db)]
+# Read-only (replica) session for safe GETs
+read_db_dependency = Annotated[AsyncSession, Depends(get_read_db)]
+# Shared cache (todo versions & serialized responses)
+cache_dependency = Annotated[CacheBackend, Depends(get_cache)]
 # User Dependency Injection
 user_dependency = Annotated[User, Depends(get_current_user)]
+# Pagination & filter query params
+page_dependency = Annotated[TodoPageParams, Depends()]
+# Delta sync query params
+changes_dependency = Annotated[ChangesParams, Depends()]
+# Search query params
+search_dependency = Annotated[SearchParams, Depends()]
+# Batches single-todo writes into shared commits when GROUP_COMMIT is on (None otherwise)
+group_commit_dependency = Annotated[Optional[GroupCommitter], Depends(get_group_committer)]
+
+
+# Sessions only connect on their first query: the one that isn't returned costs nothing
+async def get_user_read_db(user: user_dependency, db: db_dependency, read_db: read_db_dependency,
+                           cache: cache_dependency) -> AsyncSession:
+    """The replica session, or the primary one while the replica may still miss the user's own last write."""
+    return db if await recently_written(cache, user.id) else read_db
+
+
+# Safe GETs of the user's own todos (read-your-writes)
+user_read_db_dependency = Annotated[AsyncSession, Depends(get_user_read_db)]
+
+# Max number of items accepted by the bulk endpoints
+BULK_MAX_ITEMS = 500
 
 
 class TodoCreate(BaseModel):
@@ -40,65 +80,299 @@ class TodoCreate(BaseModel):
     }
 
 
-@router.get("/todos", status_code=status.HTTP_200_OK)
-# async def get_todos(db: Session = Depends(get_db)):
-async def get_todos(user: user_dependency, db: db_dependency):
+class TodoUpdate(TodoCreate):
+    id: int = Field(gt=0)
+
+
+class TodoResponse(BaseModel):
+    id: int
+    title: str
+    description: str
+    priority: int
+    complete: bool
+    user_id: int
+    # UTC
+    created_at: datetime
+    updated_at: datetime
+
+    model_config = {
+        "from_attributes": True
+    }
+
+
+# Only the columns of TodoResponse are selected: plain rows serialize much faster than ORM instances
+TODO_COLUMNS = tuple(getattr(Todos, field) for field in TodoResponse.model_fields)
+
+
+class BulkItemResult(BaseModel):
+    id: Optional[int]
+    status: Literal["created", "updated", "deleted", "not_found"]
+
+
+class BulkResponse(BaseModel):
+    results: list[BulkItemResult]
+
+
+class PriorityStats(BaseModel):
+    priority: int
+    open: int
+    complete: int
+
+
+class TodoStats(BaseModel):
+    total: int
+    open: int
+    complete: int
+    # Ascending priority, only priorities that have todos
+    by_priority: list[PriorityStats]
+
+
+class TodoChanges(BaseModel):
+    changed: list[TodoResponse]
+    # Ids of the deleted todos
+    deleted: list[int]
+    # Pass as ?since= on the next sync
+    sync_token: str
+    has_more: bool
+
+
+@router.get("/todos", status_code=status.HTTP_200_OK, response_model=list[TodoResponse])
+# async def get_todos(db: AsyncSession = Depends(get_db)):
+async def get_todos(user: user_dependency, db: user_read_db_dependency, page: page_dependency, request: Request,
+                    cache: cache_dependency):
     if user is None:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Authentication Failed!")
 
-    todos = db.query(Todos).filter(Todos.user_id == user.id).all()
+    # Unchanged since the client's (or our cached) copy: answer without querying or serializing
+    etag = await todo_etag(cache, user.id, f"list?{request.url.query}")
+    cached = await cached_response(cache, request, etag)
+    if cached is not None:
+        return cached
+
+    result = await db.execute(paginate_todos(select(*TODO_COLUMNS).filter(Todos.user_id == user.id), page))
+    todos = result.all()
     if todos is not None:
-        return todos
+        todos, cursor = split_page(todos, page)
+        headers = {NEXT_CURSOR_HEADER: str(cursor)} if cursor is not None else None
+        return await cache_json_response(cache, etag, rows_to_dicts(todos), headers)
     raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Todos not found!")
 
 
-@router.get("/todos/{todo_id}", status_code=status.HTTP_200_OK)
-async def get_todo(user: user_dependency, db: db_dependency, todo_id: int = Path(gt=0)):
+# Change feed: created/updated/deleted events of the user's todos pushed as Server-Sent Events
+# (declared before /todos/{todo_id})
+@router.get("/todos/stream", response_class=StreamingResponse)
+async def stream_todo_events(user: user_dependency):
     if user is None:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Authentication Failed!")
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Authentication Failed!")
 
-    todo = db.query(Todos).filter(Todos.id == todo_id, Todos.user_id == user.id).first()
-    if todo is not None:
-        return todo
-    raise HTTPException(status_code=404, detail='Todo not found!')
+    # Starts listening to the other workers' events on the first stream (Redis backend)
+    await event_broker.start()
+    return StreamingResponse(
+        event_stream(user.id),
+        media_type="text/event-stream",
+        # No caching or proxy buffering: events must reach the client as they happen
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
 
 
-@router.post("/todos/add_todo", status_code=status.HTTP_201_CREATED)
-async def add_todo(user: user_dependency, db: db_dependency, todo_req: TodoCreate):
+# Full-text search over title & description, best matches first (declared before /todos/{todo_id})
+@router.get("/todos/search", status_code=status.HTTP_200_OK, response_model=list[TodoResponse])
+async def search(user: user_dependency, db: user_read_db_dependency, params: search_dependency, request: Request,
+                 cache: cache_dependency):
     if user is None:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Authentication Failed!")
-    todo_model = Todos(**todo_req.model_dump(), user_id=user.id)
-    db.add(todo_model)
-    db.commit()
 
+    # Same versioned cache as the list: repeated searches are free until the user's todos change
+    etag = await todo_etag(cache, user.id, f"search?{request.url.query}")
+    cached = await cached_response(cache, request, etag)
+    if cached is not None:
+        return cached
+
+    todos, cursor = await search_todos(db, TODO_COLUMNS, user.id, params)
+    headers = {NEXT_CURSOR_HEADER: str(cursor)} if cursor is not None else None
+    return await cache_json_response(cache, etag, rows_to_dicts(todos), headers)
+
+
+# Open/complete counts by priority, read from the trigger-maintained counters (declared before /todos/{todo_id})
+@router.get("/todos/stats", status_code=status.HTTP_200_OK, response_model=TodoStats)
+async def get_todo_stats(user: user_dependency, db: user_read_db_dependency, request: Request, cache: cache_dependency):
+    if user is None:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Authentication Failed!")
+
+    etag = await todo_etag(cache, user.id, "stats")
+    cached = await cached_response(cache, request, etag)
+    if cached is not None:
+        return cached
+
+    return await cache_json_response(cache, etag, await load_todo_stats(db, user.id))
 
-@router.put("/todos/{todo_id}", status_code=status.HTTP_200_OK)
-async def update_todo(user: user_dependency, db: db_dependency, todo_req: TodoCreate, todo_id: int = Path(gt=0)):
+
+# Delta sync: only what changed since the client's last sync (declared before /todos/{todo_id})
+@router.get("/todos/changes", status_code=status.HTTP_200_OK, response_model=TodoChanges)
+async def get_todo_changes(user: user_dependency, db: db_dependency, params: changes_dependency):
+    if user is None:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Authentication Failed!")
+
+    # Primary session: on a lagging replica a client could be handed a token past rows it hasn't seen
+    changes = await load_changes(db, user.id, TODO_COLUMNS, params)
+    # Nothing else runs on this connection
+    await db.commit()
+    return FastJSONResponse(changes)
+
+
+@router.get("/todos/{todo_id}", status_code=status.HTTP_200_OK, response_model=TodoResponse)
+async def get_todo(user: user_dependency, db: user_read_db_dependency, request: Request, cache: cache_dependency,
+                   todo_id: int = Path(gt=0)):
     if user is None:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Authentication Failed!")
 
-    todo = db.query(Todos).filter(Todos.id == todo_id, Todos.user_id == user.id).first()
+    etag = await todo_etag(cache, user.id, f"todo/{todo_id}")
+    # The id may not exist (or belong to someone else): If-None-Match: * must not get a 304 for it
+    cached = await cached_response(cache, request, etag, exists=False)
+    if cached is not None:
+        return cached
+
+    result = await db.execute(select(*TODO_COLUMNS).filter(Todos.id == todo_id, Todos.user_id == user.id))
+    todo = result.first()
+    if todo is not None:
+        return not_modified(request, etag) or await cache_json_response(cache, etag, row_to_dict(todo))
+    raise HTTPException(status_code=404, detail='Todo not found!')
+
+
+# Single-todo writes: the statements only, committed by run_write (alone or in a group commit)
+async def insert_todo(db: AsyncSession, user_id: int, todo_req: TodoCreate) -> dict:
+    todo_model = Todos(**todo_req.model_dump(), user_id=user_id)
+    db.add(todo_model)
+    # Assigns the id (and the defaults) for the response and the change feed
+    await db.flush()
+    return {field: getattr(todo_model, field) for field in TodoResponse.model_fields}
+
+
+async def update_todo_row(db: AsyncSession, user_id: int, todo_id: int, todo_req: TodoCreate) -> dict:
+    # Ownership check, update and reading back the row in one UPDATE ... RETURNING statement
+    result = await db.execute(
+        update(Todos)
+        .where(Todos.id == todo_id, Todos.user_id == user_id)
+        .values(**todo_req.model_dump())
+        .returning(*TODO_COLUMNS)
+        .execution_options(synchronize_session=False)
+    )
+    todo = result.first()
     if todo is None:
         raise HTTPException(status_code=404, detail="Todo not found!")
+    return row_to_dict(todo)
 
-    todo.title = todo_req.title
-    todo.description = todo_req.description
-    todo.priority = todo_req.priority
-    todo.complete = todo_req.complete
 
-    db.commit()
-    # reloads the latest version of that object from DB
-    db.refresh(todo)
+async def delete_todo_row(db: AsyncSession, user_id: int, todo_id: int):
+    # Ownership check and delete in one DELETE ... RETURNING statement
+    result = await db.execute(
+        delete(Todos)
+        .where(Todos.id == todo_id, Todos.user_id == user_id)
+        .returning(Todos.id)
+        .execution_options(synchronize_session=False)
+    )
+    if result.scalars().first() is None:
+        raise HTTPException(status_code=404, detail="Todo not found!")
+
+    await record_deletions(db, user_id, [todo_id])
+
+
+# Returns the created todo (with its id), like PUT /todos/{todo_id} returns the updated one
+@router.post("/todos/add_todo", status_code=status.HTTP_201_CREATED, response_model=TodoResponse)
+async def add_todo(user: user_dependency, db: db_dependency, cache: cache_dependency,
+                   committer: group_commit_dependency, todo_req: TodoCreate):
+    if user is None:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Authentication Failed!")
+    todo = await run_write(db, committer, partial(insert_todo, user_id=user.id, todo_req=todo_req))
+    await bump_todo_version(cache, user.id)
+    await publish_todo_events(user.id, "created", [todo])
+    return todo
+
+
+# Bulk endpoints: one statement and one commit per batch
+# (declared before the /todos/{todo_id} routes so "bulk_*" isn't taken as a todo_id)
+@router.post("/todos/bulk_add", status_code=status.HTTP_201_CREATED, response_model=BulkResponse)
+async def bulk_add_todos(user: user_dependency, db: db_dependency, cache: cache_dependency,
+                         todos_req: Annotated[list[TodoCreate], Body(min_length=1, max_length=BULK_MAX_ITEMS)]):
+    result = await db.execute(
+        insert(Todos).returning(*TODO_COLUMNS, sort_by_parameter_order=True),
+        [{**todo_req.model_dump(), "user_id": user.id} for todo_req in todos_req]
+    )
+    todos = rows_to_dicts(result.all())
+    await db.commit()
+    await bump_todo_version(cache, user.id)
+    await publish_todo_events(user.id, "created", todos)
+
+    return {"results": [{"id": todo["id"], "status": "created"} for todo in todos]}
+
+
+@router.put("/todos/bulk_update", status_code=status.HTTP_200_OK, response_model=BulkResponse)
+async def bulk_update_todos(user: user_dependency, db: db_dependency, cache: cache_dependency,
+                            todos_req: Annotated[list[TodoUpdate], Body(min_length=1, max_length=BULK_MAX_ITEMS)]):
+    # Only the caller's todos may be updated
+    result = await db.execute(
+        select(Todos.id).filter(Todos.user_id == user.id, Todos.id.in_({todo_req.id for todo_req in todos_req}))
+    )
+    owned_ids = set(result.scalars().all())
+
+    rows = [todo_req.model_dump() for todo_req in todos_req if todo_req.id in owned_ids]
+    if rows:
+        # UPDATE ... WHERE id = ? executed once for all rows (executemany)
+        await db.execute(update(Todos), rows)
+        # Read back for the change feed (executemany can't RETURNING), in the same transaction
+        result = await db.execute(select(*TODO_COLUMNS).filter(Todos.id.in_(owned_ids)).order_by(Todos.id))
+        todos = rows_to_dicts(result.all())
+        await db.commit()
+        await bump_todo_version(cache, user.id)
+        await publish_todo_events(user.id, "updated", todos)
+
+    return {"results": [
+        {"id": todo_req.id, "status": "updated" if todo_req.id in owned_ids else "not_found"}
+        for todo_req in todos_req
+    ]}
+
+
+@router.post("/todos/bulk_delete", status_code=status.HTTP_200_OK, response_model=BulkResponse)
+async def bulk_delete_todos(user: user_dependency, db: db_dependency, cache: cache_dependency,
+                            ids: Annotated[list[int], Body(min_length=1, max_length=BULK_MAX_ITEMS)]):
+    result = await db.execute(
+        delete(Todos)
+        .where(Todos.user_id == user.id, Todos.id.in_(set(ids)))
+        .returning(Todos.id)
+        .execution_options(synchronize_session=False)
+    )
+    deleted_ids = set(result.scalars().all())
+    await record_deletions(db, user.id, deleted_ids)
+    await db.commit()
+    if deleted_ids:
+        await bump_todo_version(cache, user.id)
+        await publish_todo_events(user.id, "deleted", [{"id": todo_id} for todo_id in sorted(deleted_ids)])
+
+    return {"results": [
+        {"id": todo_id, "status": "deleted" if todo_id in deleted_ids else "not_found"}
+        for todo_id in ids
+    ]}
+
+
+@router.put("/todos/{todo_id}", status_code=status.HTTP_200_OK, response_model=TodoResponse)
+async def update_todo(user: user_dependency, db: db_dependency, cache: cache_dependency,
+                      committer: group_commit_dependency, todo_req: TodoCreate, todo_id: int = Path(gt=0)):
+    if user is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Authentication Failed!")
+
+    todo = await run_write(db, committer, partial(update_todo_row, user_id=user.id, todo_id=todo_id,
+                                                  todo_req=todo_req))
+    await bump_todo_version(cache, user.id)
+    await publish_todo_events(user.id, "updated", [todo])
+    return todo
 
 
 @router.delete("/todos/{todo_id}", status_code=status.HTTP_204_NO_CONTENT)
-async def delete_todo(user: user_dependency, db: db_dependency, todo_id: int = Path(gt=0)):
+async def delete_todo(user: user_dependency, db: db_dependency, cache: cache_dependency,
+                      committer: group_commit_dependency, todo_id: int = Path(gt=0)):
     if user is None:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Authentication Failed!")
-    todo = db.query(Todos).filter(Todos.id == todo_id, Todos.user_id == user.id).first()
-    if todo is None:
-        raise HTTPException(status_code=404, detail="Todo not found!")
 
-    # db.query(Todos).filter(Todos.id == todo_id).delete()
-    db.delete(todo)
-    db.commit()
+    await run_write(db, committer, partial(delete_todo_row, user_id=user.id, todo_id=todo_id))
+    await bump_todo_version(cache, user.id)
+    await publish_todo_events(user.id, "deleted", [{"id": todo_id}])
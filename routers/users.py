@@ -2,14 +2,16 @@ import re
 from typing import Annotated
 
 from fastapi import Depends, APIRouter, HTTPException
-from passlib.context import CryptContext
 from pydantic import BaseModel, field_validator
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from starlette import status
 
-from .auth import get_current_user
-from ..database import get_db
+from .auth import get_current_user, invalidate_user, AUTH_STATELESS
+from ..database import get_db, get_read_db
+from ..hashing import password_hash_pool, hash_password, verify_password
 from ..models import User
+from ..ratelimit import hash_admission
 
 router = APIRouter(
     prefix="/user",
@@ -56,30 +58,40 @@ class ChangePasswordForm(BaseModel):
         return password
 
 
-db_dependency = Annotated[Session, Depends(get_db)]
+db_dependency = Annotated[AsyncSession, Depends(get_db)]
+read_db_dependency = Annotated[AsyncSession, Depends(get_read_db)]
 user_dependency = Annotated[User, Depends(get_current_user)]
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
 
 @router.get("/active_user", response_model=UserResponse, status_code=status.HTTP_200_OK)
-async def get_user(user: user_dependency):
+async def get_user(user: user_dependency, db: read_db_dependency):
+    if AUTH_STATELESS:
+        # A stateless principal only carries the token claims, load the full profile
+        result = await db.execute(select(User).filter(User.id == user.id))
+        return result.scalars().first()
     return user
 
 
-@router.put("/change_password", status_code=status.HTTP_200_OK)
+@router.put("/change_password", status_code=status.HTTP_200_OK, dependencies=[Depends(hash_admission)])
 async def change_password(user: user_dependency, db: db_dependency, req: ChangePasswordForm):
     # user from user_dependency calls get_current_user() which creates another session of db
     # Get the user
-    current_user = db.query(User).filter(User.id == user.id).first()
+    result = await db.execute(select(User).filter(User.id == user.id))
+    current_user = result.scalars().first()
+    # End the read transaction so the pooled connection isn't held while bcrypt runs
+    await db.commit()
 
     # Verify the old password
-    if not pwd_context.verify(req.old_password, current_user.hashed_password):
+    verified, _ = await password_hash_pool.run(verify_password, req.old_password, current_user.hashed_password)
+    if not verified:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Incorrect password")
 
     # Hash the new password
-    hashed_new_password = pwd_context.hash(req.new_password)
+    hashed_new_password = await password_hash_pool.run(hash_password, req.new_password)
     current_user.hashed_password = hashed_new_password
 
-    db.commit()
+    await db.commit()
+    # Evicted before answering, so a shared cache never serves the old principal to another worker
+    await invalidate_user(current_user.id)
 
     return "Password changed successfully"
@@ -0,0 +1,88 @@
+import re
+from typing import Optional
+
+from fastapi import HTTPException, Query
+from sqlalchemy import func, literal_column, or_, select, table, column, text
+from sqlalchemy.ext.asyncio import AsyncSession
+from starlette import status
+
+from .models import Todos
+
+DEFAULT_SEARCH_LIMIT = 20
+MAX_SEARCH_LIMIT = 100
+# Deeper pages cost more (every match is ranked): past this, clients should refine the query
+MAX_SEARCH_OFFSET = 1000
+# Words of a query; anything else (quotes, operators, punctuation) is ignored
+MAX_SEARCH_TERMS = 10
+_TERM = re.compile(r"\w+", re.UNICODE)
+
+# The FTS5 table and the tsvector column are created with the schema, see models.py
+todos_fts = table("todos_fts", column("rowid"))
+search_vector = literal_column("todos.search_vector")
+
+
+def search_terms(q: str) -> list[str]:
+    return _TERM.findall(q.lower())[:MAX_SEARCH_TERMS]
+
+
+class SearchParams:
+    """Query parameters of the search endpoint.
+
+    Results are ranked, so pages are offsets into the ranking: ``cursor`` comes from the X-Next-Cursor header.
+    """
+
+    def __init__(
+            self,
+            q: str = Query(min_length=1, max_length=200),
+            limit: int = Query(DEFAULT_SEARCH_LIMIT, gt=0, le=MAX_SEARCH_LIMIT),
+            cursor: int = Query(0, ge=0, le=MAX_SEARCH_OFFSET),
+    ):
+        self.terms = search_terms(q)
+        if not self.terms:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Nothing to search for.")
+        self.limit = limit
+        self.offset = cursor
+
+
+def search_statement(dialect: str, columns, user_id: int, params: SearchParams):
+    """Ranked select of the user's todos matching every term, the last one as a prefix (search as you type).
+
+    One extra row tells whether there is a next page.
+    """
+    if dialect == "sqlite":
+        # Each term quoted: FTS5 query syntax in the input can't change the meaning of the query
+        match = " ".join(f'"{term}"' for term in params.terms) + "*"
+        stmt = (
+            select(*columns)
+            .select_from(todos_fts)
+            .join(Todos, Todos.id == todos_fts.c.rowid)
+            .where(text("todos_fts MATCH :match").bindparams(match=match), Todos.user_id == user_id)
+            # bm25 is lower for better matches; a title match weighs 4x a description match
+            .order_by(text("bm25(todos_fts, 4.0, 1.0)"), Todos.id)
+        )
+    elif dialect == "postgresql":
+        query = func.to_tsquery("simple", " & ".join(params.terms) + ":*")
+        stmt = (
+            select(*columns)
+            .where(Todos.user_id == user_id, search_vector.op("@@")(query))
+            .order_by(func.ts_rank(search_vector, query).desc(), Todos.id)
+        )
+    else:
+        # No text index on this backend: substring scan of the user's todos
+        stmt = select(*columns).where(Todos.user_id == user_id, *(
+            or_(Todos.title.icontains(term, autoescape=True), Todos.description.icontains(term, autoescape=True))
+            for term in params.terms
+        )).order_by(Todos.id)
+    return stmt.limit(params.limit + 1).offset(params.offset)
+
+
+def split_search_page(rows: list, params: SearchParams) -> tuple[list, Optional[int]]:
+    """Trim the extra row, returning the page and the next cursor (offset) or None."""
+    if len(rows) > params.limit and params.offset + params.limit <= MAX_SEARCH_OFFSET:
+        return rows[:params.limit], params.offset + params.limit
+    return rows[:params.limit], None
+
+
+async def search_todos(db: AsyncSession, columns, user_id: int, params: SearchParams):
+    result = await db.execute(search_statement(db.bind.dialect.name, columns, user_id, params))
+    return split_search_page(result.all(), params)
@@ -0,0 +1,104 @@
+import os
+from functools import lru_cache
+from typing import Optional
+
+from dotenv import load_dotenv
+from pydantic import BaseModel, ConfigDict, Field
+
+
+class Settings(BaseModel):
+    """App settings read from the environment (and .env), once per process.
+
+    Field aliases are the environment variable names. Modules copy the values they need at import time;
+    tests patch them there, or pass a ``Settings(...)`` to the helpers that take one.
+    """
+
+    model_config = ConfigDict(frozen=True, populate_by_name=True)
+
+    # Database
+    database_url: Optional[str] = Field(None, alias="DATABASE_URL")
+    database_replica_url: Optional[str] = Field(None, alias="DATABASE_REPLICA_URL")
+    # Apply pending migrations when the app starts. Off by default: every worker boot would pay for the
+    # Alembic import and a schema check. Deploys run `alembic -c <project>/alembic.ini upgrade head` once instead.
+    db_auto_migrate: bool = Field(False, alias="DB_AUTO_MIGRATE")
+    # How long after a user's write their reads stay on the primary (only with a replica)
+    database_replica_lag_seconds: float = Field(5, alias="DATABASE_REPLICA_LAG_SECONDS")
+    # Connection pool of the file/server databases
+    db_pool_size: int = Field(5, alias="DB_POOL_SIZE")
+    db_max_overflow: int = Field(10, alias="DB_MAX_OVERFLOW")
+    db_pool_timeout: float = Field(30, alias="DB_POOL_TIMEOUT")
+    # Unset: 30 minutes and pre-ping for database servers, neither for SQLite
+    db_pool_recycle: Optional[int] = Field(None, alias="DB_POOL_RECYCLE")
+    db_pool_pre_ping: Optional[bool] = Field(None, alias="DB_POOL_PRE_PING")
+    # SQLite performance profile, applied to every new connection of a file database
+    sqlite_tuned: bool = Field(True, alias="SQLITE_TUNED")
+    sqlite_journal_mode: str = Field("WAL", alias="SQLITE_JOURNAL_MODE")
+    sqlite_synchronous: str = Field("NORMAL", alias="SQLITE_SYNCHRONOUS")
+    sqlite_busy_timeout_ms: int = Field(5000, alias="SQLITE_BUSY_TIMEOUT_MS")
+    sqlite_cache_size_kb: int = Field(20000, alias="SQLITE_CACHE_SIZE_KB")
+    sqlite_mmap_size: int = Field(256 * 1024 * 1024, alias="SQLITE_MMAP_SIZE")
+    slow_query_ms: float = Field(200, alias="SLOW_QUERY_MS")
+
+    # Auth
+    secret_key: Optional[str] = Field(None, alias="SECRET_KEY")
+    algorithm: Optional[str] = Field(None, alias="ALGORITHM")
+    access_token_expire_minutes: int = Field(15, alias="ACCESS_TOKEN_EXPIRE_MINUTES")
+    refresh_token_expire_days: int = Field(7, alias="REFRESH_TOKEN_EXPIRE_DAYS")
+    auth_cache_ttl_seconds: int = Field(60, alias="AUTH_CACHE_TTL_SECONDS")
+    auth_stateless: bool = Field(False, alias="AUTH_STATELESS")
+    revocation_sync_seconds: float = Field(5, alias="REVOCATION_SYNC_SECONDS")
+
+    # Rate limits: "<requests>/<seconds>", "0" or "off" disables a limit
+    rate_limit_store: str = Field("memory", alias="RATE_LIMIT_STORE")
+    login_ip_rate: str = Field("20/60", alias="LOGIN_IP_RATE")
+    login_username_rate: str = Field("10/60", alias="LOGIN_USERNAME_RATE")
+    signup_ip_rate: str = Field("5/60", alias="SIGNUP_IP_RATE")
+    hash_concurrency_limit: int = Field(64, alias="HASH_CONCURRENCY_LIMIT")
+    rate_limit_trust_forwarded: bool = Field(False, alias="RATE_LIMIT_TRUST_FORWARDED")
+
+    # Password hashing
+    bcrypt_rounds: int = Field(12, alias="BCRYPT_ROUNDS")
+    password_hash_target_ms: Optional[float] = Field(None, alias="PASSWORD_HASH_TARGET_MS")
+    # Unset: one worker per CPU
+    password_hash_workers: Optional[int] = Field(None, alias="PASSWORD_HASH_WORKERS")
+    password_hash_queue_limit: int = Field(32, alias="PASSWORD_HASH_QUEUE_LIMIT")
+
+    # Cache
+    cache_url: str = Field("memory://", alias="CACHE_URL")
+    cache_max_size: int = Field(10000, alias="CACHE_MAX_SIZE")
+    cache_key_prefix: str = Field("todos:", alias="CACHE_KEY_PREFIX")
+    # ETags and cached responses for todo reads. The todo versions behind them live in the cache: every worker
+    # must see every write's bump, or a client is handed stale data (304s, cached lists) after a write.
+    # Unset: on with a shared cache (Redis), off with memory:// (set it to true for a single worker)
+    todo_etags: Optional[bool] = Field(None, alias="TODO_ETAGS")
+    todo_response_cache_ttl_seconds: int = Field(300, alias="TODO_RESPONSE_CACHE_TTL_SECONDS")
+
+    # Writes
+    # Commit concurrent single-todo writes together (one transaction per batch) instead of one by one
+    group_commit: bool = Field(False, alias="GROUP_COMMIT")
+    group_commit_max_writes: int = Field(100, alias="GROUP_COMMIT_MAX_WRITES")
+    group_commit_window_ms: float = Field(2, alias="GROUP_COMMIT_WINDOW_MS")
+
+    # Delta sync (/todos/changes)
+    sync_settle_seconds: float = Field(2, alias="SYNC_SETTLE_SECONDS")
+    todo_tombstone_retention_days: int = Field(30, alias="TODO_TOMBSTONE_RETENTION_DAYS")
+
+    # Change feed (/todos/stream)
+    events_url: str = Field("memory://", alias="EVENTS_URL")
+    event_queue_size: int = Field(100, alias="EVENT_QUEUE_SIZE")
+    sse_keepalive_seconds: float = Field(15, alias="SSE_KEEPALIVE_SECONDS")
+
+    @classmethod
+    def from_env(cls) -> "Settings":
+        # Unset and empty variables both fall back to the defaults
+        return cls.model_validate({name: value for name, value in os.environ.items() if value != ""})
+
+
+@lru_cache
+def get_settings() -> Settings:
+    # The only load_dotenv() call: variables already set in the environment win over .env
+    load_dotenv()
+    return Settings.from_env()
+
+
+settings = get_settings()
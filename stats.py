@@ -0,0 +1,108 @@
+"""Per-user todo counters: open/complete todos by priority, maintained by triggers on the todos table.
+
+Every insert, delete and bucket-changing update of a todo adjusts its ``todo_counters`` row in the same
+transaction (see models.py), so a stats read is a handful of rows whatever the number of todos. Counters that
+went wrong anyway (triggers dropped by a table rebuild, data loaded with triggers off) are recounted from the
+todos table with:
+
+    python -m <project>.stats [--user-id ID ...]
+"""
+import argparse
+import time
+from typing import Optional
+
+from sqlalchemy import select, insert, delete, func, text, true
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from .database import SessionLocal
+from .models import Todos, TodoCounter
+
+COUNTER_KEY = (TodoCounter.user_id, TodoCounter.priority, TodoCounter.complete)
+
+
+def summarize_counters(rows) -> dict:
+    """Stats from (priority, complete, count) rows: totals and one entry per priority."""
+    by_priority = {}
+    for priority, complete, count in rows:
+        entry = by_priority.setdefault(priority, {"priority": priority, "open": 0, "complete": 0})
+        entry["complete" if complete else "open"] += count
+    open_count = sum(entry["open"] for entry in by_priority.values())
+    complete_count = sum(entry["complete"] for entry in by_priority.values())
+    return {
+        "total": open_count + complete_count,
+        "open": open_count,
+        "complete": complete_count,
+        # Priorities without any todo left are omitted
+        "by_priority": [entry for _, entry in sorted(by_priority.items()) if entry["open"] or entry["complete"]],
+    }
+
+
+def stats_statement(user_id: Optional[int] = None):
+    """(priority, complete, count) rows of one user (at most one per bucket) or, without ``user_id``, of everyone."""
+    stmt = (
+        select(TodoCounter.priority, TodoCounter.complete, func.sum(TodoCounter.count))
+        .group_by(TodoCounter.priority, TodoCounter.complete)
+    )
+    if user_id is not None:
+        stmt = stmt.where(TodoCounter.user_id == user_id)
+    return stmt
+
+
+async def load_todo_stats(db: AsyncSession, user_id: Optional[int] = None) -> dict:
+    result = await db.execute(stats_statement(user_id))
+    return summarize_counters(result.all())
+
+
+def recount_statement(user_ids: Optional[list[int]] = None):
+    """The counters as they should be: todos grouped by user and bucket."""
+    priority = func.coalesce(Todos.priority, 0)
+    complete = func.coalesce(Todos.complete, False)
+    stmt = (
+        select(Todos.user_id, priority, complete, func.count())
+        .where(Todos.user_id.is_not(None))
+        .group_by(Todos.user_id, priority, complete)
+    )
+    if user_ids is not None:
+        stmt = stmt.where(Todos.user_id.in_(user_ids))
+    return stmt
+
+
+def rebuild_todo_counters(db: Session, user_ids: Optional[list[int]] = None) -> int:
+    """Recount the counters of every user (or of ``user_ids``) from the todos table and commit.
+
+    Returns the number of counters that were wrong.
+    """
+    counter_filter = TodoCounter.user_id.in_(user_ids) if user_ids is not None else true()
+    if db.get_bind().dialect.name == "postgresql":
+        # Writers wait until the recount is committed: their deltas then apply on top of it, none is lost
+        db.execute(text("LOCK TABLE todo_counters IN SHARE ROW EXCLUSIVE MODE"))
+
+    before = {tuple(row[:3]): row[3] for row in db.execute(select(*COUNTER_KEY, TodoCounter.count)
+                                                          .where(counter_filter))}
+    after = {tuple(row[:3]): row[3] for row in db.execute(recount_statement(user_ids))}
+
+    db.execute(delete(TodoCounter).where(counter_filter))
+    if after:
+        db.execute(insert(TodoCounter), [
+            {"user_id": user_id, "priority": priority, "complete": bool(complete), "count": count}
+            for (user_id, priority, complete), count in after.items()
+        ])
+    db.commit()
+    return sum(1 for key in before.keys() | after.keys() if before.get(key, 0) != after.get(key, 0))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Recount the per-user todo counters from the todos table.")
+    parser.add_argument("--user-id", type=int, action="append", dest="user_ids",
+                        help="only this user (repeatable, default: every user)")
+    args = parser.parse_args(argv)
+
+    started_at = time.perf_counter()
+    with SessionLocal() as db:
+        drifted = rebuild_todo_counters(db, args.user_ids)
+    print(f"Rebuilt the todo counters in {time.perf_counter() - started_at:.2f}s, {drifted} were wrong")
+
+
+if __name__ == '__main__':
+    main()
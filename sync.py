@@ -0,0 +1,181 @@
+"""Delta sync of the todos: changed rows and tombstones of deleted ones after a client's sync token.
+
+Tombstones older than TODO_TOMBSTONE_RETENTION_DAYS are purged by every worker in the background (see main.py),
+or on demand with:
+
+    python -m <project>.sync
+"""
+import argparse
+import asyncio
+import logging
+import time
+from datetime import datetime, timedelta
+from typing import Optional
+
+from fastapi import HTTPException, Query
+from sqlalchemy import select, insert, delete, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+from starlette import status
+
+from .database import SessionLocal
+from .models import Todos, TodoTombstone, utcnow
+from .responses import rows_to_dicts
+from .settings import settings
+
+DEFAULT_CHANGES_LIMIT = 500
+MAX_CHANGES_LIMIT = 1000
+# Writes in flight when a client syncs may commit with an earlier updated_at than rows it already got:
+# the last page's token stays this far behind now, so those rows are sent (again) on the next sync
+SYNC_SETTLE_SECONDS = settings.sync_settle_seconds
+# Tombstones older than this are purged; clients with an older token must do a full resync
+TODO_TOMBSTONE_RETENTION_DAYS = settings.todo_tombstone_retention_days
+# Old tombstones are deleted this often, outside the requests
+TOMBSTONE_PURGE_SECONDS = 3600
+# Tombstones deleted per statement and commit, so the purge never holds the table for long
+TOMBSTONE_PURGE_BATCH_SIZE = 5000
+
+logger = logging.getLogger(__name__)
+
+_EPOCH = datetime(1970, 1, 1)
+
+
+def encode_sync_token(changed_at: datetime, todo_id: int) -> str:
+    """Opaque sync token: position (change time in microseconds, todo id) of the last change the client has."""
+    return f"{(changed_at - _EPOCH) // timedelta(microseconds=1)}-{todo_id}"
+
+
+def decode_sync_token(token: str) -> tuple[datetime, int]:
+    try:
+        micros, todo_id = (int(part) for part in token.split("-"))
+        return _EPOCH + timedelta(microseconds=micros), todo_id
+    except (ValueError, OverflowError):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid sync token.")
+
+
+class ChangesParams:
+    """Query parameters of the delta sync endpoint; no ``since`` means a full sync from the beginning."""
+
+    def __init__(
+            self,
+            since: Optional[str] = Query(None, max_length=64),
+            limit: int = Query(DEFAULT_CHANGES_LIMIT, gt=0, le=MAX_CHANGES_LIMIT),
+    ):
+        self.since = since
+        self.limit = limit
+
+    def position(self) -> tuple[datetime, int]:
+        if not self.since:
+            return _EPOCH, 0
+        changed_at, todo_id = decode_sync_token(self.since)
+        if changed_at < utcnow() - timedelta(days=TODO_TOMBSTONE_RETENTION_DAYS):
+            # Deletions from before the token may have been purged already
+            raise HTTPException(status_code=status.HTTP_410_GONE, detail="Sync token expired, do a full sync.")
+        return changed_at, todo_id
+
+
+async def record_deletions(db: AsyncSession, user_id: int, todo_ids):
+    """Add tombstones for deleted todos (in the caller's transaction, committed with the DELETE)."""
+    if not todo_ids:
+        return
+    deleted_at = utcnow()
+    await db.execute(
+        insert(TodoTombstone),
+        [{"todo_id": todo_id, "user_id": user_id, "deleted_at": deleted_at} for todo_id in todo_ids]
+    )
+
+
+def purge_tombstones(db: Session, batch_size: int = TOMBSTONE_PURGE_BATCH_SIZE) -> int:
+    """Delete the tombstones older than TODO_TOMBSTONE_RETENTION_DAYS, ``batch_size`` per commit.
+
+    Returns the number of tombstones deleted.
+    """
+    cutoff = utcnow() - timedelta(days=TODO_TOMBSTONE_RETENTION_DAYS)
+    purged = 0
+    while True:
+        # Oldest first through ix_todo_tombstones_deleted_at
+        ids = db.scalars(
+            select(TodoTombstone.id).where(TodoTombstone.deleted_at < cutoff)
+            .order_by(TodoTombstone.deleted_at).limit(batch_size)
+        ).all()
+        if ids:
+            db.execute(delete(TodoTombstone).where(TodoTombstone.id.in_(ids)))
+            db.commit()
+            purged += len(ids)
+        if len(ids) < batch_size:
+            return purged
+
+
+def _purge_with_new_session() -> int:
+    with SessionLocal() as db:
+        return purge_tombstones(db)
+
+
+async def purge_tombstones_periodically(interval: float = TOMBSTONE_PURGE_SECONDS):
+    """Purge old tombstones every ``interval`` seconds, the first time one interval after startup."""
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            # Sync session in a worker thread: the event loop keeps serving requests meanwhile
+            purged = await asyncio.to_thread(_purge_with_new_session)
+        except Exception:
+            logger.exception("Purging the todo tombstones failed")
+        else:
+            logger.info("Purged %d todo tombstones", purged)
+
+
+async def load_changes(db: AsyncSession, user_id: int, columns, params: ChangesParams) -> dict:
+    """Todos changed (``columns``, which include updated_at) and deleted after the ``since`` token.
+
+    At most ``params.limit`` changes, oldest first; ``has_more`` tells the client to sync again right away.
+
+    Both lists come from keyset scans on (user_id, time, id) indexes, so the cost depends on the
+    number of changes returned, not on the size of the list.
+    """
+    since = params.position()
+
+    # Up to limit + 1 of each kind, the oldest limit (+1 to detect more) of the two are kept
+    result = await db.execute(
+        select(*columns)
+        .filter(Todos.user_id == user_id, tuple_(Todos.updated_at, Todos.id) > since)
+        .order_by(Todos.updated_at, Todos.id)
+        .limit(params.limit + 1)
+    )
+    changed = [((row.updated_at, row.id), row) for row in result.all()]
+    result = await db.execute(
+        select(TodoTombstone.deleted_at, TodoTombstone.todo_id)
+        .filter(TodoTombstone.user_id == user_id, tuple_(TodoTombstone.deleted_at, TodoTombstone.todo_id) > since)
+        .order_by(TodoTombstone.deleted_at, TodoTombstone.todo_id)
+        .limit(params.limit + 1)
+    )
+    deleted = [((row.deleted_at, row.todo_id), None) for row in result.all()]
+
+    changes = sorted(changed + deleted, key=lambda change: change[0])
+    has_more = len(changes) > params.limit
+    changes = changes[:params.limit]
+
+    position = changes[-1][0] if changes else since
+    if not has_more:
+        # Last page: keep the token behind the writes that may still be committing
+        position = max(since, min(position, (utcnow() - timedelta(seconds=SYNC_SETTLE_SECONDS), 0)))
+
+    return {
+        "changed": rows_to_dicts([row for _, row in changes if row is not None]),
+        "deleted": [todo_id for (_, todo_id), row in changes if row is None],
+        "sync_token": encode_sync_token(*position),
+        "has_more": has_more,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Delete the todo tombstones older than the retention period.")
+    parser.parse_args(argv)
+
+    started_at = time.perf_counter()
+    purged = _purge_with_new_session()
+    print(f"Purged {purged} tombstones older than {TODO_TOMBSTONE_RETENTION_DAYS} days "
+          f"in {time.perf_counter() - started_at:.2f}s")
+
+
+if __name__ == '__main__':
+    main()
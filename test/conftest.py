@@ -1,17 +1,22 @@
+import asyncio
+
 import pytest
-from passlib.context import CryptContext
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
 from sqlalchemy.orm import sessionmaker
-from sqlalchemy.pool import StaticPool
+from sqlalchemy.pool import StaticPool, NullPool
 
+from .. import etags
+from ..cache import cache
 from ..database import Base
-from ..database import get_db
+from ..database import get_db, get_read_db, get_async_url, instrument_engine
+from ..hashing import hash_password
 from ..main import app
-from ..models import User, Todos
+from ..models import User, Todos, RevokedToken, TodoTombstone, TodoCounter
+from ..ratelimit import bucket_store
+from ..revocation import revocation_list
 from ..routers.auth import get_current_user
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
-
 TEST_DATABASE_URL = "sqlite:///./test.db"
 
 engine = create_engine(
@@ -26,22 +31,46 @@ TestingSessionLocal = sessionmaker(
     bind=engine
 )
 
+# The app itself talks to the same file through the async driver.
+# NullPool: TestClient may run each request on a new event loop, so connections are not reused across requests
+async_engine = create_async_engine(get_async_url(TEST_DATABASE_URL), poolclass=NullPool)
+instrument_engine(async_engine.sync_engine)
+
+AsyncTestingSessionLocal = async_sessionmaker(
+    bind=async_engine,
+    autoflush=False,
+    expire_on_commit=False
+)
+
+# Rebuild the schema every run so model changes (columns, indexes) reach an existing test.db
+Base.metadata.drop_all(bind=engine)
 Base.metadata.create_all(bind=engine)
 
 
-def override_get_db():
-    db = TestingSessionLocal()
-    try:
+async def override_get_db():
+    async with AsyncTestingSessionLocal() as db:
         yield db
-    finally:
-        db.close()
+
+
+@pytest.fixture(autouse=True)
+def reset_state():
+    # Fixtures write todos and users straight to the DB, bypassing the version bumps and evictions done by the routers
+    asyncio.run(cache.clear())
+    yield
+    # Revocations and rate limit buckets don't leak into the next test
+    revocation_list.clear()
+    bucket_store.clear()
+    db = TestingSessionLocal()
+    db.query(RevokedToken).delete()
+    db.commit()
+    db.close()
 
 
 @pytest.fixture
 def test_user():
     db = TestingSessionLocal()
 
-    hashed = pwd_context.hash("oldpassword")
+    hashed = hash_password("oldpassword")
 
     user = User(
         id=1,
@@ -64,6 +93,8 @@ def test_user():
     db = TestingSessionLocal()
     db.query(Todos).delete()
     db.query(User).delete()
+    db.query(TodoTombstone).delete()
+    db.query(TodoCounter).delete()
     db.commit()
     db.close()
 
@@ -92,6 +123,47 @@ def test_todo(test_user):
     db.close()
 
 
+@pytest.fixture
+def many_todos(test_user):
+    db = TestingSessionLocal()
+
+    todos = [
+        Todos(
+            title=f"Todo {i}",
+            description=f"Description {i}",
+            priority=i % 5 + 1,
+            complete=i % 2 == 0,
+            user_id=test_user.id
+        )
+        for i in range(1, 8)
+    ]
+
+    db.add_all(todos)
+    db.commit()
+    ids = [todo.id for todo in todos]
+    db.close()
+
+    yield ids
+
+    db = TestingSessionLocal()
+    db.query(Todos).delete()
+    db.commit()
+    db.close()
+
+
+@pytest.fixture
+def count_queries():
+    """Collects the SQL statements the app executes (test fixtures use a separate engine)."""
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(async_engine.sync_engine, "before_cursor_execute", before_cursor_execute)
+    yield statements
+    event.remove(async_engine.sync_engine, "before_cursor_execute", before_cursor_execute)
+
+
 def override_get_current_user():
     db = TestingSessionLocal()
     try:
@@ -100,5 +172,9 @@ def override_get_current_user():
         db.close()
 
 
+# The tests run in a single process: the in-memory cache sees every version bump
+etags.TODO_ETAGS = True
+
 app.dependency_overrides[get_db] = override_get_db
+app.dependency_overrides[get_read_db] = override_get_db
 app.dependency_overrides[get_current_user] = override_get_current_user
@@ -1,7 +1,13 @@
+import csv
+import io
+import json
+
 from starlette import status
 from starlette.testclient import TestClient
 
+from .conftest import TestingSessionLocal
 from ..main import app
+from ..models import Todos
 
 client = TestClient(app)
 
@@ -24,4 +30,98 @@ def test_admin_delete_todo(test_todo):
     # verify deletion
     verify = client.get("/admin/todos")
     todos = verify.json()
-    assert len(todos) == 0
\ No newline at end of file
+    assert len(todos) == 0
+
+
+def test_admin_delete_changes_owner_etag(test_todo):
+    etag = client.get("/todos").headers["ETag"]
+
+    client.delete(f"/admin/todos/{test_todo.id}")
+
+    response = client.get("/todos", headers={"If-None-Match": etag})
+    assert response.status_code == status.HTTP_200_OK
+    assert response.json() == []
+
+
+def test_admin_delete_missing_todo(test_user):
+    response = client.delete("/admin/todos/9999")
+    assert response.status_code == status.HTTP_404_NOT_FOUND
+
+
+def test_admin_delete_todo_query_count(test_todo, count_queries):
+    client.delete(f"/admin/todos/{test_todo.id}")
+    # The delete and its tombstone (delta sync), no ownership lookup
+    assert len(count_queries) == 2
+    assert count_queries[0].startswith("DELETE FROM todos")
+    assert count_queries[1].startswith("INSERT INTO todo_tombstones")
+
+
+def test_admin_get_todos_paginates(many_todos):
+    response = client.get("/admin/todos", params={"limit": 4, "complete": False})
+    assert response.status_code == status.HTTP_200_OK
+
+    todos = response.json()
+    assert len(todos) == 4
+    assert not any(todo["complete"] for todo in todos)
+    assert "X-Next-Cursor" not in response.headers
+
+    response = client.get("/admin/todos", params={"limit": 2})
+    assert response.headers["X-Next-Cursor"] == str(many_todos[1])
+
+
+def test_admin_export_ndjson(many_todos):
+    response = client.get("/admin/todos/export")
+    assert response.status_code == status.HTTP_200_OK
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+
+    rows = [json.loads(line) for line in response.text.splitlines()]
+    assert [row["id"] for row in rows] == many_todos
+    created_at, updated_at = rows[0].pop("created_at"), rows[0].pop("updated_at")
+    assert created_at and updated_at
+    assert rows[0] == {
+        "id": many_todos[0],
+        "title": "Todo 1",
+        "description": "Description 1",
+        "priority": 2,
+        "complete": False,
+        "user_id": 1
+    }
+
+
+def test_admin_export_csv(many_todos):
+    response = client.get("/admin/todos/export", params={"format": "csv"})
+    assert response.status_code == status.HTTP_200_OK
+    assert response.headers["content-type"].startswith("text/csv")
+
+    rows = list(csv.DictReader(io.StringIO(response.text)))
+    assert len(rows) == len(many_todos)
+    assert rows[-1]["title"] == "Todo 7"
+    assert rows[-1]["priority"] == "3"
+
+
+def test_admin_auth_cache_stats(test_user):
+    response = client.get("/admin/auth_cache")
+    assert response.status_code == status.HTTP_200_OK
+    assert {"hits", "misses", "ttl"} <= response.json().keys()
+    assert response.json()["backend"]["backend"] == "memory"
+
+
+def test_admin_stats_cover_every_user(test_user):
+    client.post("/todos/add_todo", json={"title": "Mine", "description": "Mine", "priority": 2})
+    # Another user's todos, written outside the API (counted by the triggers)
+    db = TestingSessionLocal()
+    db.add_all([Todos(title="Theirs", description="Theirs", priority=2, complete=True, user_id=2),
+                Todos(title="Theirs", description="Theirs", priority=4, complete=False, user_id=2)])
+    db.commit()
+    db.close()
+
+    response = client.get("/admin/todos/stats")
+    assert response.status_code == status.HTTP_200_OK
+    assert response.json() == {
+        "total": 3, "open": 2, "complete": 1,
+        "by_priority": [
+            {"priority": 2, "open": 1, "complete": 1},
+            {"priority": 4, "open": 1, "complete": 0},
+        ],
+    }
+    assert client.get("/todos/stats").json()["total"] == 1
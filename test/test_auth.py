@@ -1,14 +1,26 @@
+import asyncio
+import json
 import os
+import time
+from datetime import timedelta
 
+import pytest
+from fastapi import HTTPException
 from jose import jwt
-from passlib.context import CryptContext
 from starlette import status
 from starlette.testclient import TestClient
 
+from .conftest import AsyncTestingSessionLocal, TestingSessionLocal
+from .. import hashing
+from ..cache import cache
 from ..main import app
+from ..metrics import AUTH_CACHE_HITS, AUTH_CACHE_MISSES
+from ..models import User, RevokedToken
+from ..routers import auth
+from ..revocation import revocation_list
+from ..routers.auth import create_access_token, get_current_user, principal_key
 
 client = TestClient(app)
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
 SECRET_KEY = os.getenv("SECRET_KEY")
 ALGORITHM = os.getenv("ALGORITHM")
@@ -30,6 +42,35 @@ def test_login_success(test_user):
     assert decoded["id"] == test_user.id
 
 
+def test_login_rejects_inactive_user(test_user, monkeypatch):
+    db = TestingSessionLocal()
+    db.query(User).filter(User.id == test_user.id).update({"is_active": False})
+    db.commit()
+    db.close()
+    verified = []
+    monkeypatch.setattr(auth, "verify_password", lambda *args: verified.append(args))
+
+    response = client.post("/auth/token", data={"username": test_user.username, "password": "oldpassword"})
+
+    assert response.status_code == status.HTTP_401_UNAUTHORIZED
+    assert verified == []
+
+
+def test_login_rehashes_outdated_password_hash(test_user):
+    db = TestingSessionLocal()
+    user = db.query(User).filter(User.id == test_user.id).first()
+    user.hashed_password = hashing.build_context(4).hash("oldpassword")
+    db.commit()
+
+    response = client.post("/auth/token", data={"username": test_user.username, "password": "oldpassword"})
+    assert response.status_code == status.HTTP_200_OK
+
+    db.expire_all()
+    user = db.query(User).filter(User.id == test_user.id).first()
+    assert user.hashed_password.startswith(f"$2b${hashing.BCRYPT_ROUNDS:02d}$")
+    db.close()
+
+
 def test_get_current_user(test_user):
     login_data = {
         "username": test_user.username,
@@ -45,3 +86,160 @@ def test_get_current_user(test_user):
 
     assert response.status_code == status.HTTP_200_OK
     assert response.json()["username"] == test_user.username
+
+
+def make_token(user):
+    return create_access_token(
+        data={"sub": user.username, "id": user.id, "role": user.role},
+        expires_delta=timedelta(minutes=5)
+    )
+
+
+async def resolve_user(token):
+    async with AsyncTestingSessionLocal() as db:
+        return await get_current_user(token, db, cache, db)
+
+
+def test_get_current_user_caches_principal(test_user):
+    token = make_token(test_user)
+    hits, misses = AUTH_CACHE_HITS.value(), AUTH_CACHE_MISSES.value()
+
+    first = asyncio.run(resolve_user(token))
+    second = asyncio.run(resolve_user(token))
+
+    assert first.id == second.id == test_user.id
+    assert second.email == test_user.email
+    assert AUTH_CACHE_MISSES.value() - misses == 1
+    assert AUTH_CACHE_HITS.value() - hits == 1
+
+
+def test_user_update_evicts_cached_principal(test_user):
+    asyncio.run(resolve_user(make_token(test_user)))
+    assert asyncio.run(cache.get(principal_key(test_user.id))) is not None
+
+    async def deactivate():
+        async with AsyncTestingSessionLocal() as db:
+            user = await db.get(User, test_user.id)
+            user.is_active = False
+            await db.commit()
+        # Let the eviction scheduled by the mapper event run
+        await asyncio.sleep(0)
+
+    asyncio.run(deactivate())
+    assert asyncio.run(cache.get(principal_key(test_user.id))) is None
+
+
+def test_get_current_user_rejects_inactive_user(test_user):
+    token = make_token(test_user)
+    # Cached while still active, then deactivated outside the app (no eviction)
+    asyncio.run(resolve_user(token))
+    db = TestingSessionLocal()
+    db.query(User).filter(User.id == test_user.id).update({"is_active": False})
+    db.commit()
+    db.close()
+    fields = json.loads(asyncio.run(cache.get(principal_key(test_user.id))))
+    asyncio.run(cache.set(principal_key(test_user.id), json.dumps({**fields, "is_active": False})))
+
+    assert_rejected(token)
+
+    # From the DB: rejected and not cached
+    asyncio.run(cache.clear())
+    assert_rejected(token)
+    assert asyncio.run(cache.get(principal_key(test_user.id))) is None
+
+
+def test_get_current_user_stateless(test_user, monkeypatch):
+    monkeypatch.setattr(auth, "AUTH_STATELESS", True)
+
+    user = asyncio.run(resolve_user(make_token(test_user)))
+
+    assert user.id == test_user.id
+    assert user.username == test_user.username
+    assert user.role == test_user.role
+    assert len(cache.local) == 0
+
+
+def login(user) -> dict:
+    response = client.post("/auth/token", data={"username": user.username, "password": "oldpassword"})
+    assert response.status_code == status.HTTP_200_OK
+    return response.json()
+
+
+def refresh(refresh_token):
+    return client.post("/auth/refresh", json={"refresh_token": refresh_token})
+
+
+def assert_rejected(token):
+    with pytest.raises(HTTPException) as exc_info:
+        asyncio.run(resolve_user(token))
+    assert exc_info.value.status_code == status.HTTP_401_UNAUTHORIZED
+
+
+def test_login_returns_refresh_token(test_user):
+    tokens = login(test_user)
+
+    assert tokens["expires_in"] == auth.ACCESS_TOKEN_EXPIRE_MINUTES * 60
+    access = jwt.decode(tokens["access_token"], SECRET_KEY, algorithms=[ALGORITHM])
+    refresh_claims = jwt.decode(tokens["refresh_token"], SECRET_KEY, algorithms=[ALGORITHM])
+    assert access["type"] == "access"
+    assert refresh_claims["type"] == "refresh"
+    assert access["fid"] == refresh_claims["fid"]
+    assert access["jti"] != refresh_claims["jti"]
+
+
+def test_refresh_rotates_tokens(test_user):
+    tokens = login(test_user)
+
+    response = refresh(tokens["refresh_token"])
+    assert response.status_code == status.HTTP_200_OK
+    rotated = response.json()
+    assert rotated["refresh_token"] != tokens["refresh_token"]
+    assert asyncio.run(resolve_user(rotated["access_token"])).id == test_user.id
+
+    # The new refresh token works once too
+    assert refresh(rotated["refresh_token"]).status_code == status.HTTP_200_OK
+
+
+def test_refresh_token_reuse_revokes_the_session(test_user):
+    tokens = login(test_user)
+    rotated = refresh(tokens["refresh_token"]).json()
+
+    assert refresh(tokens["refresh_token"]).status_code == status.HTTP_401_UNAUTHORIZED
+    # Everything issued from that login is now rejected
+    assert refresh(rotated["refresh_token"]).status_code == status.HTTP_401_UNAUTHORIZED
+    assert_rejected(rotated["access_token"])
+
+
+def test_token_types_are_not_interchangeable(test_user):
+    tokens = login(test_user)
+
+    assert refresh(tokens["access_token"]).status_code == status.HTTP_401_UNAUTHORIZED
+    assert_rejected(tokens["refresh_token"])
+
+
+def test_logout_revokes_only_that_login(test_user):
+    first, second = login(test_user), login(test_user)
+
+    response = client.post("/auth/logout", headers={"Authorization": f"Bearer {first['access_token']}"})
+    assert response.status_code == status.HTTP_204_NO_CONTENT
+
+    assert_rejected(first["access_token"])
+    assert refresh(first["refresh_token"]).status_code == status.HTTP_401_UNAUTHORIZED
+    assert asyncio.run(resolve_user(second["access_token"])).id == test_user.id
+
+
+def test_revocations_from_other_workers_are_synced(test_user):
+    tokens = login(test_user)
+    family_id = jwt.decode(tokens["access_token"], SECRET_KEY, algorithms=[ALGORITHM])["fid"]
+    assert asyncio.run(resolve_user(tokens["access_token"])).id == test_user.id
+
+    # Another worker logged this session out
+    db = TestingSessionLocal()
+    db.add(RevokedToken(kind="family", jti=family_id, expires_at=int(time.time()) + 60))
+    db.commit()
+    db.close()
+
+    # Until the next sync this worker doesn't know yet
+    assert asyncio.run(resolve_user(tokens["access_token"])).id == test_user.id
+    revocation_list._synced_at = float("-inf")
+    assert_rejected(tokens["access_token"])
@@ -0,0 +1,193 @@
+import asyncio
+
+import pytest
+
+from ..cache import CacheBackend, TTLCache, MemoryCache, RedisCache, create_cache
+
+
+def test_get_and_set():
+    cache = TTLCache(maxsize=10, ttl=60)
+    assert cache.get("a") is None
+
+    cache.set("a", 1)
+    assert cache.get("a") == 1
+    assert cache.stats()["hits"] == 1
+    assert cache.stats()["misses"] == 1
+
+
+def test_least_recently_used_is_evicted():
+    cache = TTLCache(maxsize=2, ttl=60)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.get("a")
+    cache.set("c", 3)
+
+    assert cache.get("b") is None
+    assert cache.get("a") == 1
+    assert cache.get("c") == 3
+    assert len(cache) == 2
+
+
+def test_entries_expire(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr("time.monotonic", lambda: now[0])
+
+    cache = TTLCache(maxsize=10, ttl=5)
+    cache.set("a", 1)
+    now[0] += 4
+    assert cache.get("a") == 1
+
+    now[0] += 2
+    assert cache.get("a") is None
+    assert len(cache) == 0
+
+
+def test_delete_and_clear():
+    cache = TTLCache(maxsize=10, ttl=60)
+    cache.set("a", 1)
+    cache.delete("a")
+    cache.delete("missing")
+    assert cache.get("a") is None
+
+    cache.set("b", 2)
+    cache.clear()
+    assert len(cache) == 0
+    assert cache.stats()["misses"] == 0
+
+
+def test_entries_without_ttl_never_expire(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr("time.monotonic", lambda: now[0])
+
+    cache = TTLCache(maxsize=10)
+    cache.set("a", 1)
+    cache.set("b", 2, ttl=5)
+    now[0] += 3600
+    assert cache.get("a") == 1
+    assert cache.get("b") is None
+
+
+def test_incr_keeps_the_expiry_of_the_counter(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr("time.monotonic", lambda: now[0])
+
+    cache = TTLCache(maxsize=10)
+    assert cache.incr("hits", ttl=10) == 1
+    now[0] += 6
+    assert cache.incr("hits", 2, ttl=10) == 3
+
+    # Still the window started by the first incr, not a new one
+    now[0] += 6
+    assert cache.get("hits") is None
+    assert cache.incr("hits", ttl=10) == 1
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+@pytest.fixture(params=["memory", "redis"])
+def backend(request):
+    if request.param == "memory":
+        yield MemoryCache(maxsize=3)
+    else:
+        fakeredis = pytest.importorskip("fakeredis")
+        backend = RedisCache(fakeredis.FakeAsyncRedis(), prefix="test:")
+        yield backend
+        run(backend.clear())
+
+
+def test_backend_get_set_delete(backend):
+    async def scenario():
+        assert await backend.get("a") is None
+        await backend.set("a", b"value")
+        assert bytes(await backend.get("a")) == b"value"
+        await backend.delete("a")
+        await backend.delete("missing")
+        assert await backend.get("a") is None
+
+    run(scenario())
+
+
+def test_backend_incr(backend):
+    async def scenario():
+        assert await backend.incr("counter") == 1
+        assert await backend.incr("counter", 5) == 6
+        assert int(await backend.get("counter")) == 6
+
+    run(scenario())
+
+
+def test_backend_entries_expire(backend):
+    async def scenario():
+        await backend.set("short", b"1", ttl=0.05)
+        await backend.incr("window", ttl=0.05)
+        await backend.set("long", b"1")
+        await asyncio.sleep(0.1)
+        assert await backend.get("short") is None
+        assert await backend.get("window") is None
+        assert await backend.get("long") is not None
+
+    run(scenario())
+
+
+def test_backend_clear(backend):
+    async def scenario():
+        await backend.set("a", b"1")
+        await backend.incr("b")
+        await backend.clear()
+        assert await backend.get("a") is None
+        assert await backend.get("b") is None
+        assert backend.stats()["backend"] == backend.name
+
+    run(scenario())
+
+
+def test_memory_backend_evicts_least_recently_used():
+    backend = MemoryCache(maxsize=2)
+
+    async def scenario():
+        await backend.set("a", b"1")
+        await backend.set("b", b"2")
+        await backend.get("a")
+        await backend.set("c", b"3")
+        assert await backend.get("b") is None
+        assert await backend.get("a") == b"1"
+
+    run(scenario())
+
+
+def test_redis_backend_only_clears_its_namespace():
+    fakeredis = pytest.importorskip("fakeredis")
+    client = fakeredis.FakeAsyncRedis()
+    backend = RedisCache(client, prefix="todos:")
+
+    async def scenario():
+        await client.set("other-app:key", b"keep")
+        await backend.set("a", b"1")
+        assert await client.get("todos:a") == b"1"
+        await backend.clear()
+        assert await client.get("other-app:key") == b"keep"
+
+    run(scenario())
+
+
+def test_create_cache():
+    assert isinstance(create_cache("memory://"), MemoryCache)
+    with pytest.raises(ValueError):
+        create_cache("memcached://localhost")
+
+
+def test_only_the_redis_backend_is_shared():
+    # Decides whether todo ETags are on when TODO_ETAGS is unset
+    assert create_cache("memory://").shared is False
+    assert RedisCache.shared is True
+
+
+def test_incomplete_backend_fails_on_creation():
+    class GetOnlyCache(CacheBackend):
+        async def get(self, key):
+            return None
+
+    with pytest.raises(TypeError):
+        GetOnlyCache()
@@ -0,0 +1,97 @@
+import asyncio
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+from ..database import get_async_url, get_sync_url, pool_options, create_engines
+from ..settings import Settings
+
+
+def test_async_url_swaps_sync_driver():
+    assert get_async_url("sqlite:///./todosapp.db") == "sqlite+aiosqlite:///./todosapp.db"
+    assert get_async_url("postgresql://user:pw@localhost/todos") == "postgresql+asyncpg://user:pw@localhost/todos"
+    assert get_async_url("postgresql+psycopg2://user:pw@localhost/todos") == "postgresql+asyncpg://user:pw@localhost/todos"
+
+
+def test_async_url_keeps_async_driver():
+    assert get_async_url("sqlite+aiosqlite:///./todosapp.db") == "sqlite+aiosqlite:///./todosapp.db"
+
+
+def test_async_url_unknown_backend():
+    with pytest.raises(ValueError):
+        get_async_url("oracle://user:pw@localhost/todos")
+
+
+def test_sync_url_from_async_url():
+    assert get_sync_url("sqlite+aiosqlite:///./todosapp.db") == "sqlite:///./todosapp.db"
+    assert get_sync_url("sqlite:///./todosapp.db") == "sqlite:///./todosapp.db"
+
+
+def test_pool_options_from_settings(monkeypatch):
+    monkeypatch.setenv("DB_POOL_SIZE", "20")
+    monkeypatch.setenv("DB_MAX_OVERFLOW", "5")
+    monkeypatch.setenv("DB_POOL_TIMEOUT", "2.5")
+    monkeypatch.setenv("DB_POOL_RECYCLE", "600")
+    monkeypatch.setenv("DB_POOL_PRE_PING", "false")
+
+    assert pool_options("postgresql://user:pw@localhost/todos", Settings.from_env()) == {
+        "pool_size": 20,
+        "max_overflow": 5,
+        "pool_timeout": 2.5,
+        "pool_recycle": 600,
+        "pool_pre_ping": False,
+    }
+
+
+def test_pool_options_defaults():
+    postgres = pool_options("postgresql://user:pw@localhost/todos")
+    assert postgres["pool_pre_ping"] is True
+    assert postgres["pool_recycle"] == 1800
+
+    sqlite = pool_options("sqlite:///./todosapp.db")
+    assert sqlite["pool_pre_ping"] is False
+    assert sqlite["pool_recycle"] == -1
+
+    assert pool_options("sqlite://") == {}
+
+
+def test_sqlite_profile_applied_on_connect(tmp_path):
+    sync_engine, async_engine = create_engines(f"sqlite:///{tmp_path / 'tuned.db'}")
+
+    with sync_engine.connect() as conn:
+        assert conn.exec_driver_sql("PRAGMA journal_mode").scalar() == "wal"
+        # 1 = NORMAL
+        assert conn.exec_driver_sql("PRAGMA synchronous").scalar() == 1
+        assert conn.exec_driver_sql("PRAGMA busy_timeout").scalar() == 5000
+
+    async def async_synchronous():
+        async with async_engine.connect() as conn:
+            result = await conn.exec_driver_sql("PRAGMA synchronous")
+            return result.scalar()
+
+    assert asyncio.run(async_synchronous()) == 1
+    asyncio.run(async_engine.dispose())
+    sync_engine.dispose()
+
+
+def test_replica_engine_is_instrumented(tmp_path):
+    # The engines are created on import: check a fresh interpreter started with a replica configured
+    package = __name__.rsplit(".", 2)[0]
+    code = (
+        f"from sqlalchemy import event\n"
+        f"from {package} import database\n"
+        f"assert database.replica_async_engine is not database.async_engine\n"
+        f"print(event.contains(database.replica_async_engine.sync_engine, 'after_cursor_execute',\n"
+        f"                     database._after_cursor_execute))\n"
+    )
+    env = {
+        **os.environ,
+        "DATABASE_URL": f"sqlite:///{tmp_path / 'primary.db'}",
+        "DATABASE_REPLICA_URL": f"sqlite:///{tmp_path / 'replica.db'}",
+    }
+    result = subprocess.run([sys.executable, "-c", code], env=env, cwd=Path(__file__).parents[2],
+                            capture_output=True, text=True, check=True)
+    assert result.stdout.strip() == "True"
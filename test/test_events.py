@@ -0,0 +1,189 @@
+import asyncio
+import time
+import tracemalloc
+
+import httpx
+import pytest
+
+from .. import events
+from ..events import EventBroker, EventHub, MemoryBroker, RedisBroker, DROPPED_FRAME, sse_frame, event_hub
+from ..main import app
+from ..models import User
+from ..routers.auth import get_current_user
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+class StreamConnection:
+    """A client holding /todos/stream open, driven straight through the ASGI app."""
+
+    def __init__(self):
+        self.status = None
+        self.body = b""
+        self.received = asyncio.Event()
+        self.received_at = None
+        self.disconnected = asyncio.Event()
+        self.task = None
+
+    async def receive(self):
+        await self.disconnected.wait()
+        return {"type": "http.disconnect"}
+
+    async def send(self, message):
+        if message["type"] == "http.response.start":
+            self.status = message["status"]
+        elif message["type"] == "http.response.body":
+            self.body += message.get("body", b"")
+            if b"event: " in message.get("body", b""):
+                self.received_at = time.perf_counter()
+                self.received.set()
+
+    def open(self):
+        scope = {
+            "type": "http", "method": "GET", "path": "/todos/stream", "raw_path": b"/todos/stream",
+            "query_string": b"", "headers": [], "scheme": "http", "server": ("test", 80), "client": ("test", 1),
+        }
+        self.task = asyncio.ensure_future(app(scope, self.receive, self.send))
+
+    async def close(self):
+        self.disconnected.set()
+        await self.task
+
+
+async def open_streams(count: int) -> list[StreamConnection]:
+    connections = [StreamConnection() for _ in range(count)]
+    for connection in connections:
+        connection.open()
+    # Every stream has sent its first frame, so it is subscribed
+    while len([c for c in connections if c.body]) < count:
+        await asyncio.sleep(0.01)
+    return connections
+
+
+@pytest.fixture
+def stream_user(monkeypatch):
+    # No DB lookup per stream: thousands of connections are opened at once
+    async def current_user():
+        return User(id=1, username="test_user", role="admin")
+
+    monkeypatch.setitem(app.dependency_overrides, get_current_user, current_user)
+
+
+def test_hub_delivers_only_to_the_owner():
+    hub = EventHub(queue_size=10)
+
+    async def scenario():
+        mine, other = hub.subscribe(1), hub.subscribe(2)
+        await MemoryBroker(hub).publish(1, b"frame")
+        assert mine.queue.get_nowait() == b"frame"
+        assert other.queue.empty()
+
+        hub.unsubscribe(mine)
+        hub.unsubscribe(other)
+        assert hub.connections == 0
+
+    run(scenario())
+
+
+def test_hub_drops_slow_consumers():
+    hub = EventHub(queue_size=2)
+
+    async def scenario():
+        slow, fast = hub.subscribe(1), hub.subscribe(1)
+        for i in range(3):
+            hub.deliver(1, sse_frame("updated", {"id": i}))
+            if i < 2:
+                fast.queue.get_nowait()
+
+        # The backlog is replaced by the dropped notice and the subscriber is gone from the hub
+        assert slow.dropped
+        assert slow.queue.qsize() == 1 and slow.queue.get_nowait() is DROPPED_FRAME
+        assert not fast.dropped
+        assert hub.connections == 1
+
+    run(scenario())
+
+
+def test_broker_without_publish_fails_on_creation():
+    class SilentBroker(EventBroker):
+        pass
+
+    with pytest.raises(TypeError):
+        SilentBroker(EventHub())
+
+
+def test_redis_broker_fans_out_across_workers():
+    fakeredis = pytest.importorskip("fakeredis")
+    server = fakeredis.FakeServer()
+    # Two workers, each with its own hub and Redis connection
+    hub_a, hub_b = EventHub(queue_size=10), EventHub(queue_size=10)
+    broker_a = RedisBroker(hub_a, fakeredis.FakeAsyncRedis(server=server), "test:todo_events")
+    broker_b = RedisBroker(hub_b, fakeredis.FakeAsyncRedis(server=server), "test:todo_events")
+
+    async def scenario():
+        await broker_a.start()
+        await broker_b.start()
+        on_a, on_b = hub_a.subscribe(1), hub_b.subscribe(1)
+
+        await broker_a.publish(1, b"frame")
+        assert await asyncio.wait_for(on_a.queue.get(), 2) == b"frame"
+        assert await asyncio.wait_for(on_b.queue.get(), 2) == b"frame"
+
+        await broker_a.close()
+        await broker_b.close()
+
+    run(scenario())
+
+
+def test_stream_pushes_todo_changes(test_todo):
+    async def scenario():
+        connection, = await open_streams(1)
+        assert connection.status == 200
+
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            payload = {"title": "Changed", "description": "Changed Description", "priority": 1, "complete": True}
+            await client.put(f"/todos/{test_todo.id}", json=payload)
+            await client.delete(f"/todos/{test_todo.id}")
+            await asyncio.sleep(0.05)
+
+        await connection.close()
+        return connection.body.decode()
+
+    body = run(scenario())
+    assert body.startswith("retry: 3000\n\n")
+    assert f'event: updated\ndata: {{"id":{test_todo.id},"title":"Changed"' in body
+    assert f'event: deleted\ndata: {{"id":{test_todo.id}}}\n\n' in body
+    # The disconnect unsubscribed the stream
+    assert event_hub.connections == 0
+
+
+def test_thousands_of_streams_latency_and_memory(stream_user):
+    streams = 2000
+
+    async def scenario():
+        tracemalloc.start()
+        baseline = tracemalloc.get_traced_memory()[0]
+        connections = await open_streams(streams)
+        per_connection = (tracemalloc.get_traced_memory()[0] - baseline) / streams
+        tracemalloc.stop()
+
+        published_at = time.perf_counter()
+        await events.publish_todo_events(1, "created", [{"id": 1, "title": "Fan-out"}])
+        await asyncio.wait_for(asyncio.gather(*(c.received.wait() for c in connections)), 10)
+        latencies = sorted(c.received_at - published_at for c in connections)
+
+        for connection in connections:
+            await connection.close()
+        return per_connection, latencies
+
+    per_connection, latencies = run(scenario())
+    p99 = latencies[int(len(latencies) * 0.99)]
+
+    assert len(latencies) == streams
+    assert event_hub.connections == 0
+    # Generous bounds, the point is catching a regression by an order of magnitude
+    assert per_connection < 64 * 1024, f"{per_connection / 1024:.1f} KiB per connection"
+    assert p99 < 2.0, f"event latency p99={p99 * 1000:.1f}ms over {streams} streams"
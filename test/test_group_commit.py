@@ -0,0 +1,126 @@
+import asyncio
+import re
+
+import httpx
+import pytest
+from sqlalchemy import insert, select, func
+from starlette import status
+
+from .conftest import AsyncTestingSessionLocal, TestingSessionLocal
+from ..group_commit import GroupCommitter, get_group_committer
+from ..main import app
+from ..metrics import GROUP_COMMIT_BATCH_SIZE
+from ..models import Todos
+from ..stats import rebuild_todo_counters
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+def todo_titles() -> list[str]:
+    db = TestingSessionLocal()
+    try:
+        return sorted(db.scalars(select(Todos.title)).all())
+    finally:
+        db.close()
+
+
+@pytest.fixture
+def committer(monkeypatch):
+    # A wide window: every request of a test lands in the same batch
+    committer = GroupCommitter(AsyncTestingSessionLocal, max_writes=100, window=0.2)
+    monkeypatch.setitem(app.dependency_overrides, get_group_committer, lambda: committer)
+    return committer
+
+
+async def concurrent_requests(*requests) -> list[httpx.Response]:
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        return await asyncio.gather(*(client.request(method, url, json=payload) for method, url, payload in requests))
+
+
+def todo_payload(title: str, priority: int = 1) -> dict:
+    return {"title": title, "description": "Batched", "priority": priority, "complete": False}
+
+
+def test_concurrent_writes_share_one_commit(test_user, committer):
+    batches = GROUP_COMMIT_BATCH_SIZE.count()
+
+    responses = run(concurrent_requests(*(("POST", "/todos/add_todo", todo_payload(f"Todo {i}")) for i in range(20))))
+
+    assert [response.status_code for response in responses] == [status.HTTP_201_CREATED] * 20
+    assert GROUP_COMMIT_BATCH_SIZE.count() == batches + 1
+    assert todo_titles() == sorted(f"Todo {i}" for i in range(20))
+    # The triggers kept the counters in the same transactions
+    db = TestingSessionLocal()
+    assert rebuild_todo_counters(db) == 0
+    db.close()
+
+
+def test_failed_write_is_isolated(test_todo, committer):
+    responses = run(concurrent_requests(
+        ("PUT", f"/todos/{test_todo.id}", todo_payload("Updated", priority=2)),
+        ("PUT", "/todos/9999", todo_payload("Missing")),
+        ("POST", "/todos/add_todo", todo_payload("Added")),
+        ("DELETE", "/todos/9999", None),
+    ))
+
+    assert [response.status_code for response in responses] == [
+        status.HTTP_200_OK, status.HTTP_404_NOT_FOUND, status.HTTP_201_CREATED, status.HTTP_404_NOT_FOUND,
+    ]
+    assert responses[0].json()["title"] == "Updated"
+    assert todo_titles() == ["Added", "Updated"]
+
+
+def test_statements_of_a_failed_write_are_rolled_back(test_user):
+    committer = GroupCommitter(AsyncTestingSessionLocal, max_writes=10, window=0.05)
+
+    async def add(title: str, fail: bool = False):
+        async def operation(db):
+            await db.execute(insert(Todos), {"title": title, "description": "Batched", "priority": 1, "user_id": 1})
+            if fail:
+                raise ValueError(title)
+            return title
+        return await committer.submit(operation)
+
+    async def scenario():
+        results = await asyncio.gather(add("kept"), add("failed", fail=True), add("also kept"),
+                                       return_exceptions=True)
+        await committer.close()
+        return results
+
+    kept, failed, also_kept = run(scenario())
+    assert (kept, also_kept) == ("kept", "also kept")
+    assert isinstance(failed, ValueError)
+    assert todo_titles() == ["also kept", "kept"]
+
+
+def test_close_commits_queued_writes(test_user):
+    committer = GroupCommitter(AsyncTestingSessionLocal, max_writes=10, window=10)
+
+    async def operation(db):
+        await db.execute(insert(Todos), {"title": "Queued", "description": "Batched", "priority": 1, "user_id": 1})
+        result = await db.execute(select(func.count()).select_from(Todos))
+        return result.scalar()
+
+    async def scenario():
+        write = asyncio.ensure_future(committer.submit(operation))
+        await asyncio.sleep(0.05)
+        # Still waiting for the window; closing doesn't
+        assert not write.done()
+        await committer.close()
+        return await write
+
+    assert run(scenario()) == 1
+    assert todo_titles() == ["Queued"]
+
+
+def test_server_timing_counts_each_request_own_statements(test_user, committer):
+    responses = run(concurrent_requests(*(("POST", "/todos/add_todo", todo_payload(f"Todo {i}")) for i in range(5))))
+
+    assert [response.status_code for response in responses] == [status.HTTP_201_CREATED] * 5
+    # Each request's own SAVEPOINT, INSERT and RELEASE, not the whole batch on the first one
+    counts = [int(re.search(r'desc="(\d+) queries"', response.headers["Server-Timing"]).group(1))
+              for response in responses]
+    assert counts == [3] * 5
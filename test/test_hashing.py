@@ -0,0 +1,69 @@
+import asyncio
+import threading
+
+import pytest
+from fastapi import HTTPException
+from starlette import status
+
+from passlib.hash import bcrypt
+
+from .. import hashing
+from ..hashing import PasswordHashPool, build_context, calibrate_bcrypt_rounds
+
+
+def test_pool_runs_function():
+    pool = PasswordHashPool(workers=2, queue_limit=2)
+    try:
+        result = asyncio.run(pool.run(pow, 2, 10))
+    finally:
+        pool.shutdown()
+
+    assert result == 1024
+    assert pool.pending == 0
+
+
+def test_pool_rejects_when_saturated():
+    pool = PasswordHashPool(workers=1, queue_limit=1)
+    release = threading.Event()
+
+    async def scenario():
+        busy = [asyncio.ensure_future(pool.run(release.wait)) for _ in range(2)]
+        await asyncio.sleep(0.05)
+
+        with pytest.raises(HTTPException) as exc:
+            await pool.run(release.wait)
+
+        release.set()
+        await asyncio.gather(*busy)
+        return exc.value
+
+    try:
+        error = asyncio.run(scenario())
+    finally:
+        pool.shutdown()
+
+    assert error.status_code == status.HTTP_503_SERVICE_UNAVAILABLE
+    assert error.headers["Retry-After"] == "1"
+    assert pool.pending == 0
+
+
+def test_calibration_stays_within_bounds(monkeypatch):
+    # Pretend a hash at the lowest cost takes 10 ms
+    monkeypatch.setattr(hashing, "_timed", lambda func, *args: (None, 0.01))
+
+    assert calibrate_bcrypt_rounds(0.001, min_rounds=10, max_rounds=16) == 10
+    assert calibrate_bcrypt_rounds(0.05, min_rounds=10, max_rounds=16) == 12
+    assert calibrate_bcrypt_rounds(60, min_rounds=10, max_rounds=16) == 16
+
+
+def test_verify_password_upgrades_weaker_hashes(monkeypatch):
+    monkeypatch.setattr(hashing, "pwd_context", build_context(5))
+    weak_hash = bcrypt.using(rounds=4).hash("secret")
+
+    verified, new_hash = hashing.verify_password("secret", weak_hash)
+    assert verified
+    assert new_hash.startswith("$2b$05$")
+
+    # Up to date hashes are kept, wrong passwords are never rehashed
+    assert hashing.verify_password("secret", new_hash) == (True, None)
+    assert hashing.verify_password("wrong", weak_hash) == (False, None)
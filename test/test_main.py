@@ -1,7 +1,17 @@
+import asyncio
+import logging
+
+import pytest
+from fastapi import HTTPException
 from starlette import status
 from starlette.testclient import TestClient
 
+from .. import database, main, migrations
+from ..hashing import password_hash_pool
+from ..metrics import JWT_DECODE_FAILURES
 from ..main import app
+from ..settings import Settings
+from ..routers.auth import get_current_user
 
 client = TestClient(app)
 
@@ -10,3 +20,70 @@ def test_health():
     response = client.get("/health")
     assert response.status_code == status.HTTP_200_OK
     assert response.json() == {'status': 'ok'}
+
+
+def test_startup_skips_migrations_by_default(monkeypatch):
+    migrated = []
+    monkeypatch.setattr(migrations, "upgrade_database", lambda engine: migrated.append(engine))
+
+    with TestClient(app) as started:
+        assert started.get("/health").status_code == status.HTTP_200_OK
+
+    assert migrated == []
+    # Shutdown stops the password hash workers (recreated on next use)
+    assert password_hash_pool._executor is None
+
+
+def test_startup_migrates_when_enabled(monkeypatch):
+    migrated = []
+    monkeypatch.setattr(migrations, "upgrade_database", lambda engine: migrated.append(engine))
+    monkeypatch.setattr(main, "settings", Settings(DB_AUTO_MIGRATE=True))
+
+    with TestClient(app):
+        pass
+
+    assert migrated == [database.engine]
+
+
+def test_server_timing_without_queries():
+    response = client.get("/health")
+    assert response.headers["Server-Timing"].startswith("db;dur=0.00;")
+    assert 'desc="0 queries"' in response.headers["Server-Timing"]
+
+
+def test_server_timing_counts_queries(test_todo):
+    response = client.get(f"/todos/{test_todo.id}")
+    assert response.status_code == status.HTTP_200_OK
+    assert 'desc="1 queries"' in response.headers["Server-Timing"]
+
+
+def test_slow_query_logged_with_route(test_todo, monkeypatch, caplog):
+    monkeypatch.setattr(database, "SLOW_QUERY_MS", 0)
+
+    with caplog.at_level(logging.WARNING, logger=database.logger.name):
+        client.get(f"/todos/{test_todo.id}")
+
+    assert any("/todos/{todo_id}" in record.getMessage() for record in caplog.records)
+
+
+def test_metrics_endpoint(test_todo):
+    client.get(f"/todos/{test_todo.id}")
+
+    response = client.get("/metrics")
+    assert response.status_code == status.HTTP_200_OK
+    assert response.headers["content-type"].startswith("text/plain")
+
+    text = response.text
+    assert 'http_requests_total{method="GET",route="/todos/{todo_id}",status="200"}' in text
+    assert 'http_request_duration_seconds_bucket{method="GET",route="/todos/{todo_id}",le="+Inf"}' in text
+    assert "http_requests_in_flight 1" in text
+    assert "# TYPE db_pool_wait_seconds histogram" in text
+
+
+def test_metrics_count_jwt_failures():
+    before = JWT_DECODE_FAILURES.value()
+
+    with pytest.raises(HTTPException):
+        asyncio.run(get_current_user("not-a-jwt", db=None, cache=None, primary_db=None))
+
+    assert JWT_DECODE_FAILURES.value() == before + 1
@@ -0,0 +1,145 @@
+from alembic import command
+from alembic.autogenerate import compare_metadata
+from alembic.migration import MigrationContext
+from sqlalchemy import create_engine, inspect, select, text, tuple_
+
+from .conftest import engine as test_engine
+from ..database import Base
+from ..migrations import alembic_config, upgrade_database, include_name
+from ..models import Todos, TodoTombstone, utcnow
+from ..pagination import paginate_todos, TodoPageParams
+
+
+def page(**params):
+    defaults = {"limit": 100, "cursor": None, "complete": None, "priority": None, "order": "asc"}
+    return TodoPageParams(**{**defaults, **params})
+
+
+def query_plan(stmt) -> str:
+    sql = stmt.compile(test_engine, compile_kwargs={"literal_binds": True})
+    with test_engine.connect() as conn:
+        rows = conn.execute(text(f"EXPLAIN QUERY PLAN {sql}")).all()
+    return " | ".join(row[-1] for row in rows)
+
+
+def test_migrations_match_models(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'migrated.db'}")
+    upgrade_database(engine)
+
+    with engine.connect() as conn:
+        diff = compare_metadata(MigrationContext.configure(conn, opts={"include_name": include_name}), Base.metadata)
+    assert diff == []
+
+
+def test_legacy_database_is_stamped_and_upgraded(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'legacy.db'}")
+    with engine.begin() as conn:
+        conn.execute(text("CREATE TABLE users (id INTEGER PRIMARY KEY, username VARCHAR)"))
+        conn.execute(text("CREATE TABLE todos (id INTEGER PRIMARY KEY, title VARCHAR, description VARCHAR, "
+                          "user_id INTEGER, complete BOOLEAN, priority INTEGER)"))
+
+    upgrade_database(engine)
+
+    indexes = {index["name"] for index in inspect(engine).get_indexes("todos")}
+    assert {"ix_todos_user_id_id", "ix_todos_user_id_complete_priority"} <= indexes
+
+
+def test_user_todos_query_uses_index():
+    stmt = paginate_todos(select(Todos).filter(Todos.user_id == 1), page(cursor=10))
+    assert "USING INDEX ix_todos_user_id_id" in query_plan(stmt)
+
+
+def test_single_todo_query_uses_index():
+    stmt = select(Todos).filter(Todos.id == 1, Todos.user_id == 1)
+    plan = query_plan(stmt)
+    assert "SCAN" not in plan
+    assert "SEARCH todos" in plan
+
+
+def test_filtered_todos_query_uses_index():
+    stmt = paginate_todos(select(Todos).filter(Todos.user_id == 1), page(complete=False, priority=3))
+    assert "USING INDEX ix_todos_user_id_complete_priority" in query_plan(stmt)
+
+
+def test_changes_queries_use_indexes():
+    since = (utcnow(), 1)
+    stmt = (select(Todos).filter(Todos.user_id == 1, tuple_(Todos.updated_at, Todos.id) > since)
+            .order_by(Todos.updated_at, Todos.id))
+    assert "USING INDEX ix_todos_user_id_updated_at_id" in query_plan(stmt)
+
+    stmt = (select(TodoTombstone.todo_id)
+            .filter(TodoTombstone.user_id == 1, tuple_(TodoTombstone.deleted_at, TodoTombstone.todo_id) > since)
+            .order_by(TodoTombstone.deleted_at, TodoTombstone.todo_id))
+    assert "ix_todo_tombstones_user_id_deleted_at_todo_id" in query_plan(stmt)
+
+
+def test_search_index_built_for_existing_todos(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'search.db'}")
+    upgrade_database(engine, "0004")
+    with engine.begin() as conn:
+        conn.execute(text("INSERT INTO todos (title, description, user_id, created_at, updated_at) "
+                          "VALUES ('Buy groceries', 'Milk and eggs', 1, '2026-01-01', '2026-01-01')"))
+
+    upgrade_database(engine)
+
+    with engine.begin() as conn:
+        assert conn.execute(text("SELECT rowid FROM todos_fts WHERE todos_fts MATCH 'milk'")).all() == [(1,)]
+        # New writes are indexed by the triggers
+        conn.execute(text("UPDATE todos SET description = 'Bread' WHERE id = 1"))
+        assert conn.execute(text("SELECT rowid FROM todos_fts WHERE todos_fts MATCH 'milk'")).all() == []
+        assert conn.execute(text("SELECT rowid FROM todos_fts WHERE todos_fts MATCH 'bread'")).all() == [(1,)]
+
+
+def test_counters_built_for_existing_todos(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'counters.db'}")
+    upgrade_database(engine, "0005")
+    with engine.begin() as conn:
+        conn.execute(text("INSERT INTO todos (title, description, priority, complete, user_id, created_at, updated_at) "
+                          "VALUES ('a', 'a', 2, 0, 1, '2026-01-01', '2026-01-01'), "
+                          "('b', 'b', 2, 0, 1, '2026-01-01', '2026-01-01'), "
+                          "('c', 'c', NULL, 1, 1, '2026-01-01', '2026-01-01')"))
+
+    upgrade_database(engine)
+
+    with engine.connect() as conn:
+        counters = conn.execute(text("SELECT priority, complete, count FROM todo_counters WHERE user_id = 1 "
+                                     "ORDER BY priority")).all()
+    assert counters == [(0, 1, 1), (2, 0, 2)]
+
+
+def test_counters_kept_by_triggers(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'triggers.db'}")
+    upgrade_database(engine, "0005")
+    with engine.begin() as conn:
+        conn.execute(text("INSERT INTO todos (title, description, priority, complete, user_id, created_at, updated_at) "
+                          "VALUES ('a', 'a', 2, 0, 1, '2026-01-01', '2026-01-01')"))
+
+    upgrade_database(engine)
+
+    def counters(conn):
+        return conn.execute(text("SELECT user_id, priority, complete, count FROM todo_counters WHERE count != 0 "
+                                 "ORDER BY user_id, priority, complete")).all()
+
+    with engine.begin() as conn:
+        assert counters(conn) == [(1, 2, 0, 1)]
+        conn.execute(text("INSERT INTO todos (title, description, priority, complete, user_id, created_at, updated_at) "
+                          "VALUES ('b', 'b', 2, 0, 1, '2026-01-01', '2026-01-01'), "
+                          "('c', 'c', NULL, 0, 2, '2026-01-01', '2026-01-01')"))
+        assert counters(conn) == [(1, 2, 0, 2), (2, 0, 0, 1)]
+        # Bucket changes move the todo, other edits don't touch the counters
+        conn.execute(text("UPDATE todos SET complete = 1 WHERE title = 'a'"))
+        conn.execute(text("UPDATE todos SET title = 'renamed' WHERE title = 'b'"))
+        conn.execute(text("UPDATE todos SET user_id = 1, priority = 5 WHERE title = 'c'"))
+        assert counters(conn) == [(1, 2, 0, 1), (1, 2, 1, 1), (1, 5, 0, 1)]
+        conn.execute(text("DELETE FROM todos WHERE user_id = 1 AND priority = 2"))
+        assert counters(conn) == [(1, 5, 0, 1)]
+
+    config = alembic_config()
+    with engine.begin() as conn:
+        config.attributes["connection"] = conn
+        command.downgrade(config, "0005")
+    with engine.connect() as conn:
+        triggers = conn.execute(text("SELECT name FROM sqlite_master WHERE type = 'trigger' "
+                                     "AND name LIKE 'todo_counters%'")).all()
+    assert triggers == []
+    assert not inspect(engine).has_table("todo_counters")
@@ -0,0 +1,38 @@
+import random
+
+from sqlalchemy import select, func
+
+from .conftest import TestingSessionLocal
+from ..models import Todos, User
+from .. import populate_todos
+from ..populate_todos import add_users, add_todos, main
+
+
+def test_add_users_and_todos():
+    db = TestingSessionLocal()
+    try:
+        user_ids = add_users(db, 3, "popuser", "Passw0rd!")
+        db.commit()
+        total = add_todos(db, user_ids, 7, batch_size=5, rng=random.Random(1))
+
+        assert len(user_ids) == 3
+        assert total == 21
+        usernames = db.execute(select(User.username).filter(User.id.in_(user_ids)).order_by(User.id)).scalars().all()
+        assert usernames == ["popuser0", "popuser1", "popuser2"]
+        for user_id in user_ids:
+            assert db.execute(select(func.count()).filter(Todos.user_id == user_id)).scalar() == 7
+        assert set(db.execute(select(Todos.priority)).scalars()) <= {1, 2, 3, 4, 5}
+    finally:
+        db.query(Todos).delete()
+        db.query(User).delete()
+        db.commit()
+        db.close()
+
+
+def test_cli_arguments(monkeypatch, capsys):
+    calls = []
+    monkeypatch.setattr(populate_todos, "populate", lambda *args: calls.append(args) or [1, 2])
+    main(["--users", "2", "--todos-per-user", "50", "--prefix", "cli", "--seed", "7"])
+
+    assert calls == [(2, 50, "cli", "Passw0rd!", 5000, 7)]
+    assert "Added 2 users and 100 todos" in capsys.readouterr().out
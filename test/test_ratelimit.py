@@ -0,0 +1,110 @@
+import asyncio
+
+import pytest
+from starlette import status
+from starlette.testclient import TestClient
+
+from .. import ratelimit
+from ..cache import MemoryCache
+from ..main import app
+from ..ratelimit import MemoryBucketStore, CacheBucketStore, RateLimit, parse_rate, hash_admission
+
+client = TestClient(app)
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr("time.monotonic", lambda: now[0])
+    monkeypatch.setattr("time.time", lambda: now[0])
+    return now
+
+
+def test_parse_rate():
+    assert parse_rate("20/60") == (20, 20 / 60)
+    assert parse_rate("0") == (0, 0.0)
+    assert parse_rate("") == (0, 0.0)
+
+
+def test_memory_bucket_allows_burst_then_refills(clock):
+    store = MemoryBucketStore()
+    take = lambda: asyncio.run(store.take("key", rate=1.0, burst=3))  # noqa: E731
+
+    assert [take() for _ in range(3)] == [0, 0, 0]
+    assert take() == pytest.approx(1.0)
+
+    clock[0] += 1.5
+    assert take() == 0
+    assert take() == pytest.approx(0.5)
+
+
+def test_memory_bucket_store_is_bounded():
+    store = MemoryBucketStore(maxsize=2)
+    for key in ("a", "b", "c"):
+        asyncio.run(store.take(key, rate=1.0, burst=1))
+    assert list(store._buckets) == ["b", "c"]
+
+
+def test_cache_bucket_store_windows(clock):
+    store = CacheBucketStore(MemoryCache())
+    take = lambda: asyncio.run(store.take("key", rate=0.5, burst=2))  # noqa: E731
+
+    assert take() == 0
+    assert take() == 0
+    # 2 requests per 4 seconds, the window started at t=1000
+    assert take() == pytest.approx(4.0)
+
+    clock[0] += 4
+    assert take() == 0
+
+
+def login(username="test_user", password="oldpassword", **headers):
+    return client.post("/auth/token", data={"username": username, "password": password}, headers=headers)
+
+
+def test_login_is_rate_limited_per_ip(test_user, monkeypatch, count_queries):
+    monkeypatch.setattr(ratelimit, "LOGIN_IP_LIMIT", RateLimit("login_ip", "2/60"))
+    assert login(password="wrong").status_code == status.HTTP_401_UNAUTHORIZED
+    assert login(password="wrong").status_code == status.HTTP_401_UNAUTHORIZED
+
+    count_queries.clear()
+    response = login()
+    assert response.status_code == status.HTTP_429_TOO_MANY_REQUESTS
+    assert int(response.headers["Retry-After"]) >= 1
+    # Rejected before touching the DB
+    assert count_queries == []
+
+
+def test_login_is_rate_limited_per_username(test_user, monkeypatch):
+    monkeypatch.setattr(ratelimit, "LOGIN_USERNAME_LIMIT", RateLimit("login_username", "2/60"))
+    monkeypatch.setattr(ratelimit, "RATE_LIMIT_TRUST_FORWARDED", True)
+
+    assert login(password="wrong", **{"X-Forwarded-For": "10.0.0.1"}).status_code == 401
+    assert login(password="wrong", **{"X-Forwarded-For": "10.0.0.2"}).status_code == 401
+    assert login(**{"X-Forwarded-For": "10.0.0.3"}).status_code == status.HTTP_429_TOO_MANY_REQUESTS
+    # Other accounts aren't affected
+    assert login(username="someone_else").status_code == status.HTTP_401_UNAUTHORIZED
+
+
+def test_signup_is_rate_limited(monkeypatch):
+    monkeypatch.setattr(ratelimit, "SIGNUP_IP_LIMIT", RateLimit("signup_ip", "0"))
+    assert client.post("/auth/add_user", json={}).status_code == status.HTTP_422_UNPROCESSABLE_CONTENT
+
+    monkeypatch.setattr(ratelimit, "SIGNUP_IP_LIMIT", RateLimit("signup_ip", "1/60"))
+    client.post("/auth/add_user", json={})
+    assert client.post("/auth/add_user", json={}).status_code == status.HTTP_429_TOO_MANY_REQUESTS
+
+
+def test_hash_endpoints_reject_when_saturated(test_user, monkeypatch, count_queries):
+    monkeypatch.setattr(hash_admission, "in_flight", hash_admission.limit)
+
+    count_queries.clear()
+    response = login()
+    assert response.status_code == status.HTTP_503_SERVICE_UNAVAILABLE
+    assert response.headers["Retry-After"] == "1"
+    assert count_queries == []
+
+
+def test_hash_admission_slot_is_released(test_user):
+    assert login().status_code == status.HTTP_200_OK
+    assert hash_admission.in_flight == 0
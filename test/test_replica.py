@@ -0,0 +1,133 @@
+import asyncio
+import sqlite3
+
+import pytest
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+from sqlalchemy.pool import NullPool
+from starlette import status
+from starlette.testclient import TestClient
+
+from .conftest import engine as primary_engine, override_get_db
+from .. import main
+from .. import replica as replica_routing
+from ..cache import cache, MemoryCache, RedisCache
+from ..database import get_read_db, ReadOnlySession
+from ..main import app
+from ..settings import Settings
+from ..models import Todos
+from ..routers.auth import get_current_user
+
+client = TestClient(app)
+
+
+@pytest.fixture
+def replica(tmp_path, monkeypatch):
+    """Routes get_read_db to a second SQLite file; call the returned function to sync it from the primary."""
+    path = tmp_path / "replica.db"
+    # What setting DATABASE_REPLICA_URL does: reads right after a write are neither ETagged nor cached
+    monkeypatch.setattr(replica_routing, "REPLICA_LAG_SECONDS", 60)
+
+    def sync():
+        source = sqlite3.connect(primary_engine.url.database)
+        target = sqlite3.connect(path)
+        source.backup(target)
+        source.close()
+        target.close()
+
+    sync()
+    replica_engine = create_async_engine(f"sqlite+aiosqlite:///{path}", poolclass=NullPool)
+    ReplicaSession = async_sessionmaker(
+        bind=replica_engine, sync_session_class=ReadOnlySession, autoflush=False, expire_on_commit=False
+    )
+
+    async def override_get_read_db():
+        async with ReplicaSession() as db:
+            yield db
+
+    app.dependency_overrides[get_read_db] = override_get_read_db
+    yield sync
+    app.dependency_overrides[get_read_db] = override_get_db
+    asyncio.run(replica_engine.dispose())
+
+
+def test_reads_go_to_replica(test_user, replica):
+    payload = {"title": "Replicated", "description": "Replicated Description", "priority": 2, "complete": False}
+
+    # The write lands on the primary only, the user's own reads follow it there until the replica catches up
+    response = client.post("/todos/add_todo", json=payload)
+    assert response.status_code == status.HTTP_201_CREATED
+    assert [todo["title"] for todo in client.get("/todos").json()] == ["Replicated"]
+
+    # Once the lag window is over reads go back to the (still outdated) replica
+    asyncio.run(cache.delete(f"todo_written:{test_user.id}"))
+    assert client.get("/todos").json() == []
+
+    replica()
+    # Drop the response cached from the outdated replica
+    asyncio.run(cache.clear())
+    todos = client.get("/todos").json()
+    assert [todo["title"] for todo in todos] == ["Replicated"]
+
+
+def test_new_user_reads_own_writes(test_user, replica, monkeypatch):
+    monkeypatch.delitem(app.dependency_overrides, get_current_user)
+    response = client.post("/auth/add_user", json={
+        "username": "replica_user", "email": "replica@example.com", "first_name": "Replica", "last_name": "User",
+        "password": "Replica1!", "role": "user",
+    })
+    assert response.status_code == status.HTTP_200_OK
+    token = client.post("/auth/token", data={"username": "replica_user", "password": "Replica1!"}).json()
+    headers = {"Authorization": f"Bearer {token['access_token']}"}
+
+    # The replica doesn't have the user yet: authenticated against the primary
+    assert client.get("/todos", headers=headers).status_code == status.HTTP_200_OK
+
+    asyncio.run(cache.clear())
+    assert client.get("/todos", headers=headers).status_code == status.HTTP_401_UNAUTHORIZED
+    replica()
+    assert client.get("/todos", headers=headers).status_code == status.HTTP_200_OK
+
+
+def test_writes_stay_on_primary(test_user, replica):
+    client.post("/todos/add_todo", json={"title": "Primary", "description": "Primary Description", "priority": 2})
+    replica()
+    todo_id = client.get("/todos").json()[0]["id"]
+
+    payload = {"title": "Updated", "description": "Updated Description", "priority": 3, "complete": True}
+    response = client.put(f"/todos/{todo_id}", json=payload)
+    assert response.json()["title"] == "Updated"
+
+    # The user reads their own write, other readers get the lagging replica until the next sync
+    assert client.get(f"/todos/{todo_id}").json()["title"] == "Updated"
+    assert client.get("/admin/todos").json()[0]["title"] == "Primary"
+    asyncio.run(cache.delete(f"todo_written:{test_user.id}"))
+    assert client.get(f"/todos/{todo_id}").json()["title"] == "Primary"
+
+    replica()
+    asyncio.run(cache.clear())
+    assert client.get(f"/todos/{todo_id}").json()["title"] == "Updated"
+
+
+def test_read_only_session_rejects_writes(replica):
+    async def write():
+        async for db in app.dependency_overrides[get_read_db]():
+            db.add(Todos(title="Nope", description="Nope", priority=1))
+            await db.flush()
+
+    with pytest.raises(RuntimeError):
+        asyncio.run(write())
+
+
+def test_replica_requires_a_shared_cache(monkeypatch):
+    with_replica = Settings(DATABASE_REPLICA_URL="sqlite:///./replica.db")
+
+    # Per-process write markers: another worker would read the user's own writes from the lagging replica
+    with pytest.raises(RuntimeError, match="CACHE_URL"):
+        replica_routing.check_replica_cache(MemoryCache(), with_replica)
+    replica_routing.check_replica_cache(RedisCache(client=None), with_replica)
+    replica_routing.check_replica_cache(MemoryCache(), Settings())
+
+    monkeypatch.setattr(main, "settings", with_replica)
+    with pytest.raises(RuntimeError):
+        with TestClient(app):
+            pass
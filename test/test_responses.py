@@ -0,0 +1,35 @@
+import json
+from datetime import datetime
+
+from .. import responses
+from ..responses import FastJSONResponse, dumps, rows_to_dicts
+
+
+class Row(tuple):
+    _fields = ("id", "title")
+
+
+def test_dumps_plain_data():
+    assert json.loads(dumps([{"id": 1, "title": "Todo", "complete": False, "note": None}])) == [
+        {"id": 1, "title": "Todo", "complete": False, "note": None}
+    ]
+
+
+def test_dumps_falls_back_to_jsonable_encoder():
+    assert json.loads(dumps({"at": datetime(2026, 1, 2, 3, 4, 5)})) == {"at": "2026-01-02T03:04:05"}
+
+
+def test_dumps_without_orjson(monkeypatch):
+    monkeypatch.setattr(responses, "orjson", None)
+    assert dumps({"title": "Café", "at": datetime(2026, 1, 2)}) == '{"title":"Café","at":"2026-01-02T00:00:00"}'.encode()
+
+
+def test_rows_to_dicts():
+    assert rows_to_dicts([Row((1, "a")), Row((2, "b"))]) == [{"id": 1, "title": "a"}, {"id": 2, "title": "b"}]
+    assert rows_to_dicts([]) == []
+
+
+def test_fast_json_response():
+    response = FastJSONResponse({"id": 1})
+    assert response.media_type == "application/json"
+    assert json.loads(response.body) == {"id": 1}
@@ -0,0 +1,46 @@
+from ..settings import Settings
+
+
+def test_settings_from_env(monkeypatch):
+    monkeypatch.setenv("DATABASE_URL", "sqlite:///./settings.db")
+    monkeypatch.setenv("DB_AUTO_MIGRATE", "true")
+    monkeypatch.setenv("ACCESS_TOKEN_EXPIRE_MINUTES", "5")
+    monkeypatch.setenv("PASSWORD_HASH_TARGET_MS", "250")
+
+    settings = Settings.from_env()
+
+    assert settings.database_url == "sqlite:///./settings.db"
+    assert settings.db_auto_migrate is True
+    assert settings.access_token_expire_minutes == 5
+    assert settings.password_hash_target_ms == 250.0
+
+
+def test_settings_defaults_for_unset_and_empty_variables(monkeypatch):
+    monkeypatch.delenv("DB_AUTO_MIGRATE", raising=False)
+    monkeypatch.setenv("PASSWORD_HASH_TARGET_MS", "")
+    monkeypatch.setenv("CACHE_URL", "")
+
+    settings = Settings.from_env()
+
+    assert settings.db_auto_migrate is False
+    assert settings.password_hash_target_ms is None
+    assert settings.cache_url == "memory://"
+
+
+def test_module_tuning_knobs_from_env(monkeypatch):
+    monkeypatch.setenv("DATABASE_REPLICA_LAG_SECONDS", "1.5")
+    monkeypatch.setenv("DB_POOL_PRE_PING", "false")
+    monkeypatch.setenv("LOGIN_IP_RATE", "off")
+    monkeypatch.setenv("RATE_LIMIT_TRUST_FORWARDED", "1")
+    monkeypatch.setenv("GROUP_COMMIT_WINDOW_MS", "5")
+    monkeypatch.delenv("DB_POOL_RECYCLE", raising=False)
+
+    settings = Settings.from_env()
+
+    assert settings.database_replica_lag_seconds == 1.5
+    assert settings.db_pool_pre_ping is False
+    # Unset: the default depends on the backend (see database.pool_options)
+    assert settings.db_pool_recycle is None
+    assert settings.login_ip_rate == "off"
+    assert settings.rate_limit_trust_forwarded is True
+    assert settings.group_commit_window_ms == 5.0
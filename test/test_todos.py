@@ -1,7 +1,16 @@
+from datetime import timedelta
+
+import pytest
+from sqlalchemy import select
 from starlette import status
 from starlette.testclient import TestClient
 
+from .conftest import TestingSessionLocal
+from .. import etags, sync
+from ..stats import rebuild_todo_counters
 from ..main import app
+from ..models import Todos, TodoCounter, TodoTombstone, User, utcnow
+from ..routers.todos import TodoResponse
 
 client = TestClient(app)
 
@@ -46,11 +55,13 @@ def test_add_todo(test_user):
 
     response = client.post("/todos/add_todo", json=payload)
     assert response.status_code == status.HTTP_201_CREATED
+    assert response.json()["title"] == payload["title"]
 
     get_todo = client.get(f"/todos")
     todos = get_todo.json()
     created_todo = todos[-1]
     assert created_todo["title"] == payload["title"]
+    assert created_todo["id"] == response.json()["id"]
     assert created_todo["description"] == payload["description"]
     assert created_todo["priority"] == payload["priority"]
     assert created_todo["complete"] == payload["complete"]
@@ -83,3 +94,461 @@ def test_delete_todo(test_todo):
 
     get_todo = client.get(f"/todos/{todo_id}")
     assert get_todo.status_code == status.HTTP_404_NOT_FOUND
+
+
+def test_get_todos_paginates_with_cursor(many_todos):
+    first = client.get("/todos", params={"limit": 3})
+    assert first.status_code == status.HTTP_200_OK
+    assert [todo["id"] for todo in first.json()] == many_todos[:3]
+
+    cursor = first.headers["X-Next-Cursor"]
+    assert cursor == str(many_todos[2])
+
+    second = client.get("/todos", params={"limit": 3, "cursor": cursor})
+    assert [todo["id"] for todo in second.json()] == many_todos[3:6]
+
+    last = client.get("/todos", params={"limit": 3, "cursor": second.headers["X-Next-Cursor"]})
+    assert [todo["id"] for todo in last.json()] == many_todos[6:]
+    assert "X-Next-Cursor" not in last.headers
+
+
+def test_get_todos_descending(many_todos):
+    response = client.get("/todos", params={"limit": 2, "order": "desc"})
+    assert [todo["id"] for todo in response.json()] == many_todos[::-1][:2]
+
+    cursor = response.headers["X-Next-Cursor"]
+    response = client.get("/todos", params={"limit": 2, "order": "desc", "cursor": cursor})
+    assert [todo["id"] for todo in response.json()] == many_todos[::-1][2:4]
+
+
+def test_get_todos_filters(many_todos):
+    response = client.get("/todos", params={"complete": True})
+    todos = response.json()
+    assert len(todos) == 3
+    assert all(todo["complete"] for todo in todos)
+
+    response = client.get("/todos", params={"priority": 2, "complete": False})
+    todos = response.json()
+    assert [todo["title"] for todo in todos] == ["Todo 1"]
+
+
+def test_get_todos_limit_is_capped(test_user):
+    response = client.get("/todos", params={"limit": 10_000})
+    assert response.status_code == 422
+
+
+def test_bulk_add_todos(test_user):
+    payload = [
+        {"title": f"Bulk {i}", "description": "Bulk Description", "priority": 2, "complete": False}
+        for i in range(3)
+    ]
+
+    response = client.post("/todos/bulk_add", json=payload)
+    assert response.status_code == status.HTTP_201_CREATED
+
+    results = response.json()["results"]
+    assert [result["status"] for result in results] == ["created"] * 3
+
+    todos = client.get("/todos").json()
+    assert [todo["id"] for todo in todos] == [result["id"] for result in results]
+    assert [todo["title"] for todo in todos] == ["Bulk 0", "Bulk 1", "Bulk 2"]
+
+
+def test_bulk_add_rejects_too_many_items(test_user):
+    payload = [{"title": "Bulk", "description": "Bulk Description", "priority": 2}] * 501
+
+    response = client.post("/todos/bulk_add", json=payload)
+    assert response.status_code == 422
+
+
+def test_bulk_update_todos(many_todos):
+    payload = [
+        {"id": many_todos[0], "title": "Bulk Updated", "description": "Updated", "priority": 5, "complete": True},
+        {"id": 9999, "title": "Missing", "description": "Missing", "priority": 1, "complete": False},
+    ]
+
+    response = client.put("/todos/bulk_update", json=payload)
+    assert response.status_code == status.HTTP_200_OK
+    assert response.json()["results"] == [
+        {"id": many_todos[0], "status": "updated"},
+        {"id": 9999, "status": "not_found"},
+    ]
+
+    todo = client.get(f"/todos/{many_todos[0]}").json()
+    assert todo["title"] == "Bulk Updated"
+    assert todo["priority"] == 5
+    assert todo["complete"] is True
+
+
+def test_bulk_update_skips_other_users_todos(test_user):
+    db = TestingSessionLocal()
+    db.add(User(id=2, username="other_user", email="other@example.com", role="user"))
+    other = Todos(title="Other", description="Other", priority=1, complete=False, user_id=2)
+    db.add(other)
+    db.commit()
+    other_id = other.id
+    db.close()
+
+    payload = [{"id": other_id, "title": "Hijacked", "description": "Hijacked", "priority": 1, "complete": True}]
+    response = client.put("/todos/bulk_update", json=payload)
+    assert response.json()["results"] == [{"id": other_id, "status": "not_found"}]
+
+    db = TestingSessionLocal()
+    assert db.query(Todos).filter(Todos.id == other_id).first().title == "Other"
+    db.close()
+
+
+def test_bulk_delete_todos(many_todos):
+    ids = many_todos[:2] + [9999]
+
+    response = client.post("/todos/bulk_delete", json=ids)
+    assert response.status_code == status.HTTP_200_OK
+    assert [result["status"] for result in response.json()["results"]] == ["deleted", "deleted", "not_found"]
+
+    remaining = [todo["id"] for todo in client.get("/todos").json()]
+    assert remaining == many_todos[2:]
+
+
+def test_update_todo_returns_updated_row(test_todo):
+    payload = {"title": "Returned", "description": "Returned Description", "priority": 1, "complete": True}
+
+    response = client.put(f"/todos/{test_todo.id}", json=payload)
+    assert response.status_code == status.HTTP_200_OK
+
+    todo = response.json()
+    assert todo["id"] == test_todo.id
+    assert todo["title"] == "Returned"
+    assert todo["complete"] is True
+
+
+def test_update_missing_todo(test_user):
+    payload = {"title": "Missing", "description": "Missing", "priority": 1, "complete": False}
+
+    response = client.put("/todos/9999", json=payload)
+    assert response.status_code == status.HTTP_404_NOT_FOUND
+
+
+def test_get_todo_query_count(test_todo, count_queries):
+    client.get(f"/todos/{test_todo.id}")
+    assert len(count_queries) == 1
+
+
+def test_update_todo_query_count(test_todo, count_queries):
+    payload = {"title": "Counted", "description": "Counted", "priority": 2, "complete": False}
+
+    client.put(f"/todos/{test_todo.id}", json=payload)
+    assert len(count_queries) == 1
+    assert count_queries[0].startswith("UPDATE todos")
+
+
+def test_delete_todo_query_count(test_todo, count_queries):
+    client.delete(f"/todos/{test_todo.id}")
+    # The delete and its tombstone (delta sync), no ownership lookup
+    assert len(count_queries) == 2
+    assert count_queries[0].startswith("DELETE FROM todos")
+    assert count_queries[1].startswith("INSERT INTO todo_tombstones")
+
+
+def test_get_todos_etag_not_modified(test_todo, count_queries):
+    response = client.get("/todos")
+    etag = response.headers["ETag"]
+    assert response.status_code == status.HTTP_200_OK
+
+    count_queries.clear()
+    not_modified = client.get("/todos", headers={"If-None-Match": etag})
+    assert not_modified.status_code == status.HTTP_304_NOT_MODIFIED
+    assert not_modified.headers["ETag"] == etag
+    assert count_queries == []
+
+
+def test_get_todos_served_from_response_cache(many_todos, count_queries):
+    first = client.get("/todos", params={"limit": 2})
+
+    count_queries.clear()
+    second = client.get("/todos", params={"limit": 2})
+    assert count_queries == []
+    assert second.json() == first.json()
+    assert second.headers["X-Next-Cursor"] == first.headers["X-Next-Cursor"]
+    assert second.headers["ETag"] == first.headers["ETag"]
+
+    # A different query is a different resource
+    other = client.get("/todos", params={"limit": 3})
+    assert other.headers["ETag"] != first.headers["ETag"]
+
+
+def test_write_changes_etag(test_todo):
+    etag = client.get("/todos").headers["ETag"]
+    todo_etag = client.get(f"/todos/{test_todo.id}").headers["ETag"]
+
+    payload = {"title": "Changed", "description": "Changed Description", "priority": 1, "complete": False}
+    client.put(f"/todos/{test_todo.id}", json=payload)
+
+    response = client.get("/todos", headers={"If-None-Match": etag})
+    assert response.status_code == status.HTTP_200_OK
+    assert response.json()[0]["title"] == "Changed"
+
+    response = client.get(f"/todos/{test_todo.id}", headers={"If-None-Match": todo_etag})
+    assert response.status_code == status.HTTP_200_OK
+    assert response.json()["title"] == "Changed"
+
+
+def test_if_none_match_any_needs_an_existing_todo(test_todo):
+    headers = {"If-None-Match": "*"}
+    assert client.get("/todos/9999", headers=headers).status_code == status.HTTP_404_NOT_FOUND
+
+    response = client.get(f"/todos/{test_todo.id}", headers=headers)
+    assert response.status_code == status.HTTP_304_NOT_MODIFIED
+    assert response.headers["ETag"] == client.get(f"/todos/{test_todo.id}").headers["ETag"]
+
+
+def test_add_and_delete_change_etag(test_todo):
+    etag = client.get("/todos").headers["ETag"]
+    client.post("/todos/add_todo", json={"title": "Another", "description": "Another one", "priority": 2})
+    assert client.get("/todos", headers={"If-None-Match": etag}).status_code == status.HTTP_200_OK
+
+    etag = client.get("/todos").headers["ETag"]
+    client.delete(f"/todos/{test_todo.id}")
+    response = client.get("/todos", headers={"If-None-Match": etag})
+    assert response.status_code == status.HTTP_200_OK
+    assert len(response.json()) == 1
+
+
+def test_etags_off_by_default(test_todo, monkeypatch, count_queries):
+    monkeypatch.setattr(etags, "TODO_ETAGS", False)
+
+    first = client.get("/todos")
+    assert "ETag" not in first.headers
+
+    # Nothing cached: every read queries
+    count_queries.clear()
+    assert client.get("/todos").json() == first.json()
+    assert count_queries
+
+
+def test_todo_responses_match_todo_response_model(test_todo):
+    fields = set(TodoResponse.model_fields)
+
+    assert set(client.get("/todos").json()[0]) == fields
+    assert set(client.get(f"/todos/{test_todo.id}").json()) == fields
+
+    payload = {"title": "Changed", "description": "Changed Description", "priority": 1, "complete": True}
+    assert set(client.put(f"/todos/{test_todo.id}", json=payload).json()) == fields
+    assert set(client.get("/admin/todos").json()[0]) == fields
+
+
+def test_todo_response_model_in_openapi():
+    operation = app.openapi()["paths"]["/todos"]["get"]
+    schema = operation["responses"]["200"]["content"]["application/json"]["schema"]
+    assert schema["items"]["$ref"].endswith("/TodoResponse")
+
+
+@pytest.fixture
+def no_settle_window(monkeypatch):
+    # Tokens point right after the last change instead of staying SYNC_SETTLE_SECONDS behind
+    monkeypatch.setattr(sync, "SYNC_SETTLE_SECONDS", 0)
+
+
+def test_changes_full_sync(many_todos, no_settle_window):
+    response = client.get("/todos/changes")
+    assert response.status_code == status.HTTP_200_OK
+
+    changes = response.json()
+    assert [todo["id"] for todo in changes["changed"]] == many_todos
+    assert set(changes["changed"][0]) == set(TodoResponse.model_fields)
+    assert changes["deleted"] == []
+    assert changes["has_more"] is False
+
+
+def test_changes_since_token_only_returns_changes(many_todos, no_settle_window):
+    token = client.get("/todos/changes").json()["sync_token"]
+
+    payload = {"title": "Changed", "description": "Changed Description", "priority": 1, "complete": True}
+    client.put(f"/todos/{many_todos[2]}", json=payload)
+    client.delete(f"/todos/{many_todos[4]}")
+    client.post("/todos/bulk_delete", json=[many_todos[5]])
+
+    changes = client.get("/todos/changes", params={"since": token}).json()
+    assert [todo["id"] for todo in changes["changed"]] == [many_todos[2]]
+    assert changes["changed"][0]["title"] == "Changed"
+    assert changes["deleted"] == [many_todos[4], many_todos[5]]
+
+    # Nothing new since the last token
+    changes = client.get("/todos/changes", params={"since": changes["sync_token"]}).json()
+    assert changes["changed"] == [] and changes["deleted"] == []
+
+
+def test_changes_pages_through_with_has_more(many_todos, no_settle_window):
+    seen, token = [], None
+    while True:
+        params = {"limit": 3, **({"since": token} if token else {})}
+        changes = client.get("/todos/changes", params=params).json()
+        seen += [todo["id"] for todo in changes["changed"]]
+        token = changes["sync_token"]
+        if not changes["has_more"]:
+            break
+
+    assert seen == many_todos
+
+
+def test_changes_token_stays_behind_recent_writes(test_todo):
+    # Default settle window: a write committed just now is sent again on the next sync
+    token = client.get("/todos/changes").json()["sync_token"]
+    changes = client.get("/todos/changes", params={"since": token}).json()
+    assert [todo["id"] for todo in changes["changed"]] == [test_todo.id]
+
+
+def test_changes_rejects_invalid_and_expired_tokens(test_user):
+    assert client.get("/todos/changes", params={"since": "nope"}).status_code == status.HTTP_400_BAD_REQUEST
+
+    expired = sync.encode_sync_token(utcnow() - timedelta(days=sync.TODO_TOMBSTONE_RETENTION_DAYS + 1), 1)
+    assert client.get("/todos/changes", params={"since": expired}).status_code == status.HTTP_410_GONE
+
+
+def test_purge_tombstones_keeps_recent_ones(test_user):
+    old = utcnow() - timedelta(days=sync.TODO_TOMBSTONE_RETENTION_DAYS + 1)
+    db = TestingSessionLocal()
+    db.add_all([TodoTombstone(todo_id=todo_id, user_id=1, deleted_at=old) for todo_id in range(1, 6)])
+    db.add(TodoTombstone(todo_id=6, user_id=1, deleted_at=utcnow()))
+    db.commit()
+
+    # Several batches, then nothing left to purge
+    assert sync.purge_tombstones(db, batch_size=2) == 5
+    assert sync.purge_tombstones(db, batch_size=2) == 0
+    assert db.scalars(select(TodoTombstone.todo_id)).all() == [6]
+    db.close()
+
+
+def add_todos(*todos, user_id=1) -> list[int]:
+    db = TestingSessionLocal()
+    models = [Todos(title=title, description=description, priority=3, user_id=user_id) for title, description in todos]
+    db.add_all(models)
+    db.commit()
+    ids = [todo.id for todo in models]
+    db.close()
+    return ids
+
+
+def search_ids(q: str, **params) -> list[int]:
+    response = client.get("/todos/search", params={"q": q, **params})
+    assert response.status_code == status.HTTP_200_OK
+    return [todo["id"] for todo in response.json()]
+
+
+def test_search_ranks_title_matches_first(test_user):
+    in_description, in_title, unrelated = add_todos(
+        ("Weekly errands", "Buy milk and eggs"),
+        ("Milk the budget", "Spreadsheet work"),
+        ("Workout", "Gym session"),
+    )
+
+    assert search_ids("milk") == [in_title, in_description]
+    # Every term must match, the last one as a prefix
+    assert search_ids("milk EG") == [in_description]
+    assert search_ids("gym sess") == [unrelated]
+
+
+def test_search_only_returns_own_todos(test_user):
+    mine, = add_todos(("Pay rent", "Transfer to landlord"))
+    add_todos(("Pay rent", "Someone else's"), user_id=2)
+
+    assert search_ids("rent") == [mine]
+
+
+def test_search_index_follows_updates_and_deletes(test_user):
+    todo_id, = add_todos(("Call plumber", "Kitchen sink leaks"))
+
+    payload = {"title": "Call electrician", "description": "Kitchen lights flicker", "priority": 2, "complete": False}
+    client.put(f"/todos/{todo_id}", json=payload)
+    assert search_ids("plumber") == []
+    assert search_ids("electrician") == [todo_id]
+
+    client.delete(f"/todos/{todo_id}")
+    assert search_ids("electrician") == []
+
+
+def test_search_paginates_with_cursor(test_user):
+    ids = add_todos(*[(f"Report {i}", "Quarterly report") for i in range(5)])
+
+    first = client.get("/todos/search", params={"q": "report", "limit": 3})
+    cursor = first.headers["X-Next-Cursor"]
+    second = client.get("/todos/search", params={"q": "report", "limit": 3, "cursor": cursor})
+
+    assert "X-Next-Cursor" not in second.headers
+    assert sorted(todo["id"] for todo in first.json() + second.json()) == ids
+
+
+def test_search_ignores_query_syntax(test_user):
+    todo_id, = add_todos(("Fix bug", "NEAR the login form"))
+
+    # FTS operators and quotes in the input are plain words
+    assert search_ids('"bug" OR *') == []
+    assert search_ids('bug: "login"') == [todo_id]
+    assert client.get("/todos/search", params={"q": "?!"}).status_code == status.HTTP_400_BAD_REQUEST
+
+
+def todo_stats() -> dict:
+    response = client.get("/todos/stats")
+    assert response.status_code == status.HTTP_200_OK
+    return response.json()
+
+
+def test_stats_follow_every_write_path(test_user):
+    new = [{"title": f"Todo {i}", "description": "Counted", "priority": i % 3 + 1, "complete": False}
+           for i in range(6)]
+    client.post("/todos/add_todo", json=new[0])
+    ids = [result["id"] for result in client.post("/todos/bulk_add", json=new[1:]).json()["results"]]
+
+    client.put(f"/todos/{ids[0]}", json={**new[1], "complete": True})
+    client.put("/todos/bulk_update", json=[{**new[2], "id": ids[1], "priority": 5},
+                                           {**new[3], "id": ids[2], "complete": True}])
+    client.delete(f"/todos/{ids[3]}")
+    client.post("/todos/bulk_delete", json=[ids[4], 9999])
+    client.delete(f"/admin/todos/{ids[2]}")
+
+    assert todo_stats() == {
+        "total": 3, "open": 2, "complete": 1,
+        "by_priority": [
+            {"priority": 1, "open": 1, "complete": 0},
+            {"priority": 2, "open": 0, "complete": 1},
+            {"priority": 5, "open": 1, "complete": 0},
+        ],
+    }
+    # Nothing for a recount to fix
+    db = TestingSessionLocal()
+    assert rebuild_todo_counters(db) == 0
+    db.close()
+
+
+def test_stats_read_only_the_counters(test_user, count_queries):
+    client.post("/todos/add_todo", json={"title": "Counted", "description": "Counted", "priority": 2})
+    count_queries.clear()
+
+    assert todo_stats()["open"] == 1
+    assert len(count_queries) == 1
+    assert "FROM todo_counters" in count_queries[0]
+    # Then served from the response cache until the next write
+    todo_stats()
+    assert len(count_queries) == 1
+
+
+def test_counters_follow_direct_writes(many_todos):
+    # The fixture inserts the todos directly, the triggers count them anyway
+    assert todo_stats()["total"] == 7
+
+
+def test_rebuild_fixes_counter_drift(many_todos):
+    # Lost outside the triggers (e.g. a table rebuild that dropped them)
+    db = TestingSessionLocal()
+    db.query(TodoCounter).delete()
+    db.commit()
+    db.close()
+    assert todo_stats()["total"] == 0
+
+    db = TestingSessionLocal()
+    assert rebuild_todo_counters(db, [1]) == 7
+    db.close()
+
+    client.post("/todos/add_todo", json={"title": "Counted", "description": "Counted", "priority": 1})
+    stats = todo_stats()
+    assert (stats["total"], stats["open"], stats["complete"]) == (8, 5, 3)
+    assert [entry["priority"] for entry in stats["by_priority"]] == [1, 2, 3, 4, 5]